@@ -1,17 +1,28 @@
 import json
+from contextlib import contextmanager
 
 from six import int2byte
 
-from .port import ThrottledSerial
-from .hw import get_command
-from .util import from_range
+from .bitmap import BITMAP_HEADER_SIZE, encode_bitmap, row_dot_counts
+from .port import CommandBuffer, DensityModel, ThrottledSerial
+from .hw import encode_many, get_command
+from .job import JobRecorder, RecordedJob
+from .layout import Layout
+from .util import RangeTable
+
+# valid values of settings, with their encodings
+CHAR_CODES = RangeTable(0x20, 0x7F, value_name='charnum')
+BAND_HEIGHTS = RangeTable(1, 256, value_name='band_height')
+MAX_DOTS = RangeTable(8, 2040 + 8, 8, 'max_dots')
+HEAT_TIMES = RangeTable(30, 2550 + 10, 10, 'heat_time')
+HEAT_INTERVALS = RangeTable(0, 2550 + 10, 10, 'heat_interval')
 
 
 class CommandAliasMixin(object):
     # printing
     def feed(self, n_dots=0):
         self.send_command('print_and_feed', n_dots)
-        self.port.fed_dots(n_dots)
+        self.port.fed_dots(n_dots, black_dots=(0,) * n_dots)
 
     # line spacing
     def set_left_margin(self, chars=None, dots=None):
@@ -31,6 +42,7 @@ class CommandAliasMixin(object):
     def set_line_height(self, spacing=32):
         self.send_command('set_line_spacing', spacing)
         self.port.line_height = spacing
+        self.layout.line_height = spacing
 
     def set_text_align(self, alignment='L'):
         self.send_command('set_text_align', {
@@ -38,8 +50,45 @@ class CommandAliasMixin(object):
             'M': 1,
             'R': 2,
         }[alignment])
+        self.layout.align = alignment
+
+    # text
+    def print_text(self, text, encoding='ascii'):
+        """Print text, wrapping it at word boundaries.
+
+        Unlike :meth:`~afthermal.ThermalPrinter.write`, every line printed is
+        accounted for with its actual height, including those wrapped because
+        they are full, see :class:`~afthermal.layout.Layout`. Formatting must
+        be changed through the printer's methods, such as
+        :meth:`.set_double_width`, for the layout to follow.
+
+        :param text: Text to print.
+        :param encoding: Encoding to use.
+        """
+        layout = self.layout
+        for line, complete in layout.iter_lines(text):
+            self.port.write(line.encode(encoding), is_text=False)
+            if complete:
+                self.port.fed_lines(1, dot_height=layout.line_height
+                                    if layout.blank else layout.line_dots)
 
     # formatting
+    def set_double_width(self, enabled=True):
+        self.layout.double_width = enabled
+        self._send_enlarge()
+
+    def set_double_height(self, enabled=True):
+        self.layout.double_height = enabled
+        self._send_enlarge()
+
+    def _send_enlarge(self):
+        # width and height share a single command, each setting it must keep
+        # the other
+        layout = self.layout
+        self.send_command('set_font_enlarge',
+                          (0x20 if layout.double_width else 0) |
+                          (0x01 if layout.double_height else 0))
+
     def set_code_page(self, page):
         self.send_command('select_codepage', {
             437: 0,
@@ -65,118 +114,275 @@ class CommandAliasMixin(object):
         }[charset])
 
     def upload_custom_character(self, charnum, data):
-        height = 3
-        width = len(data) / 3
+        """Define a user-defined character.
 
-        if len(data) % 3:
-            raise ValueError('Custom character must have a height of 24 dots,'
-                             '(== 3 bytes).')
+        User-defined characters are printed instead of the internal ones while
+        enabled with :meth:`.enable_custom_font`. They are lost when the
+        printer is reset.
 
-        if not 0 <= width <= 12:
-            raise ValueError('Character must be between 0 and 12 bytes wide, '
-                             'is {}.'.format(width))
+        :param charnum: Character code to define, between 32 and 126.
+        :param data: Up to 12 columns of 24 dots each. Every column is 3 bytes,
+                     top to bottom, with the most significant bit first.
 
-        if len(data) != width * height:
-            raise ValueError('Character has wrong size')  # unlikely =)
+        The command is followed by a null byte unless
+        ``pad_custom_characters`` is disabled, see
+        :class:`~afthermal.ThermalPrinter`.
+        """
+        if charnum not in CHAR_CODES:
+            raise ValueError('Character code must be between 32 and 126, is '
+                             '{}.'.format(charnum))
 
-        self.write(self.CMDS['define_character'][0])
+        if len(data) % 3:
+            raise ValueError('Custom character must have a height of 24 dots,'
+                             '(== 3 bytes).')
 
-        # this should work, but doesn't. parameter order is confusing in the
-        # docs, and none work, always end up a byte short
-        self.write(int2byte(height))    # s
-        self.write(int2byte(charnum))   # n
-        self.write(int2byte(charnum))   # m (note: docs are unclear about
-                                        #    ordering here, it says m, w in
-                                        #    the ascii line and w, m below)
-        self.write(int2byte(width))     # w
+        width = len(data) // 3
+        if not width <= 12:
+            raise ValueError('Character must be at most 12 columns wide, is '
+                             '{}.'.format(width))
 
-        self.write(data)
+        # the height is given in bytes and always 3. a single command could
+        # define a range of characters, each preceded by its width
+        self.send_command('define_character', 3, charnum, charnum)
+        data = int2byte(width) + bytes(data)
 
-        # for some reason, we need an extra byte, but it is nowhere in the
-        # specs. we'll use \x00 here, as this is pure white and not a printable
-        # character
-        self.write('\x00')
+        # printers have been observed to wait for an extra byte that is
+        # nowhere in the specs. \x00 is pure white and not printable
+        if self.pad_custom_characters:
+            data += b'\x00'
+        self.write(data, is_text=False)
 
-    def print_image(self, width, data):
+    def print_image(self, width, data, band_height=None, compress=None):
         """Prints a bitmap image.
 
-        The printer has a width of 384 dots. Each dot is a single bit.
+        The printer has a width of 384 dots. Each dot is a single bit. Rows are
+        sent in bands of up to ``band_height`` rows per ``print_bitmap``
+        command, each small enough to fit into the printer's buffer. The
+        throttle is charged once per band.
 
         :param width: Width of the image, in bytes. Maximum width is 48 (= 384
                       dots).
-        :param data: Must be total_dots/8 bytes long.
+        :param data: Must be total_dots/8 bytes long. Can be any object
+                     supporting the buffer protocol, e.g. ``bytes``,
+                     ``bytearray`` or a C-contiguous (2D) NumPy array, or an
+                     iterable of such objects, each holding a number of whole
+                     rows. Iterables are consumed while printing.
+        :param band_height: Number of rows to send per command, between 1 and
+                            255. Defaults to the printer's ``band_height``.
+        :param compress: If true, blank rows are sent as paper feeds and
+                         trailing white is trimmed, see
+                         :func:`~afthermal.bitmap.encode_bitmap`. Defaults to
+                         the printer's ``compress_bitmaps``.
+        """
+        for band in self.iter_bands(width, data, band_height, compress):
+            self.print_band(band)
+
+    def iter_bands(self, width, data, band_height=None, compress=None):
+        """Split a bitmap into bands for printing.
+
+        Takes the same arguments as :meth:`.print_image`.
+
+        :return: An iterator of :class:`~afthermal.bitmap.Band` instances,
+                 each of which can be passed to :meth:`.print_band`.
         """
-        if len(data) % width:
-            raise ValueError('Bad image format, length of data must be '
-                             'divisible by width.')
-        height = len(data) / width
+        if band_height is None:
+            band_height = self.band_height
+        if compress is None:
+            compress = self.compress_bitmaps
+
+        if band_height not in BAND_HEIGHTS:
+            raise ValueError('band_height must be between 1 and 255, is {}'
+                             .format(band_height))
 
-        # send line-by-line
-        for row in range(height):
-            self.send_command('print_bitmap', 1, width)
-            self.port.write(data[row*width:(row+1)*width], is_text=False)
-            self.port.fed_dots(1)
+        # a band and its header must fit into the printer's buffer
+        return encode_bitmap(data, width, band_height, compress,
+                             self.buffer_size - BITMAP_HEADER_SIZE)
+
+    def print_band(self, band):
+        """Print a single band of a bitmap.
+
+        :param band: A :class:`~afthermal.bitmap.Band`.
+        """
+        if band.data is None:
+            self.feed(band.rows)
+            return
+
+        self.send_command('print_bitmap', band.rows, band.width)
+        self.port.write(band.data, is_text=False)
+        self.port.fed_dots(band.rows,
+                           black_dots=row_dot_counts(band.data, band.width))
+
+    def enable_custom_font(self, enabled=True):
+        """Print user-defined characters instead of the internal ones."""
+        self.send_command('set_user_font', 1 if enabled else 0)
 
     def clear_custom_font(self):
         self.send_command('set_user_font', 0)
 
+    # flow control
+    def enable_busy_signal(self, enabled=True):
+        """Enable signalling busy on the printer's DTR line.
+
+        Required for the ``'busy'`` flow control mode of
+        :class:`~afthermal.port.ThrottledSerial`.
+        """
+        self.send_command('set_auto_status', 1 << 5 if enabled else 0)
+
     # other
     def print_test_page(self):
         self.send_command('print_test_page')
         self.port.fed_dots(28 * 32)  # 28 lines at fixed 32 dpl
 
     def reset(self):
-        for i in range(10):
-            # we run this a few times to clear data from the buffer. this
-            # usually is necessary if the program crashed mid-print
-            self.send_command('init')
-            self.send_command('set_print_mode', 0)
+        # we run this a few times to clear data from the buffer. this
+        # usually is necessary if the program crashed mid-print
+        self.send_commands(*[('init', ()), ('set_print_mode', (0,))] * 10)
+        self.layout.reset()
 
     def set_density(self, density, break_time):
         self.send_command('set_printing_density',
                           chr((break_time << 5) | density))
 
     def set_heat(self, max_dots=64, heat_time=800, interval=20):
-        self.max_dots = 64
-        self.heat_time = 800
-        self.interval = 20
+        self.max_dots = max_dots
+        self.heat_time = heat_time
+        self.interval = interval
+        self.port.heat = (max_dots, heat_time, interval)
 
         self.send_command(
             'set_control_parameter',
-            from_range(8, 2040 + 8, 8, 'max_dots')(max_dots),
-            from_range(30, 2550 + 10, 10, 'heat_time')(heat_time),
-            from_range(0, 2550 + 10, 10, 'heat_interval')(interval),
+            MAX_DOTS(max_dots),
+            HEAT_TIMES(heat_time),
+            HEAT_INTERVALS(interval),
         )
 
 
 class ThermalPrinter(CommandAliasMixin):
+    """Printer connected to a port.
+
+    :param port: A :class:`~afthermal.port.ThrottledSerial` instance.
+    :param band_height: Number of dot rows sent per ``print_bitmap`` command
+                        when printing images. Lower it if the printer's
+                        receive buffer overflows.
+    :param buffer_size: Size of the printer's receive buffer, in bytes. Bands
+                        are kept small enough to fit into it, as the printer
+                        cannot be throttled while a band is being sent.
+    :param compress_bitmaps: Whether or not to compress images by default,
+                             see :meth:`.print_image`.
+    :param pad_custom_characters: Send an extra null byte after each
+                                  user-defined character, see
+                                  :meth:`.upload_custom_character`. Only
+                                  disable it for printers that do not wait for
+                                  it, or they swallow the next byte sent.
+    """
     CHARS_PER_LINE = 32
     DOTS_PER_LINE = 384
+    BAND_HEIGHT = 255
+    BUFFER_SIZE = 4096
 
-    def __init__(self, port):
+    def __init__(self, port, band_height=None, compress_bitmaps=True,
+                 pad_custom_characters=True, buffer_size=None):
         self.port = port
+        self.layout = Layout(self.CHARS_PER_LINE)
+        self.band_height = (band_height if band_height is not None
+                            else self.BAND_HEIGHT)
+        self.buffer_size = (buffer_size if buffer_size is not None
+                            else self.BUFFER_SIZE)
+        self.compress_bitmaps = compress_bitmaps
+        self.pad_custom_characters = pad_custom_characters
         self.reset()
 
     def send_command(self, cmd, *args):
         self.write(get_command(cmd, *args))
 
+    def send_commands(self, *commands):
+        """Send several commands in a single write.
+
+        :param commands: ``(cmd, args)`` tuples, see
+                         :func:`~afthermal.hw.encode_many`.
+        """
+        self.write(encode_many(commands))
+
     @classmethod
-    def on_serial(cls, device='/dev/ttyAMA0', baudrate=19200):
-        port = ThrottledSerial(device, baudrate)
-        return cls(port)
+    def on_serial(cls, device='/dev/ttyAMA0', baudrate=19200,
+                  flow_control=None, metrics=None, **kwargs):
+        port = ThrottledSerial(device, baudrate, flow_control=flow_control,
+                               metrics=metrics)
+        printer = cls(port, **kwargs)
+
+        if flow_control == 'busy':
+            printer.enable_busy_signal()
+
+        return printer
 
     @classmethod
     def from_config_file(cls, fn='afthermal.conf'):
         cfg = json.load(fn)
 
-        printer = cls.on_serial(cfg['dev'], cfg['baudrate'])
+        printer = cls.on_serial(cfg['dev'], cfg['baudrate'],
+                                flow_control=cfg.get('flow_control'),
+                                band_height=cfg.get('band_height'),
+                                buffer_size=cfg.get('buffer_size'))
         printer.set_heat(
             max_dots=cfg['max_dots'],
             heat_time=cfg['heat_time'],
             interval=cfg['interval']
         )
 
+        if 'row_time' in cfg or 'heat_scale' in cfg:
+            defaults = DensityModel()
+            printer.port.density_model = DensityModel(
+                row_time=cfg.get('row_time', defaults.row_time),
+                heat_scale=cfg.get('heat_scale', defaults.heat_scale),
+            )
+
         return printer
 
     def write(self, *args, **kwargs):
         self.port.write(*args, **kwargs)
+
+    @contextmanager
+    def batch(self, max_size=4096):
+        """Coalesce writes inside context manager.
+
+        All commands and text are collected in a
+        :class:`~afthermal.port.CommandBuffer` and sent in as few writes as
+        possible, once per throttle deadline.
+
+        :param max_size: See :class:`~afthermal.port.CommandBuffer`.
+        """
+        port = self.port
+        buf = CommandBuffer(port, max_size)
+        self.port = buf
+        try:
+            yield buf
+        finally:
+            self.port = port
+            buf.flush()
+
+    @contextmanager
+    def record(self, out, passthrough=True):
+        """Record everything sent inside context manager.
+
+        The recording can be printed again with :meth:`.replay`, without
+        encoding text or converting images again.
+
+        :param out: A file opened for writing in binary mode.
+        :param passthrough: If true, the job is printed while being recorded.
+        """
+        port = self.port
+        recorder = JobRecorder(out, port if passthrough else None)
+        self.port = recorder
+        try:
+            yield recorder
+        finally:
+            self.port = port
+            recorder.flush()
+
+    def replay(self, fn):
+        """Print a job recorded with :meth:`.record`.
+
+        :param fn: Filename of the recording.
+        """
+        with RecordedJob(fn) as job:
+            job.replay(self.port)
@@ -0,0 +1,246 @@
+"""asyncio support.
+
+Requires Python 3.7 or newer. Commands are queued synchronously and sent out
+by awaiting :meth:`.AsyncThrottledSerial.drain`, so a single event loop can
+drive many printers without a thread per device.
+"""
+
+import asyncio
+import functools
+import os
+import time
+from collections import deque
+
+from . import CommandAliasMixin, ThermalPrinter
+from .port import ThrottledSerial, split_lines
+
+
+class AsyncThrottledSerial(ThrottledSerial):
+    """Throttled serial port for use with asyncio.
+
+    :meth:`.write` and the ``fed`` methods do not block but queue their
+    operation; :meth:`.drain` performs them in order. Data is written
+    non-blocking to the file descriptor of the port, throttling sleeps with
+    :func:`asyncio.sleep` until the throttle deadline has passed.
+
+    If a drain is cancelled, all queued operations are discarded. The printer
+    may be left in the middle of a command afterwards and should be reset.
+    """
+    def __init__(self, *args, **kwargs):
+        self._pending = deque()
+        # created by the first drain, in the running loop. before Python
+        # 3.10, locks are bound to the loop current when they are created
+        self._lock = None
+        super(AsyncThrottledSerial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        super(AsyncThrottledSerial, self).open()
+        os.set_blocking(self.fd, False)
+
+    def write(self, data, is_text=True):
+        """Queue data for writing.
+
+        :param data: Data to write.
+        :param is_text: See :meth:`.ThrottledSerial.write`.
+        """
+        for chunk, is_line in split_lines(data, is_text):
+            # data may change or be released before it is drained
+            self._pending.append(('data', bytes(chunk)))
+            if is_line:
+                self.fed_lines(1)
+
+    def fed(self, n_lines=0, n_dots=0, black_dots=None, dot_height=None):
+        self._pending.append(('fed', (n_lines, n_dots, black_dots,
+                                      dot_height)))
+
+    async def wait_for_write_async(self):
+        """Wait until the printer is safe to write to, without blocking."""
+        if self.flow_control == 'status' and self._status_pending:
+            await self._wait_for_status_async()
+        elif self.flow_control == 'busy':
+            await self._wait_for_busy_async()
+
+        delay = self.write_ready - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _wait_for_status_async(self):
+        while self._status_pending:
+            timeout = self.write_ready - time.time()
+            try:
+                if timeout <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(self._readable(), timeout)
+            except asyncio.TimeoutError:
+                # no answer in time, fall back to estimate
+                self._status_pending = 0
+                return
+
+            try:
+                status = os.read(self.fd, self._status_pending)
+            except BlockingIOError:
+                continue
+            self._status_pending -= len(status)
+            self.last_status = status[-1:]
+
+        self.write_ready = 0
+
+    async def _wait_for_busy_async(self):
+        # a busy printer deasserts CTS
+        while time.time() < self.write_ready:
+            if self.cts:
+                self.write_ready = 0
+                return
+            await asyncio.sleep(self.busy_poll_interval)
+
+    async def _wait_for_fd(self, add, remove):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def ready():
+            if not fut.done():
+                fut.set_result(None)
+
+        add(self.fd, ready)
+        try:
+            await fut
+        finally:
+            remove(self.fd)
+
+    def _readable(self):
+        loop = asyncio.get_running_loop()
+        return self._wait_for_fd(loop.add_reader, loop.remove_reader)
+
+    def _writable(self):
+        loop = asyncio.get_running_loop()
+        return self._wait_for_fd(loop.add_writer, loop.remove_writer)
+
+    async def write_async(self, data):
+        """Write data to the port without blocking the event loop.
+
+        Does not throttle, see :meth:`.drain`.
+
+        :param data: Data to write.
+        """
+        view = memoryview(data)
+        while view:
+            try:
+                n = os.write(self.fd, view)
+            except BlockingIOError:
+                n = 0
+            view = view[n:]
+
+            if view:
+                await self._writable()
+
+    async def drain(self):
+        """Send all queued operations to the printer."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            try:
+                while self._pending:
+                    op, arg = self._pending.popleft()
+                    if op == 'data':
+                        metrics = self.metrics
+                        if metrics is None:
+                            await self.wait_for_write_async()
+                            await self.write_async(arg)
+                            continue
+
+                        start = time.time()
+                        await self.wait_for_write_async()
+                        written = time.time()
+                        await self.write_async(arg)
+                        metrics.throttle_seconds.observe(written - start)
+                        metrics.write_seconds.observe(time.time() - written)
+                        metrics.writes.inc()
+                        metrics.bytes_written.inc(len(arg))
+                    else:
+                        ThrottledSerial.fed(self, *arg)
+            except asyncio.CancelledError:
+                self._pending.clear()
+                raise
+
+
+def _awaitable(name):
+    meth = getattr(CommandAliasMixin, name)
+
+    @functools.wraps(meth)
+    async def op(self, *args, **kwargs):
+        rv = getattr(self.printer, name)(*args, **kwargs)
+        await self.port.drain()
+        return rv
+    return op
+
+
+class AsyncThermalPrinter(object):
+    """Printer connected to an :class:`.AsyncThrottledSerial`.
+
+    Offers the same operations as :class:`~afthermal.ThermalPrinter`, but all
+    operations that send data to the printer are coroutines. Converters can be
+    used as well, with :class:`.AsyncThermalPrinter` their ``print_out`` and
+    ``print_file`` methods return awaitables.
+
+    The printer is reset on construction, the reset is sent once the first
+    operation is awaited. Use :meth:`.on_serial` to have it sent right away.
+
+    :param port: A :class:`.AsyncThrottledSerial` instance.
+    :param kwargs: Passed on to :class:`~afthermal.ThermalPrinter`.
+    """
+    # methods not sending any data
+    SYNC_METHODS = frozenset(['iter_bands'])
+
+    def __init__(self, port, **kwargs):
+        self.port = port
+        self.printer = ThermalPrinter(port, **kwargs)
+
+    def __getattr__(self, name):
+        # settings, such as DOTS_PER_LINE or band_height
+        return getattr(self.printer, name)
+
+    @classmethod
+    async def on_serial(cls, device='/dev/ttyAMA0', baudrate=19200,
+                        flow_control=None, metrics=None, **kwargs):
+        port = AsyncThrottledSerial(device, baudrate,
+                                    flow_control=flow_control,
+                                    metrics=metrics)
+        printer = cls(port, **kwargs)
+
+        if flow_control == 'busy':
+            await printer.enable_busy_signal()
+        else:
+            await printer.drain()
+        return printer
+
+    async def drain(self):
+        """Wait until all queued data has been sent."""
+        await self.port.drain()
+
+    async def send_command(self, cmd, *args):
+        self.printer.send_command(cmd, *args)
+        await self.port.drain()
+
+    async def write(self, *args, **kwargs):
+        self.printer.write(*args, **kwargs)
+        await self.port.drain()
+
+    async def print_image(self, width, data, band_height=None, compress=None):
+        """Print a bitmap, see :meth:`~afthermal.ThermalPrinter.print_image`.
+
+        Every band is sent before the next one is encoded, so bitmaps given
+        as an iterator of chunks are printed while they are being converted.
+        """
+        for band in self.printer.iter_bands(width, data, band_height,
+                                            compress):
+            self.printer.print_band(band)
+            await self.port.drain()
+
+
+for _name, _meth in list(vars(CommandAliasMixin).items()):
+    if (_name.startswith('_') or not callable(_meth) or
+            _name in AsyncThermalPrinter.SYNC_METHODS or
+            _name in vars(AsyncThermalPrinter)):
+        continue
+    setattr(AsyncThermalPrinter, _name, _awaitable(_name))
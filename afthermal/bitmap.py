@@ -0,0 +1,177 @@
+from collections import namedtuple
+
+
+#: A single unit of bitmap output. ``data`` holds ``rows * width`` bytes of
+#: packed bitmap data, or is ``None`` for a run of ``rows`` blank rows that is
+#: sent as a paper feed instead.
+Band = namedtuple('Band', ['rows', 'width', 'data'])
+
+# overhead in bytes of a print_bitmap (DC2 * r n) header
+BITMAP_HEADER_SIZE = 4
+
+# maximum number of dots that can be fed using a single ESC J n
+MAX_FEED = 255
+
+
+def as_bytes_view(data):
+    """Return a flat, byte-sized :class:`memoryview` of ``data``.
+
+    :param data: Any object supporting the buffer protocol. Multi-dimensional
+                 buffers must be C-contiguous.
+    """
+    buf = memoryview(data)
+    if buf.ndim != 1 or buf.format != 'B':
+        buf = buf.cast('B')
+    return buf
+
+
+def trimmed_width(row):
+    """Return the width of a row of packed bitmap data without its trailing
+    white (``0x00``) bytes.
+
+    :param row: A row of packed bitmap data.
+    """
+    return len(bytes(row).rstrip(b'\x00'))
+
+
+def row_dot_counts(data, width):
+    """Count the black dots in each row of packed bitmap data.
+
+    :param data: Packed bitmap data, see :func:`.as_bytes_view`.
+    :param width: Width of a row, in bytes.
+    :return: A list with the number of black dots for each row.
+    """
+    buf = bytes(as_bytes_view(data))
+    return [bin(int.from_bytes(buf[o:o+width], 'big')).count('1')
+            for o in range(0, len(buf), width)]
+
+
+def iter_chunks(data):
+    """Iterate over chunks of bitmap data.
+
+    :param data: Either a single object supporting the buffer protocol, or an
+                 iterable of them.
+    :return: An iterator of flat, byte-sized :class:`memoryview` instances.
+    """
+    try:
+        yield as_bytes_view(data)
+    except TypeError:
+        for chunk in data:
+            yield as_bytes_view(chunk)
+
+
+def encode_bitmap(data, width, band_height=255, compress=True,
+                  max_size=None):
+    """Split a packed bitmap into bands.
+
+    Without compression, the image is split into bands of ``band_height`` rows
+    of full ``width``. With compression enabled, runs of blank rows are turned
+    into paper feeds and each band is narrowed to its widest row once trailing
+    white bytes are removed. Bands are split wherever starting a new, narrower
+    band costs fewer bytes than widening the current one.
+
+    The bitmap can be passed in chunks of whole rows, which are consumed
+    lazily. Bands and runs of blank rows span chunks; the rows of a band left
+    unfinished at the end of a chunk are copied and joined with the next one.
+
+    :param data: Packed bitmap data, see :func:`.iter_chunks`.
+    :param width: Width of a row, in bytes.
+    :param band_height: Maximum number of rows per band.
+    :param compress: Whether or not to compress the bitmap.
+    :param max_size: Maximum number of bytes of bitmap data per band. Bands
+                     are never shorter than a single row.
+    :return: An iterator of :class:`.Band` instances.
+    """
+    def make_band(start, rows, bw):
+        if bw == width:
+            return Band(rows, width, buf[start*width:(start+rows)*width])
+
+        return Band(rows, bw, b''.join(
+            bytes(buf[r*width:r*width+bw]) for r in range(start, start+rows)
+        ))
+
+    # rows per band without compression
+    full = band_height
+    if max_size is not None:
+        full = max(1, min(full, max_size // width))
+
+    blank = 0       # length of current run of blank rows
+    carry = None    # rows of the unfinished band of the previous chunk
+
+    start = 0       # first row of current band
+    rows = 0        # number of rows in current band
+    bw = 0          # width of current band
+
+    for chunk in iter_chunks(data):
+        if len(chunk) % width:
+            raise ValueError('Bad image format, length of data must be '
+                             'divisible by width.')
+
+        first = 0
+        buf = chunk
+        if carry:
+            first = len(carry) // width
+            buf = memoryview(carry + chunk)
+            carry = None
+        height = len(buf) // width
+
+        if not compress:
+            for start in range(0, height, full):
+                rows = min(full, height - start)
+                if rows < full:
+                    carry = bytearray(buf[start*width:])
+                    break
+                yield Band(rows, width, buf[start*width:(start+rows)*width])
+            continue
+
+        for row in range(first, height):
+            w = trimmed_width(buf[row*width:(row+1)*width])
+
+            if not w:
+                if rows:
+                    yield make_band(start, rows, bw)
+                    rows = 0
+                blank += 1
+                if blank == MAX_FEED:
+                    yield Band(blank, width, None)
+                    blank = 0
+                continue
+
+            if blank:
+                yield Band(blank, width, None)
+                blank = 0
+
+            if rows:
+                # widening the band costs the extra bytes for every row in
+                # it, starting a new band costs a header
+                grow = rows * (w - bw) if w > bw else 0
+                shrink = bw - w if w < bw else 0
+                if (rows == band_height or
+                        (max_size is not None and
+                         (rows + 1) * max(bw, w) > max_size) or
+                        grow > BITMAP_HEADER_SIZE or
+                        shrink > BITMAP_HEADER_SIZE):
+                    yield make_band(start, rows, bw)
+                    rows = 0
+
+            if not rows:
+                start, bw = row, w
+            else:
+                bw = max(bw, w)
+            rows += 1
+
+        if rows:
+            # an open band always ends on the last row, continue it with the
+            # next chunk
+            carry = bytearray(buf[start*width:])
+            start = 0
+
+    if carry:
+        buf = memoryview(carry)
+        if compress:
+            yield make_band(0, rows, bw)
+        else:
+            yield Band(len(carry) // width, width, buf)
+
+    if blank:
+        yield Band(blank, width, None)
@@ -1,4 +1,6 @@
+import glob
 import json
+import os
 
 import click
 
@@ -16,8 +18,10 @@ from .util import in_range
 @click.option('-i', '--img-lib', default='opencv',
               type=click.Choice(['opencv', 'pil']),
               help='Imaging library to use. OpenCV recommended.')
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              help='Directory to cache converted images in.')
 @click.pass_context
-def main(ctx, dev, config, space, img_lib):
+def main(ctx, dev, config, space, img_lib, cache_dir):
     obj = {}
     ctx.obj = obj
 
@@ -36,12 +40,18 @@ def main(ctx, dev, config, space, img_lib):
 
     obj['space'] = space
 
+    cache = None
+    if cache_dir:
+        from afthermal.img.cache import BitmapCache
+        cache = BitmapCache(cache_dir)
+
     if img_lib == 'opencv':
         from afthermal.img.opencv import OpenCVImageConverter
-        obj['img_converter'] = OpenCVImageConverter(obj['printer'])
+        obj['img_converter'] = OpenCVImageConverter(obj['printer'],
+                                                    cache=cache)
     elif img_lib == 'pil':
         from afthermal.img.pil import PILImageConverter
-        obj['img_converter'] = PILImageConverter(obj['printer'])
+        obj['img_converter'] = PILImageConverter(obj['printer'], cache=cache)
     else:
         raise ValueError('Unknown image library: {}'.format(img_lib))
 
@@ -63,30 +73,50 @@ def test(obj):
 
 
 @main.command('print-image')
-@click.argument('imagefile', type=click.Path(exists=True))
+@click.argument('imagefiles', nargs=-1, required=True)
+@click.option('-j', '--jobs', type=int, default=1,
+              help='Number of processes used to convert images.')
 @click.pass_obj
-def print_image(obj, imagefile):
+def print_image(obj, imagefiles, jobs):
     c = obj['img_converter']
 
-    c.print_file(imagefile)
-
-    if obj['space']:
-        obj['printer'].write("\n\n")
+    # expand patterns not expanded by the shell, names of existing files are
+    # used as is, even if they contain glob characters
+    fns = []
+    for pattern in imagefiles:
+        if os.path.exists(pattern):
+            fns.append(pattern)
+            continue
+
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise click.BadParameter('No such file: {}'.format(pattern))
+        fns.extend(matches)
+
+    def space():
+        if obj['space']:
+            obj['printer'].write(b'\n\n')
+
+    if jobs == 1:
+        for fn in fns:
+            c.print_file(fn)
+            space()
+    else:
+        from .img.batch import BatchConverter
+        BatchConverter(c, jobs).print_files(fns, after=space)
 
 
 @main.command('print-qrcode')
 @click.argument('text')
 @click.pass_obj
 def print_qrcode(obj, text):
-    import pyqrcode
     from .img.qr import QRCodeConverter
 
     converter = QRCodeConverter(obj['printer'])
-    code = pyqrcode.create(text)
-    converter.print_out(code)
+    converter.print_out(text)
 
     if obj['space']:
-        obj['printer'].write("\n\n")
+        obj['printer'].write(b'\n\n')
 
 
 @main.command()
@@ -0,0 +1,418 @@
+"""Emulation of a printer, for testing and benchmarking without hardware.
+
+:class:`.EmulatedPort` takes the place of a
+:class:`~afthermal.port.ThrottledSerial`. Everything written to it is
+interpreted like the printer would, rendering a raster of the printed paper.
+Text is drawn as pseudo-glyphs: boxes showing the bits of each character code,
+which is enough to check layout and formatting.
+
+Time is virtual. Throttling advances the clock instead of sleeping, the
+printer's progress is modelled separately, so writes arriving faster than the
+printer prints can be detected as buffer overruns.
+"""
+
+from collections import deque
+import struct
+import zlib
+
+from .bitmap import row_dot_counts
+from .hw import CMDS
+from .port import ThrottledSerial
+
+DOTS_PER_LINE = 384
+CHARS_PER_LINE = 32
+CHAR_WIDTH = 12
+CHAR_HEIGHT = 24
+
+# maps command sequences to (name, number of arguments)
+COMMANDS = dict((seq, (name, nargs)) for name, (seq, nargs) in CMDS.items())
+
+# first bytes of all command sequences
+PREFIXES = frozenset(seq[:1] for seq in COMMANDS)
+
+# bits of ESC ! n
+PRINT_MODE_BITS = (
+    (1 << 1, 'invert'),
+    (1 << 2, 'updown'),
+    (1 << 3, 'bold'),
+    (1 << 4, 'double_height'),
+    (1 << 5, 'double_width'),
+)
+
+# each byte unpacked into 8 dots, 1 being black
+_UNPACK = [bytes(bytearray((b >> (7 - i)) & 1 for i in range(8)))
+           for b in range(256)]
+
+# maps dots to binary digits, 1 being white
+_DIGITS = bytes(bytearray([ord('1'), ord('0')])).ljust(256, b'0')
+
+# pseudo-glyphs by character code
+_glyphs = {}
+
+
+def _draw_glyph(code):
+    rows = [bytearray(CHAR_WIDTH) for _ in range(CHAR_HEIGHT)]
+    if code == 0x20:
+        return rows
+
+    for y in range(2, 22):
+        rows[y][1] = rows[y][10] = 1
+    for x in range(1, 11):
+        rows[2][x] = rows[21][x] = 1
+    for bit in range(7):
+        if code & (1 << bit):
+            for y in (4 + 2 * bit, 5 + 2 * bit):
+                for x in range(3, 9):
+                    rows[y][x] = 1
+    return rows
+
+
+def pseudo_glyph(code):
+    """Draw a pseudo-glyph for a character.
+
+    :param code: Character code.
+    :return: A list of 24 rows of 12 dots each, as :class:`bytearray`, 1 being
+             black. Spaces are blank, other characters a box with one bar for
+             each bit of their code set.
+    """
+    glyph = _glyphs.get(code)
+    if glyph is None:
+        glyph = _glyphs[code] = _draw_glyph(code)
+    return [bytearray(row) for row in glyph]
+
+
+def user_glyph(data):
+    """Draw a user-defined character.
+
+    :param data: Columns of 3 bytes, see
+                 :meth:`~afthermal.ThermalPrinter.upload_custom_character`.
+    :return: See :func:`.pseudo_glyph`.
+    """
+    rows = [bytearray(CHAR_WIDTH) for _ in range(CHAR_HEIGHT)]
+    data = bytearray(data)
+    for x in range(len(data) // 3):
+        column = data[3 * x] << 16 | data[3 * x + 1] << 8 | data[3 * x + 2]
+        for y in range(CHAR_HEIGHT):
+            if column & (1 << (CHAR_HEIGHT - 1 - y)):
+                rows[y][x] = 1
+    return rows
+
+
+class EmulatedPort(ThrottledSerial):
+    """A port connected to an emulated printer.
+
+    Throttles like :class:`~afthermal.port.ThrottledSerial`, but on a virtual
+    clock, :attr:`.clock`. Data is transmitted at ``baudrate``, byte by byte.
+    The printer starts on each command, character or row of a bitmap as soon
+    as it has been received and everything before it has been printed, so
+    printing overlaps reception. Received bytes are held in the printer's
+    receive buffer until they have been printed. Every write during which the
+    buffer overflows is recorded as an overrun, at the time it overflowed.
+
+    :param baudrate: Transmission speed, in baud.
+    :param buffer_size: Size of the printer's receive buffer, in bytes.
+    :param printer_model: A :class:`~afthermal.port.DensityModel` used to time
+                          the printing of dots. Defaults to the one the host
+                          uses for throttling.
+    :param text_dot_time: Time needed to print a row of dots of text, in
+                          seconds.
+    """
+    def __init__(self, baudrate=19200, buffer_size=4096, printer_model=None,
+                 text_dot_time=0.005):
+        super(EmulatedPort, self).__init__(baudrate=baudrate)
+        self.buffer_size = buffer_size
+        self.printer_model = (printer_model if printer_model is not None
+                              else self.density_model)
+        self.text_dot_time = text_dot_time
+
+        self.clock = 0.0
+        self.busy_until = 0.0
+        self.bytes_written = 0
+        self.overruns = []
+        self.errors = []
+
+        # (time work is done, bytes it holds) for each unit of work in the
+        # buffer
+        self._queue = deque()
+        self._buffered = 0
+
+        self.rows = []
+        self.user_chars = {}
+        self._pending = b''
+        self._init()
+
+    def _now(self):
+        return self.clock
+
+    def _sleep(self, seconds):
+        self.clock += seconds
+
+    # printer state
+    def _init(self):
+        self.mode = dict((name, False) for _, name in PRINT_MODE_BITS)
+        self.mode['underline'] = False
+        self.mode['user_font'] = False
+        self.line_spacing = 32
+        self.align = 0
+        self.printer_heat = (64, 800, 20)
+        self.user_chars.clear()
+        self._line = []
+        self._cells = 0
+
+    @property
+    def print_time(self):
+        """Time at which the printer has finished all data written so far."""
+        return max(self.busy_until, self.clock)
+
+    def _write(self, data):
+        data = bytes(data)
+        byte_time = 10.0 / self.baudrate
+        start = self.clock
+        self.bytes_written += len(data)
+        self.clock += len(data) * byte_time
+
+        # bytes held back by the parser arrived with an earlier write
+        offset = len(self._pending)
+        prev = 0
+        overrun = False
+        for end, work in self._parse(data):
+            arrival = start + max(end - offset, 0) * byte_time
+            while self._queue and self._queue[0][0] <= arrival:
+                self._buffered -= self._queue.popleft()[1]
+
+            self._buffered += end - prev
+            if self._buffered > self.buffer_size and not overrun:
+                self.overruns.append(arrival)
+                overrun = True
+
+            self.busy_until = max(self.busy_until, arrival) + work
+            self._queue.append((self.busy_until, end - prev))
+            prev = end
+
+    # parsing
+    def _parse(self, data):
+        # returns a list of (end, work) tuples for each unit of work, end
+        # being the position just past its last byte in the pending data
+        # followed by data
+        buf = self._pending + data
+        units = []
+        pos = 0
+
+        while pos < len(buf):
+            b = buf[pos:pos + 1]
+
+            if b in PREFIXES:
+                seq = buf[pos:pos + 2]
+                if len(seq) < 2:
+                    break
+                if seq not in COMMANDS:
+                    self.errors.append('Unknown command {!r}'.format(seq))
+                    pos += 2
+                    continue
+
+                name, nargs = COMMANDS[seq]
+                end = pos + 2 + nargs
+                if end > len(buf):
+                    break
+                args = bytearray(buf[pos + 2:end])
+
+                size = self._payload_size(name, args, buf, end)
+                if size is None or end + size > len(buf):
+                    break
+                payload = buf[end:end + size]
+                if name == 'print_bitmap':
+                    # rows are printed as they arrive
+                    units.append((end, self._print_line()))
+                    width = args[1]
+                    units.extend(
+                        (end + (r + 1) * width, work) for r, work in
+                        enumerate(self._bitmap(args[0], width, payload)))
+                else:
+                    units.append((end + size,
+                                  self._command(name, args, payload)))
+                pos = end + size
+                continue
+
+            pos += 1
+            if b == b'\n':
+                units.append((pos, self._print_line(feed_empty=True)))
+            elif b >= b' ':
+                units.append((pos, self._char(ord(b))))
+
+        self._pending = buf[pos:]
+        return units
+
+    def _payload_size(self, name, args, buf, start):
+        # number of bytes following the arguments of a command
+        if name == 'print_bitmap':
+            return args[0] * args[1]
+        if name == 'define_character':
+            y, c1, c2 = args
+            size = 0
+            for _ in range(c1, c2 + 1):
+                if start + size >= len(buf):
+                    return None
+                width = bytearray(buf[start + size:start + size + 1])[0]
+                size += 1 + y * width
+            return size
+        return 0
+
+    def _command(self, name, args, payload):
+        if name == 'print_and_feed':
+            return self._print_line() + self._feed(args[0])
+        if name == 'print_and_linefeed':
+            work = self._print_line()
+            return work + sum(self._print_line(feed_empty=True)
+                              for _ in range(args[0]))
+        if name == 'print_test_page':
+            return self._feed(28 * 32)
+
+        if name == 'init':
+            self._init()
+        elif name == 'set_line_spacing':
+            self.line_spacing = args[0]
+        elif name == 'set_text_align':
+            self.align = args[0]
+        elif name == 'set_print_mode':
+            for bit, mode in PRINT_MODE_BITS:
+                self.mode[mode] = bool(args[0] & bit)
+        elif name == 'set_font_enlarge':
+            self.mode['double_height'] = bool(args[0] & 0x0F)
+            self.mode['double_width'] = bool(args[0] & 0xF0)
+        elif name == 'set_font_bold':
+            self.mode['bold'] = bool(args[0])
+        elif name == 'enable_double_width':
+            self.mode['double_width'] = True
+        elif name == 'disable_double_width':
+            self.mode['double_width'] = False
+        elif name == 'set_updown_mode':
+            self.mode['updown'] = bool(args[0])
+        elif name == 'set_reverse_mode':
+            self.mode['invert'] = bool(args[0])
+        elif name == 'set_underline':
+            self.mode['underline'] = bool(args[0])
+        elif name == 'set_user_font':
+            self.mode['user_font'] = bool(args[0])
+        elif name == 'define_character':
+            y, c1, c2 = args
+            pos = 0
+            for code in range(c1, c2 + 1):
+                width = bytearray(payload[pos:pos + 1])[0]
+                self.user_chars[code] = payload[pos + 1:pos + 1 + y * width]
+                pos += 1 + y * width
+        elif name == 'set_control_parameter':
+            # inverse of CommandAliasMixin.set_heat
+            self.printer_heat = (8 + 8 * args[0], 30 + 10 * args[1],
+                                 10 * args[2])
+        return 0.0
+
+    # printing
+    def _emit(self, rows):
+        self.rows.extend(rows)
+
+    def _feed(self, n_dots):
+        self._emit(bytearray(DOTS_PER_LINE) for _ in range(n_dots))
+        return self.printer_model.dots_time([0] * n_dots, *self.printer_heat)
+
+    def _bitmap(self, n_rows, width, data):
+        # returns the time needed for each row
+        for r in range(n_rows):
+            row = b''.join(_UNPACK[b] for b in bytearray(
+                data[r * width:(r + 1) * width]))
+            self._emit([bytearray(row[:DOTS_PER_LINE].ljust(
+                DOTS_PER_LINE, b'\x00'))])
+        return [self.printer_model.dots_time([n], *self.printer_heat)
+                for n in row_dot_counts(data, width)]
+
+    def _char(self, code):
+        mode = self.mode
+        if mode['user_font'] and code in self.user_chars:
+            glyph = user_glyph(self.user_chars[code])
+        else:
+            glyph = pseudo_glyph(code)
+
+        if mode['updown']:
+            glyph.reverse()
+        if mode['underline']:
+            glyph[CHAR_HEIGHT - 1] = bytearray([1]) * CHAR_WIDTH
+        if mode['invert']:
+            glyph = [bytearray(1 - d for d in row) for row in glyph]
+
+        cells = 2 if mode['double_width'] else 1
+        work = 0.0
+        if self._cells + cells > CHARS_PER_LINE:
+            work = self._print_line()
+
+        self._line.append((glyph, cells, mode['double_height']))
+        self._cells += cells
+        if self._cells == CHARS_PER_LINE:
+            # full lines are printed right away
+            work += self._print_line()
+        return work
+
+    def _print_line(self, feed_empty=False):
+        if not self._line and not feed_empty:
+            return 0.0
+
+        tall = any(dh for _, _, dh in self._line)
+        char_height = CHAR_HEIGHT * (2 if tall else 1)
+        height = max(self.line_spacing, char_height)
+        rows = [bytearray(DOTS_PER_LINE) for _ in range(height)]
+
+        used = self._cells * CHAR_WIDTH
+        x = {0: 0, 1: (DOTS_PER_LINE - used) // 2,
+             2: DOTS_PER_LINE - used}.get(self.align, 0)
+
+        for glyph, cells, dh in self._line:
+            sy = 2 if dh else 1
+            top = char_height - CHAR_HEIGHT * sy
+            for y in range(CHAR_HEIGHT * sy):
+                src = glyph[y // sy]
+                if cells == 2:
+                    src = bytearray(d for d in src for _ in (0, 1))
+                rows[top + y][x:x + CHAR_WIDTH * cells] = src
+            x += CHAR_WIDTH * cells
+
+        self._line = []
+        self._cells = 0
+        self._emit(rows)
+        return height * self.text_dot_time
+
+    # output
+    def to_array(self):
+        """Return the printed paper as a NumPy array.
+
+        :return: A ``uint8`` array of shape ``(rows, 384)``, 0 being black and
+                 255 white.
+        """
+        import numpy as np
+
+        if not self.rows:
+            return np.zeros((0, DOTS_PER_LINE), dtype=np.uint8) + 255
+        dots = np.frombuffer(b''.join(bytes(r) for r in self.rows),
+                             dtype=np.uint8).reshape(-1, DOTS_PER_LINE)
+        return (1 - dots) * np.uint8(255)
+
+    def to_png(self, out):
+        """Write the printed paper as a black and white PNG.
+
+        :param out: A file opened in binary mode.
+        """
+        def chunk(kind, data):
+            out.write(struct.pack('>I', len(data)) + kind + data +
+                      struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+        # 1 bit grayscale, set bits are white. every row starts with filter
+        # type 0
+        rows = self.rows or [bytearray(DOTS_PER_LINE)]
+        raw = b''.join(
+            b'\x00' + int(bytes(row).translate(_DIGITS), 2).to_bytes(
+                DOTS_PER_LINE // 8, 'big')
+            for row in rows
+        )
+
+        out.write(b'\x89PNG\r\n\x1a\n')
+        chunk(b'IHDR', struct.pack('>IIBBBBB', DOTS_PER_LINE, len(rows),
+                                   1, 0, 0, 0, 0))
+        chunk(b'IDAT', zlib.compress(raw))
+        chunk(b'IEND', b'')
@@ -0,0 +1,169 @@
+"""Printing of small icons as user-defined characters.
+
+An icon printed as a bitmap costs a ``print_bitmap`` command and 48 bytes of
+data for a 12x24 dot icon. Uploaded as a user-defined character once, every
+further use of it costs a single character plus switching the user-defined
+font on and off.
+"""
+
+from collections import OrderedDict
+
+from six import int2byte, text_type
+
+from .hw import get_command
+
+# first and last character codes available for user-defined characters
+FIRST_CODE = 0x20
+LAST_CODE = 0x7E
+
+USER_FONT_ON = get_command('set_user_font', 1)
+USER_FONT_OFF = get_command('set_user_font', 0)
+
+
+class Glyph(object):
+    """A user-defined character.
+
+    :param data: Up to 12 columns of 24 dots each, 3 bytes per column, see
+                 :meth:`~afthermal.ThermalPrinter.upload_custom_character`.
+    """
+    def __init__(self, data):
+        data = bytes(data)
+        if len(data) % 3 or len(data) > 36:
+            raise ValueError('Glyph data must be up to 12 columns of 3 bytes, '
+                             'is {} bytes'.format(len(data)))
+        self.data = data
+
+    def __eq__(self, other):
+        return isinstance(other, Glyph) and self.data == other.data
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.data)
+
+    @classmethod
+    def from_bitmap(cls, width, data, columns=12):
+        """Create a glyph from packed bitmap data.
+
+        :param width: Width of a row in bytes, as returned by converters.
+        :param data: 24 rows of packed bitmap data, see
+                     :meth:`~afthermal.ThermalPrinter.print_image`.
+        :param columns: Number of dots per row to use, at most 12.
+        """
+        data = bytearray(data)
+        if len(data) != 24 * width:
+            raise ValueError('Glyph bitmap must be 24 rows high, is {}'
+                             .format(len(data) / float(width)))
+
+        out = bytearray()
+        for x in range(columns):
+            mask = 0x80 >> (x % 8)
+            column = 0
+            for y in range(24):
+                column <<= 1
+                if data[y * width + x // 8] & mask:
+                    column |= 1
+            out.extend(bytearray([column >> 16, (column >> 8) & 0xFF,
+                                  column & 0xFF]))
+        return cls(out)
+
+
+class GlyphManager(object):
+    """Keeps track of user-defined characters loaded on a printer.
+
+    Glyphs are uploaded when first used, into a free character code or the
+    one of the least recently used glyph. The printer forgets all
+    user-defined characters on reset, call :meth:`.reset` afterwards.
+
+    :param printer: A :class:`~afthermal.ThermalPrinter` instance.
+    :param codes: Character codes to use for glyphs. Defaults to all of them.
+    :param encoding: Encoding of text passed to :meth:`.write`.
+    """
+    def __init__(self, printer, codes=None, encoding='ascii'):
+        if codes is None:
+            codes = range(FIRST_CODE, LAST_CODE + 1)
+
+        self.printer = printer
+        self.codes = list(codes)
+        self.encoding = encoding
+        self.uploads = 0
+
+        for code in self.codes:
+            if not FIRST_CODE <= code <= LAST_CODE:
+                raise ValueError('Character codes must be between {} and {}, '
+                                 'got {}'.format(FIRST_CODE, LAST_CODE, code))
+        self.reset()
+
+    def reset(self):
+        """Forget all loaded glyphs."""
+        # maps glyphs to their codes, least recently used first
+        self.loaded = OrderedDict()
+        self.free = list(reversed(self.codes))
+
+    def load(self, glyph, pinned=()):
+        """Make sure a glyph is loaded.
+
+        :param glyph: A :class:`.Glyph`.
+        :param pinned: Glyphs that must not be evicted.
+        :return: The character code of the glyph.
+        """
+        code = self.loaded.pop(glyph, None)
+
+        if code is None:
+            if self.free:
+                code = self.free.pop()
+            else:
+                for victim in self.loaded:
+                    if victim not in pinned:
+                        break
+                else:
+                    raise ValueError('Cannot use more than {} glyphs at once'
+                                     .format(len(self.codes)))
+                code = self.loaded.pop(victim)
+
+            self.printer.upload_custom_character(code, glyph.data)
+            self.uploads += 1
+
+        self.loaded[glyph] = code
+        return code
+
+    def encode(self, *parts):
+        """Encode text and glyphs, uploading glyphs as needed.
+
+        Uploads are written to the printer right away, so the result must be
+        written before any other glyph is loaded.
+
+        :param parts: Text and :class:`.Glyph` instances.
+        :return: A byte string.
+        """
+        pinned = set(p for p in parts if isinstance(p, Glyph))
+        buf = []
+        in_font = False
+
+        for part in parts:
+            if isinstance(part, Glyph):
+                if not in_font:
+                    buf.append(USER_FONT_ON)
+                    in_font = True
+                buf.append(int2byte(self.load(part, pinned)))
+                continue
+
+            if in_font:
+                buf.append(USER_FONT_OFF)
+                in_font = False
+            if isinstance(part, text_type):
+                part = part.encode(self.encoding)
+            buf.append(part)
+
+        if in_font:
+            buf.append(USER_FONT_OFF)
+        return b''.join(buf)
+
+    def write(self, *parts):
+        """Print text and glyphs.
+
+        :param parts: Text and :class:`.Glyph` instances, e.g.
+                      ``write(wifi, ' connected\\n')``.
+        """
+        self.printer.write(self.encode(*parts))
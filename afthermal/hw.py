@@ -1,3 +1,5 @@
+import struct
+
 from six import int2byte
 
 
@@ -48,8 +50,9 @@ CMDS = {
     'set_underline': (b'\x1B\x2D', 1),
     # ESC % n    Select/Cancel user-defined characters
     'set_user_font': (b'\x1B\x25', 1),
-    # ESC &      Define user-defined characters
-    'define_character': (b'\x1B\x26', -1),
+    # ESC & y c1 c2  Define user-defined characters c1 to c2, followed by
+    #                the width x and y * x bytes of data of each character
+    'define_character': (b'\x1B\x26', 3),
     # ESC R n    Select an internal character set
     'select_charset': (b'\x1B\x52', 1),
     # EST t n    Select character code table
@@ -67,6 +70,15 @@ CMDS = {
     # DC2 V      Print MSB bitmap
     # DC2 v      Print LSB bitmap
 
+    # STATUS COMMAND
+    # ESC v n    Transmit paper sensor status
+    'transmit_paper_status': (b'\x1B\x76', 1),
+    # GS r n     Transmit status, answered with a single status byte
+    'transmit_status': (b'\x1D\x72', 1),
+    # GS a n     Enable/disable automatic status back, bit 5 enables the busy
+    #            signal on the DTR line
+    'set_auto_status': (b'\x1D\x61', 1),
+
     # BOARD PARA COMMAND
     'print_test_page': (b'\x12\x54', 0),
 
@@ -79,15 +91,89 @@ CMDS = {
 }
 
 
-def get_command(cmd, *args):
+def _arg_error(cmd, args):
+    return ValueError('Invalid arguments for {}: {}, must be between 0 and '
+                      '255'.format(cmd, args))
+
+
+def _count_error(cmd, nargs):
+    return ValueError('Invalid argument count for {}, needs {}'.format(
+        cmd, nargs)
+    )
+
+
+def compile_command(cmd):
+    """Create an encoder for a command.
+
+    Commands without arguments encode to constant bytes, those with a single
+    argument are looked up in a table of all 256 possible sequences. All
+    others are packed with :mod:`struct`.
+
+    :param cmd: Name of the command, see ``CMDS``.
+    :return: A function taking the command's arguments and returning its byte
+             sequence.
+    """
     seq, nargs = CMDS[cmd]
 
-    if not len(args) == nargs:
-        raise ValueError('Invalid argument count for {}, needs {}'.format(
-            cmd, nargs)
-        )
+    if nargs == 0:
+        def encode(*args):
+            if args:
+                raise _count_error(cmd, nargs)
+            return seq
+    elif nargs == 1:
+        table = tuple(seq + int2byte(i) for i in range(256))
+
+        def encode(*args):
+            if len(args) != 1:
+                raise _count_error(cmd, nargs)
+            arg = args[0]
+            if arg < 0:
+                raise _arg_error(cmd, args)
+            try:
+                return table[arg]
+            except (IndexError, TypeError):
+                raise _arg_error(cmd, args)
+    else:
+        packer = struct.Struct('{}B'.format(nargs))
+
+        def encode(*args):
+            if len(args) != nargs:
+                raise _count_error(cmd, nargs)
+            try:
+                return seq + packer.pack(*args)
+            except struct.error:
+                raise _arg_error(cmd, args)
+
+    encode.__name__ = cmd
+    return encode
+
+
+#: Encoders for all commands, see :func:`compile_command`.
+ENCODERS = dict((cmd, compile_command(cmd)) for cmd in CMDS)
+
+
+def get_command(cmd, *args):
+    """Encode a command.
+
+    :param cmd: Name of the command, see ``CMDS``.
+    :param args: Arguments, each a single byte.
+    :return: The encoded command.
+    """
+    return ENCODERS[cmd](*args)
+
 
-    buf = [seq]
-    buf.extend(int2byte(i) for i in args)
+def encode_many(commands, out=None):
+    """Encode several commands at once.
 
-    return b''.join(buf)
+    :param commands: An iterable of ``(cmd, args)`` tuples, e.g.
+                     ``[('set_font_bold', (1,)), ('init', ())]``.
+    :param out: Optional :class:`bytearray` to append the encoded commands to.
+    :return: The encoded commands, as :class:`bytes` or ``out``.
+    """
+    # joining sizes up all parts first and copies them into a single
+    # allocation, faster than filling a buffer part by part in Python
+    data = b''.join([ENCODERS[cmd](*args) for cmd, args in commands])
+    if out is None:
+        return data
+    out += data
+    return out
@@ -11,15 +11,27 @@ class ObjectConverter(object):
 
     :param printer: Printer to send data to when printing is requested.
     """
+    #: Number of rows per chunk yielded by :meth:`.convert_bands`.
+    band_height = 24
+
     def __init__(self, printer):
         self.printer = printer
 
+    def __getstate__(self):
+        # printers cannot be pickled, converters are sent to other processes
+        # without them
+        state = self.__dict__.copy()
+        state['printer'] = None
+        return state
+
     def print_out(self, obj):
         """Print object.
 
         :param obj: An object to print.
+        :return: Whatever the printer's ``print_image`` returns, an awaitable
+                 for :class:`~afthermal.aio.AsyncThermalPrinter`.
         """
-        self.printer.print_image(*self.convert(obj))
+        return self.printer.print_image(*self.convert_bands(obj))
 
     def convert(self, obj):
         """Convert an object into printable bitmap.
@@ -30,6 +42,23 @@ class ObjectConverter(object):
         """
         raise NotImplementedError
 
+    def convert_bands(self, obj):
+        """Convert an object into printable bitmap, chunk by chunk.
+
+        Converters that can produce their output incrementally yield each
+        chunk of :attr:`.band_height` rows as soon as it is final, so
+        printing can start right away and memory use does not grow with the
+        height of the bitmap. By default, the result of :meth:`.convert` is
+        returned as a single chunk.
+
+        :param obj: Object to convert.
+        :return: A tuple of ``(width, chunks)`` suitable for passing to
+                 :meth:`.ThermalPrinter.print_image`, ``chunks`` being an
+                 iterator of buffers.
+        """
+        width, data = self.convert(obj)
+        return width, iter([data])
+
 
 class ImageConverter(ObjectConverter):
     """Converts images to bitmap data suitable for printing.
@@ -37,14 +66,17 @@ class ImageConverter(ObjectConverter):
     :param printer: A :class:`.ThermalPrinter` instance.
     :param width: Number of dots to print picture with (width). Defaults to
                   the maximum width of the printer.
+    :param cache: Optional :class:`~afthermal.img.cache.BitmapCache` used by
+                  :meth:`.convert_file`.
     """
-    def __init__(self, printer, width=None):
+    def __init__(self, printer, width=None, cache=None):
         super(ImageConverter, self).__init__(printer)
 
         if width is None:
             width = printer.DOTS_PER_LINE
 
         self.width = width
+        self.cache = cache
 
         # use from range to sanity check
         from_range(8, printer.DOTS_PER_LINE+1, 8, 'width')
@@ -57,10 +89,36 @@ class ImageConverter(ObjectConverter):
         """
         raise NotImplementedError
 
+    def cache_params(self):
+        """Return all settings that affect conversion results.
+
+        Subclasses with additional settings must extend the tuple.
+        """
+        return (type(self).__name__, self.width)
+
+    def convert_file(self, fn):
+        """Open and convert a file, using the cache if there is one.
+
+        :param fn: Filename to open.
+        :return: See :meth:`.convert`.
+        """
+        if self.cache is None:
+            return self.convert(self.open(fn))
+
+        key = self.cache.key(fn, self.cache_params())
+        rv = self.cache.get(key)
+        if rv is None:
+            rv = self.cache.put(key, *self.convert(self.open(fn)))
+        return rv
+
     def print_file(self, fn):
         """Prints a file directly.
 
+        Without a cache, the image is printed while it is being converted.
+
         :param fn: Filename to open.
+        :return: See :meth:`.print_out`.
         """
-        img = self.open(fn)
-        self.print_out(img)
+        if self.cache is None:
+            return self.print_out(self.open(fn))
+        return self.printer.print_image(*self.convert_file(fn))
@@ -0,0 +1,99 @@
+"""Batch conversion of images on a process pool.
+
+Requires Python 3.8 or newer. Converted bitmaps are passed back from the worker
+processes through :mod:`multiprocessing.shared_memory` instead of being
+pickled.
+"""
+
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+# converter of the current worker process, see _init_worker
+_converter = None
+
+
+def _init_worker(converter):
+    global _converter
+    _converter = converter
+
+
+def _convert_file(fn):
+    width, data = _converter.convert_file(fn)
+
+    view = memoryview(data).cast('B')
+    shm = SharedMemory(create=True, size=max(len(view), 1))
+    try:
+        shm.buf[:len(view)] = view
+
+        # the parent process takes ownership and unlinks the segment
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm.name, width, len(view)
+    finally:
+        view.release()
+        shm.close()
+
+
+class BatchConverter(object):
+    """Converts many files in parallel.
+
+    Opening, resizing and dithering of each file happens in a worker process
+    of a :class:`multiprocessing.Pool`. Results are returned in the order the
+    files were submitted, each as soon as it and all of its predecessors are
+    ready.
+
+    :param converter: An :class:`~afthermal.img.ImageConverter`. It is copied
+                      to the workers without its printer. If it has a cache,
+                      only the on-disk part is shared with the workers.
+    :param processes: Number of worker processes, defaults to the number of
+                      CPUs.
+    """
+    def __init__(self, converter, processes=None):
+        self.converter = converter
+        self.processes = processes
+
+    def convert_files(self, fns):
+        """Convert files.
+
+        The bitmap data of each result lives in shared memory, which is freed
+        when the next result is requested. It must not be used afterwards.
+
+        :param fns: An iterable of filenames.
+        :return: An iterator of ``(width, data)`` tuples suitable for passing
+                 to :meth:`~afthermal.ThermalPrinter.print_image`, ``data``
+                 being a :class:`memoryview`.
+        """
+        pool = Pool(self.processes, _init_worker, (self.converter,))
+        results = pool.imap(_convert_file, fns)
+        try:
+            for name, width, size in results:
+                shm = SharedMemory(name=name)
+                view = shm.buf[:size]
+                try:
+                    yield width, view
+                finally:
+                    view.release()
+                    shm.close()
+                    shm.unlink()
+        finally:
+            pool.close()
+
+            # free results that were never consumed
+            try:
+                for name, _, _ in results:
+                    SharedMemory(name=name).unlink()
+            except Exception:
+                pass
+            pool.join()
+
+    def print_files(self, fns, after=None):
+        """Convert and print files.
+
+        :param fns: An iterable of filenames.
+        :param after: Optional callable, called without arguments after each
+                      image has been printed.
+        """
+        printer = self.converter.printer
+        for width, data in self.convert_files(fns):
+            printer.print_image(width, data)
+            if after is not None:
+                after()
@@ -0,0 +1,156 @@
+"""Caching of converted bitmaps.
+
+Converting an image means decoding, resizing and dithering it, which takes far
+longer than sending the result to the printer. Images printed over and over,
+such as logos, only need to be converted once if their bitmaps are kept.
+"""
+
+from collections import namedtuple
+import hashlib
+import os
+import struct
+import tempfile
+
+from ..bitmap import as_bytes_view
+from ..util import LRUCache
+
+#: Cache statistics. ``hits`` counts all hits, ``disk_hits`` those that had to
+#: be read from disk. ``size`` is the number of bytes held in memory.
+CacheStats = namedtuple('CacheStats',
+                        ['hits', 'disk_hits', 'misses', 'entries', 'size'])
+
+# stored files start with the width of the bitmap
+HEADER = struct.Struct('>I')
+
+
+def _entry_size(entry):
+    return len(entry[1])
+
+
+class BitmapCache(object):
+    """Cache of converted bitmaps.
+
+    Entries are kept in memory, up to ``max_bytes`` of bitmap data, least
+    recently used entries are evicted first. If a ``path`` is given, entries
+    are written to files in it as well and read back when they are not found
+    in memory, so they survive restarts and can be shared among processes.
+
+    :param path: Optional directory to store entries in. Created if missing.
+    :param max_bytes: Maximum size of all bitmaps kept in memory.
+    :param max_entries: Maximum number of entries kept in memory.
+    :param hash_contents: If true, files are identified by a hash of their
+                          contents instead of their path, modification time
+                          and size. Costs reading the file for every lookup,
+                          but finds copies and ignores ``touch``.
+    """
+    def __init__(self, path=None, max_bytes=4 * 1024 * 1024, max_entries=256,
+                 hash_contents=False):
+        self.path = path
+        self.hash_contents = hash_contents
+        self.memory = LRUCache(max_entries, max_bytes, _entry_size)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def __getstate__(self):
+        # sent to worker processes without the entries held in memory
+        state = self.__dict__.copy()
+        state['memory'] = LRUCache(self.memory.max_size, self.memory.max_bytes,
+                                   _entry_size)
+        return state
+
+    @property
+    def stats(self):
+        """A :class:`.CacheStats` instance."""
+        return CacheStats(self.hits, self.disk_hits, self.misses,
+                          len(self.memory), self.memory.size)
+
+    def key(self, fn, params=()):
+        """Create a key for a file.
+
+        :param fn: Filename of the source image.
+        :param params: A tuple of all parameters affecting the conversion. Must
+                       have a stable ``repr``.
+        :return: A key for use with :meth:`.get` and :meth:`.put`.
+        """
+        h = hashlib.sha1()
+        if self.hash_contents:
+            with open(fn, 'rb') as f:
+                for block in iter(lambda: f.read(64 * 1024), b''):
+                    h.update(block)
+        else:
+            st = os.stat(fn)
+            h.update(repr((os.path.abspath(fn), st.st_mtime, st.st_size))
+                     .encode('utf8'))
+        h.update(repr(params).encode('utf8'))
+        return h.hexdigest()
+
+    def _fn(self, key):
+        return os.path.join(self.path, key + '.bitmap')
+
+    def get(self, key):
+        """Look up a bitmap.
+
+        :param key: See :meth:`.key`.
+        :return: A tuple of ``(width, data)`` or ``None`` on a miss.
+        """
+        entry = self.memory.get(key)
+        if entry is None and self.path is not None:
+            entry = self._load(key)
+            if entry is not None:
+                self.disk_hits += 1
+                self.memory[key] = entry
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def _load(self, key):
+        try:
+            with open(self._fn(key), 'rb') as f:
+                buf = f.read()
+        except (IOError, OSError):
+            return None
+
+        if len(buf) < HEADER.size:
+            return None
+        return HEADER.unpack_from(buf)[0], buf[HEADER.size:]
+
+    def put(self, key, width, data):
+        """Store a bitmap.
+
+        :param key: See :meth:`.key`.
+        :param width: Width of the bitmap, in bytes.
+        :param data: Bitmap data, see :func:`~afthermal.bitmap.as_bytes_view`.
+        :return: The stored ``(width, data)`` tuple, ``data`` being
+                 :class:`bytes`.
+        """
+        entry = width, bytes(as_bytes_view(data))
+        self.memory[key] = entry
+
+        if self.path is not None:
+            # write to a temporary file first, so concurrent readers never see
+            # partial entries
+            fd, tmp = tempfile.mkstemp(dir=self.path)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(HEADER.pack(width))
+                    f.write(entry[1])
+                os.rename(tmp, self._fn(key))
+            except Exception:
+                os.unlink(tmp)
+                raise
+        return entry
+
+    def clear(self):
+        """Remove all entries, including those on disk."""
+        self.memory.clear()
+        if self.path is not None:
+            for name in os.listdir(self.path):
+                if name.endswith('.bitmap'):
+                    os.unlink(os.path.join(self.path, name))
@@ -0,0 +1,324 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+import os
+import threading
+
+from libc.stdlib cimport calloc, free
+from libc.string cimport memset
+
+ctypedef unsigned char px_t
+ctypedef short err_t
+
+cdef enum:
+    # error buffers are padded on both sides, so no bounds checks are required
+    PAD = 2
+    MAX_TAPS = 16
+    # progress of a row is published every BLOCK pixels
+    BLOCK = 8
+
+
+cdef extern from *:
+    """
+    #if defined(_MSC_VER)
+    #include <windows.h>
+    static int afthermal_load(int *p) {
+        int v = *(volatile int *)p; MemoryBarrier(); return v;
+    }
+    static void afthermal_store(int *p, int v) {
+        MemoryBarrier(); *(volatile int *)p = v;
+    }
+    static void afthermal_yield(void) { SwitchToThread(); }
+    #else
+    #include <sched.h>
+    static int afthermal_load(int *p) {
+        return __atomic_load_n(p, __ATOMIC_ACQUIRE);
+    }
+    static void afthermal_store(int *p, int v) {
+        __atomic_store_n(p, v, __ATOMIC_RELEASE);
+    }
+    static void afthermal_yield(void) { sched_yield(); }
+    #endif
+    """
+    int afthermal_load(int *p) nogil
+    void afthermal_store(int *p, int v) nogil
+    void afthermal_yield() nogil
+
+
+cdef struct kernel_t:
+    int ntaps
+    int div
+    int depth   # number of rows touched, including the current one
+    int reach   # maximum horizontal distance
+    int dx[MAX_TAPS]
+    int dy[MAX_TAPS]
+    int w[MAX_TAPS]
+
+
+# kernels are in the form of ((dx, dy, weight), ...), divisor. weights need
+# not add up to the divisor (see atkinson)
+KERNELS = {
+    'floydsteinberg': (
+        ((1, 0, 7),
+         (-1, 1, 3), (0, 1, 5), (1, 1, 1)),
+        16,
+    ),
+    'atkinson': (
+        ((1, 0, 1), (2, 0, 1),
+         (-1, 1, 1), (0, 1, 1), (1, 1, 1),
+         (0, 2, 1)),
+        8,
+    ),
+    'jarvis': (
+        ((1, 0, 7), (2, 0, 5),
+         (-2, 1, 3), (-1, 1, 5), (0, 1, 7), (1, 1, 5), (2, 1, 3),
+         (-2, 2, 1), (-1, 2, 3), (0, 2, 5), (1, 2, 3), (2, 2, 1)),
+        48,
+    ),
+    'stucki': (
+        ((1, 0, 8), (2, 0, 4),
+         (-2, 1, 2), (-1, 1, 4), (0, 1, 8), (1, 1, 4), (2, 1, 2),
+         (-2, 2, 1), (-1, 2, 2), (0, 2, 4), (1, 2, 2), (2, 2, 1)),
+        42,
+    ),
+    'sierra_lite': (
+        ((1, 0, 2),
+         (-1, 1, 1), (0, 1, 1)),
+        4,
+    ),
+}
+
+
+cdef int load_kernel(kernel_t *k, name) except -1:
+    if name not in KERNELS:
+        raise ValueError('Unknown dithering kernel: {}'.format(name))
+    taps, div = KERNELS[name]
+
+    k.ntaps = len(taps)
+    k.div = div
+    k.depth = 1
+    k.reach = 0
+    for i, (dx, dy, w) in enumerate(taps):
+        k.dx[i] = dx
+        k.dy[i] = dy
+        k.w[i] = w
+        k.depth = max(k.depth, dy + 1)
+        k.reach = max(k.reach, abs(dx))
+    return 0
+
+
+cdef inline void diffuse_row(const kernel_t *k, px_t *row, int cols,
+                             err_t *cur, err_t **tgt, int step,
+                             int *above, int lag, int *progress) noexcept nogil:
+    # dithers a single row. if above is not NULL, waits for the row above to
+    # be at least lag pixels ahead and publishes its own progress
+    cdef int i, j, x, val, out, e, acc, need
+    cdef int half = k.div // 2
+    cdef int off[MAX_TAPS]
+
+    for j in range(k.ntaps):
+        off[j] = k.dx[j] * step
+
+    for i in range(cols):
+        if above != NULL and i % BLOCK == 0:
+            need = min(i + BLOCK - 1 + lag, cols)
+            while afthermal_load(above) < need:
+                afthermal_yield()
+
+        x = i if step == 1 else cols - 1 - i
+
+        acc = cur[x]
+        if acc >= 0:
+            val = row[x] + (acc + half) / k.div
+        else:
+            val = row[x] + (acc - half) / k.div
+
+        out = 255 if val > 127 else 0
+        row[x] = out
+        e = val - out
+
+        for j in range(k.ntaps):
+            tgt[j][x + off[j]] += e * k.w[j]
+
+        if progress != NULL and i % BLOCK == BLOCK - 1:
+            afthermal_store(progress, i + 1)
+
+    if progress != NULL:
+        afthermal_store(progress, cols)
+
+
+cdef class ErrorDiffuser:
+    """Dithers a grayscale image using error diffusion.
+
+    Errors are accumulated in rolling ``int16`` row buffers, unscaled, and
+    only divided when read, so no error is lost to clamping or rounding on the
+    way. The image can be fed in blocks of rows, the error state carries over
+    from one call of :meth:`.process` to the next. The GIL is released while
+    dithering.
+
+    :param cols: Width of the image.
+    :param kernel: Name of the kernel, see ``KERNELS``.
+    :param serpentine: If true, every other row is scanned right to left.
+    """
+    cdef kernel_t k
+    cdef int cols, stride, y
+    cdef bint serpentine
+    cdef err_t *err
+
+    def __cinit__(self, int cols, kernel='floydsteinberg',
+                  bint serpentine=False):
+        load_kernel(&self.k, kernel)
+
+        self.cols = cols
+        self.stride = cols + 2 * PAD
+        self.serpentine = serpentine
+        self.y = 0
+
+        self.err = <err_t*> calloc(self.k.depth * self.stride, sizeof(err_t))
+        if self.err == NULL:
+            raise MemoryError()
+
+    def __dealloc__(self):
+        free(self.err)
+
+    def process(self, px_t[:, ::1] img not None):
+        """Dither rows of an image in place.
+
+        :param img: A C-contiguous ``uint8`` array of shape ``(rows, cols)``.
+                    Rows continue where the previous call left off.
+        :return: ``img``, containing only the values 0 and 255.
+        """
+        if img.shape[1] != self.cols:
+            raise ValueError('Image must be {} pixels wide, is {}'.format(
+                self.cols, img.shape[1]))
+
+        if img.shape[0]:
+            with nogil:
+                self._rows(&img[0, 0], img.shape[0])
+        return img.base
+
+    cdef void _rows(self, px_t *data, int rows) noexcept nogil:
+        cdef int r, j, step
+        cdef err_t *cur
+        cdef err_t *tgt[MAX_TAPS]
+
+        for r in range(rows):
+            cur = self.err + (self.y % self.k.depth) * self.stride + PAD
+            for j in range(self.k.ntaps):
+                tgt[j] = (self.err + ((self.y + self.k.dy[j]) % self.k.depth)
+                          * self.stride + PAD)
+
+            # serpentine rows mirror the kernel
+            step = -1 if self.serpentine and self.y & 1 else 1
+            diffuse_row(&self.k, data + r * self.cols, self.cols, cur, tgt,
+                        step, NULL, 0, NULL)
+
+            # row is done, recycle its buffer for the row depth rows below
+            memset(cur - PAD, 0, self.stride * sizeof(err_t))
+            self.y += 1
+
+
+cdef class Wavefront:
+    """Dithers a grayscale image using error diffusion on multiple threads.
+
+    Rows are distributed round-robin across threads. Each row trails the row
+    above by just enough pixels to see all of its errors, so the result is
+    identical to that of :class:`.ErrorDiffuser`. Errors are kept for the
+    whole image instead of in rolling row buffers.
+
+    :param img: A C-contiguous ``uint8`` array of shape ``(rows, cols)``.
+    :param kernel: Name of the kernel, see ``KERNELS``.
+    :param threads: Number of threads to use.
+    """
+    cdef kernel_t k
+    cdef px_t[:, ::1] img
+    cdef int rows, cols, stride, threads, lag
+    cdef err_t *err
+    cdef int *progress
+
+    def __cinit__(self, px_t[:, ::1] img not None, kernel='floydsteinberg',
+                  int threads=2):
+        load_kernel(&self.k, kernel)
+
+        self.img = img
+        self.rows = img.shape[0]
+        self.cols = img.shape[1]
+        self.stride = self.cols + 2 * PAD
+        self.threads = max(threads, 1)
+
+        # a row must not read a pixel before the row above has added its
+        # error and must not add to a pixel the row above is still adding to
+        self.lag = 2 * self.k.reach + 1
+
+        self.err = <err_t*> calloc((self.rows + self.k.depth) * self.stride,
+                                   sizeof(err_t))
+        self.progress = <int*> calloc(max(self.rows, 1), sizeof(int))
+        if self.err == NULL or self.progress == NULL:
+            raise MemoryError()
+
+    def __dealloc__(self):
+        free(self.err)
+        free(self.progress)
+
+    def run(self):
+        """Dither the image in place.
+
+        :return: The image, containing only the values 0 and 255.
+        """
+        workers = [threading.Thread(target=self.run_rows, args=(n,))
+                   for n in range(1, self.threads)]
+        for worker in workers:
+            worker.start()
+
+        self.run_rows(0)
+
+        for worker in workers:
+            worker.join()
+        return self.img.base
+
+    def run_rows(self, int first):
+        """Dither every ``threads``-th row, starting at ``first``."""
+        if self.rows:
+            with nogil:
+                self._run_rows(first)
+
+    cdef void _run_rows(self, int first) noexcept nogil:
+        cdef int y, j
+        cdef err_t *tgt[MAX_TAPS]
+        cdef int *above
+
+        y = first
+        while y < self.rows:
+            for j in range(self.k.ntaps):
+                tgt[j] = (self.err + (y + self.k.dy[j]) * self.stride + PAD)
+
+            above = self.progress + y - 1 if y else NULL
+            diffuse_row(&self.k, &self.img[y, 0], self.cols,
+                        self.err + y * self.stride + PAD, tgt, 1,
+                        above, self.lag, self.progress + y)
+            y += self.threads
+
+
+def error_diffusion(px_t[:, ::1] img, kernel='floydsteinberg',
+                    bint serpentine=False, threads=1):
+    """Dither a grayscale image in place.
+
+    :param img: A C-contiguous ``uint8`` array of shape ``(rows, cols)``.
+    :param kernel: Name of the kernel, see ``KERNELS``.
+    :param serpentine: If true, every other row is scanned right to left.
+    :param threads: Number of threads to use, ``None`` to use one per CPU.
+                    Multiple threads cannot be combined with ``serpentine``.
+    :return: ``img``, containing only the values 0 and 255.
+    """
+    if threads is None:
+        threads = os.cpu_count() or 1
+
+    if threads > 1:
+        if serpentine:
+            raise ValueError('Serpentine scanning cannot be multi-threaded')
+        return Wavefront(img, kernel, threads).run()
+
+    return ErrorDiffuser(img.shape[1], kernel, serpentine).process(img)
+
+
+def floydsteinberg(px_t[:, ::1] img):
+    # image should be a grayscale image
+    return error_diffusion(img, 'floydsteinberg')
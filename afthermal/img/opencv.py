@@ -2,21 +2,66 @@ import cv2
 import numpy as np
 
 from . import ImageConverter
-from .floydsteinberg import floydsteinberg
+from .ordered import MASKS, ordered_dither
+from .pack import pack_array, packed_width
+
+try:
+    from .dither import ErrorDiffuser, error_diffusion
+except ImportError:
+    # C extension not built, fall back to ordered dithering
+    ErrorDiffuser = error_diffusion = None
+
+# error diffusion kernels, see afthermal.img.dither
+DIFFUSION_KERNELS = ('floydsteinberg', 'atkinson', 'jarvis', 'stucki',
+                     'sierra_lite')
+
+# used instead of error diffusion if the C extension is missing
+FALLBACK_MASK = 'bluenoise'
 
 
 class OpenCVImageConverter(ImageConverter):
+    """Converts OpenCV images.
+
+    :param bw_conv: Black and white conversion method. Either
+                    ``'bin_threshold'``, ``'mean_threshold'``,
+                    ``'gauss_threshold'``, one of the error diffusion
+                    kernels (``'floydsteinberg'``, ``'atkinson'``,
+                    ``'jarvis'``, ``'stucki'`` and ``'sierra_lite'``) or one
+                    of the ordered dithering masks (``'bayer2'``,
+                    ``'bayer4'``, ``'bayer8'``, ``'bayer16'`` and
+                    ``'bluenoise'``). Error diffusion requires the
+                    :mod:`~afthermal.img.dither` C extension; without it,
+                    ``'bluenoise'`` is used instead.
+    :param serpentine: Scan every other row right to left when using error
+                       diffusion.
+    :param threads: Number of threads used for error diffusion, ``None`` to
+                    use one per CPU. Cannot be combined with ``serpentine``.
+    """
     def __init__(self, printer, width=None, bw_conv='floydsteinberg',
-                 thresh_c=3, thresh_blksize=5):
-        super(OpenCVImageConverter, self).__init__(printer, width)
+                 thresh_c=3, thresh_blksize=5, serpentine=False, threads=1,
+                 cache=None):
+        super(OpenCVImageConverter, self).__init__(printer, width, cache)
         self.bw_conv = bw_conv
         self.thresh_c = thresh_c
         self.thresh_blksize = thresh_blksize
+        self.serpentine = serpentine
+        self.threads = threads
 
     def open(self, fn):
         return cv2.imread(fn)
 
+    def cache_params(self):
+        # without the C extension, error diffusion kernels fall back to
+        # ordered dithering
+        return super(OpenCVImageConverter, self).cache_params() + (
+            self.bw_conv, self.thresh_c, self.thresh_blksize, self.serpentine,
+            error_diffusion is not None)
+
     def convert(self, image):
+        width, chunks = self.convert_bands(image)
+        return width, b''.join(chunk.tobytes() for chunk in chunks)
+
+    def convert_bands(self, image):
         img = image
 
         # resize
@@ -26,20 +71,28 @@ class OpenCVImageConverter(ImageConverter):
             h, w = img.shape
             color = False
 
-        if len(img) > self.width:
+        if w > self.width:
             img = cv2.resize(img, (self.width, int(float(self.width) * h / w)))
 
         # convert to grayscale
         if color:
             img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-        # convert to B/W
+        return packed_width(img.shape[1]), self._iter_bands(img)
+
+    def _iter_bands(self, img):
+        rows, cols = img.shape
+        bh = self.band_height
+
+        # convert to B/W. thresholds and multi-threaded error diffusion need
+        # the whole image, everything else is done band by band
         adap_ts = {
             'mean_threshold': cv2.ADAPTIVE_THRESH_MEAN_C,
             'gauss_threshold': cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
         }
+        diffuser = None
+        mask = None
         if np.amax(img) != 1:
-            # pass
             if self.bw_conv == 'bin_threshold':
                 img = cv2.threshold(img, 127, 1, cv2.THRESH_BINARY)[1]
             elif self.bw_conv in adap_ts:
@@ -50,13 +103,30 @@ class OpenCVImageConverter(ImageConverter):
                     thresholdType=cv2.THRESH_BINARY,
                     blockSize=self.thresh_blksize,
                     C=self.thresh_c)
-            elif self.bw_conv == 'floydsteinberg':
-                img = floydsteinberg(img)
+            elif (self.bw_conv in DIFFUSION_KERNELS and error_diffusion and
+                    self.threads != 1):
+                img = error_diffusion(np.array(img), self.bw_conv,
+                                      self.serpentine, self.threads)
+            elif self.bw_conv in DIFFUSION_KERNELS and error_diffusion:
+                diffuser = ErrorDiffuser(cols, self.bw_conv, self.serpentine)
+            elif self.bw_conv in DIFFUSION_KERNELS:
+                mask = FALLBACK_MASK
+            elif self.bw_conv in MASKS:
+                mask = self.bw_conv
             else:
                 raise ValueError('Unknown conversion method: {}'.format(
                     self.bw_conv
                 ))
 
-        # pack into bitstring and then invert
-        packed = np.invert(np.packbits(img))
-        return self.width / 8, packed.tostring()
+        for y in range(0, rows, bh):
+            band = img[y:y+bh]
+
+            if diffuser is not None:
+                # error diffusion works in place, on a copy of each band
+                band = diffuser.process(np.array(band))
+            elif mask is not None:
+                band = ordered_dither(band, mask, y)
+
+            # bands are queued rather than sent right away by asynchronous
+            # printers, so each gets a buffer of its own
+            yield pack_array(band)
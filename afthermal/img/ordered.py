@@ -0,0 +1,154 @@
+"""Ordered dithering using NumPy only.
+
+Every pixel is compared against a threshold mask tiled over the image, which
+needs no C extension and is a single vectorized operation.
+"""
+
+import numpy as np
+
+#: Names of all masks, usable as ``bw_conv`` values.
+MASKS = ('bayer2', 'bayer4', 'bayer8', 'bayer16', 'bluenoise')
+
+_masks = {}
+_tiled = {}
+
+
+def bayer_matrix(n):
+    """Create a Bayer index matrix.
+
+    :param n: Size of the matrix, a power of two.
+    :return: An ``(n, n)`` integer array containing each of ``0 .. n*n-1``.
+    """
+    if n < 1 or n & (n - 1):
+        raise ValueError('Bayer matrix size must be a power of two, is {}'
+                         .format(n))
+
+    m = np.zeros((1, 1), dtype=np.intp)
+    while len(m) < n:
+        m = np.block([[4 * m, 4 * m + 2],
+                      [4 * m + 3, 4 * m + 1]])
+    return m
+
+
+def void_and_cluster(size=64, sigma=1.5, seed=0):
+    """Create a blue noise rank matrix using the void-and-cluster method.
+
+    :param size: Width and height of the (toroidal) matrix.
+    :param sigma: Standard deviation of the gaussian energy filter.
+    :param seed: Seed for the initial random pattern.
+    :return: A ``(size, size)`` integer array containing each of
+             ``0 .. size*size-1``.
+    """
+    n = size * size
+
+    # gaussian filter centered on (0, 0), wrapping around
+    d = np.minimum(np.arange(size), size - np.arange(size))
+    gauss = np.exp(-(d[:, None] ** 2 + d[None, :] ** 2) / (2 * sigma ** 2))
+
+    def energy_of(pattern):
+        return np.real(np.fft.ifft2(np.fft.fft2(pattern) *
+                                    np.fft.fft2(gauss)))
+
+    def toggle(energy, idx, sign):
+        y, x = divmod(idx, size)
+        energy += sign * np.roll(gauss, (y, x), axis=(0, 1))
+
+    # initial pattern: random points, relaxed until the tightest cluster is
+    # also the largest void
+    rng = np.random.RandomState(seed)
+    pattern = np.zeros((size, size), dtype=bool)
+    pattern.flat[rng.choice(n, n // 10, replace=False)] = True
+    energy = energy_of(pattern)
+
+    for _ in range(n):
+        cluster = np.argmax(np.where(pattern, energy, -np.inf))
+        pattern.flat[cluster] = False
+        toggle(energy, cluster, -1)
+
+        void = np.argmin(np.where(pattern, np.inf, energy))
+        pattern.flat[void] = True
+        toggle(energy, void, 1)
+
+        if void == cluster:
+            break
+
+    ones = int(pattern.sum())
+    ranks = np.zeros(n, dtype=np.intp)
+
+    # rank initial points by removing the tightest clusters
+    prototype, proto_energy = pattern.copy(), energy.copy()
+    for rank in range(ones - 1, -1, -1):
+        cluster = np.argmax(np.where(pattern, energy, -np.inf))
+        pattern.flat[cluster] = False
+        toggle(energy, cluster, -1)
+        ranks[cluster] = rank
+
+    # rank the remainder by filling the largest voids
+    pattern, energy = prototype, proto_energy
+    for rank in range(ones, n):
+        void = np.argmin(np.where(pattern, np.inf, energy))
+        pattern.flat[void] = True
+        toggle(energy, void, 1)
+        ranks[void] = rank
+
+    return ranks.reshape(size, size)
+
+
+def threshold_mask(name):
+    """Return a threshold mask.
+
+    Masks are created on first use and cached.
+
+    :param name: Name of the mask, see :data:`.MASKS`.
+    :return: A 2D ``uint8`` array of thresholds.
+    """
+    mask = _masks.get(name)
+    if mask is None:
+        if name == 'bluenoise':
+            ranks = void_and_cluster()
+        elif name in MASKS:
+            ranks = bayer_matrix(int(name[len('bayer'):]))
+        else:
+            raise ValueError('Unknown threshold mask: {}'.format(name))
+
+        # spread ranks evenly across 0..255
+        mask = ((ranks + 0.5) * 256 / ranks.size).astype(np.uint8)
+        mask.flags.writeable = False
+        _masks[name] = mask
+    return mask
+
+
+def tiled_mask(name, rows, cols):
+    """Return a threshold mask tiled to cover an image.
+
+    The tiled mask is cached per mask and width and grows as needed.
+
+    :param name: Name of the mask, see :data:`.MASKS`.
+    :param rows: Number of rows to cover.
+    :param cols: Number of columns to cover.
+    :return: A read-only ``(rows, cols)`` ``uint8`` array.
+    """
+    tiled = _tiled.get((name, cols))
+    if tiled is None or len(tiled) < rows:
+        mask = threshold_mask(name)
+        mh, mw = mask.shape
+        reps = (-(-rows // mh), -(-cols // mw))
+        tiled = np.tile(mask, reps)[:, :cols]
+        tiled.flags.writeable = False
+        _tiled[(name, cols)] = tiled
+    return tiled[:rows]
+
+
+def ordered_dither(img, mask='bayer8', row_offset=0):
+    """Dither a grayscale image.
+
+    :param img: A 2D ``uint8`` array.
+    :param mask: Name of the threshold mask, see :data:`.MASKS`.
+    :param row_offset: Row of the whole image ``img`` starts at, when
+                       dithering an image in parts.
+    :return: A new array of the same shape, containing only 0 and 255.
+    """
+    rows, cols = img.shape
+    tiled = tiled_mask(mask, row_offset + rows, cols)[row_offset:]
+    out = np.greater(img, tiled)
+    return out.view(np.uint8) * np.uint8(255)
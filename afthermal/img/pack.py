@@ -0,0 +1,104 @@
+"""Packing of black and white images into printer bitmap data.
+
+The printer expects eight dots per byte, most significant bit first, a set bit
+being a black dot. Images use the opposite convention, zero (or ``False``)
+pixels are black and all others white. Rows whose width is not a multiple of
+eight are padded with white dots.
+
+NumPy is only required for packing arrays.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# maps each byte to its inverse
+INVERT = bytes(bytearray(255 - i for i in range(256)))
+
+# maps each byte to itself with all bits past the first n cleared
+PAD_MASKS = [bytes(bytearray(i & (0xFF << (8 - n)) & 0xFF
+                             for i in range(256)))
+             for n in range(8)]
+
+
+def packed_width(cols):
+    """Return the number of bytes needed for a row of ``cols`` dots."""
+    return -(-cols // 8)
+
+
+def pack_array(img, out=None):
+    """Pack a black and white array.
+
+    :param img: A 2D array of shape ``(rows, cols)``. Any dtype works, zero
+                pixels are black and others white, so boolean, ``0``/``1`` and
+                ``0``/``255`` images are all fine.
+    :param out: Optional ``uint8`` array of shape
+                ``(rows, packed_width(cols))`` to write the result to. NumPy
+                still packs into a temporary array, which is then copied.
+    :return: A ``uint8`` array of shape ``(rows, packed_width(cols))``,
+             ``out`` if given.
+    """
+    img = np.asarray(img)
+    rows, cols = img.shape
+    shape = (rows, packed_width(cols))
+    if out is not None and out.shape != shape:
+        raise ValueError('Output buffer must be of shape {}, is {}'.format(
+            shape, out.shape))
+
+    # packbits cannot write to a given array, its result is inverted in place
+    # or into out
+    packed = np.packbits(img, axis=1)
+    out = np.invert(packed, out=packed if out is None else out)
+
+    # padding bits are zero (black) after inverting
+    if cols % 8:
+        out[:, -1] &= np.uint8(0xFF << (8 - cols % 8) & 0xFF)
+    return out
+
+
+def pack_image(im, out=None):
+    """Pack a PIL image.
+
+    :param im: A PIL image. Images not in mode ``'1'`` are converted first,
+               which dithers them.
+    :param out: Optional writable buffer of at least
+                ``rows * packed_width(cols)`` bytes to write the result to.
+    :return: The packed data, either as :class:`bytes` or as a
+             :class:`memoryview` of ``out``.
+    """
+    if im.mode != '1':
+        im = im.convert('1')
+
+    cols, rows = im.size
+    width = packed_width(cols)
+    data = im.tobytes().translate(INVERT)
+
+    if cols % 8:
+        data = bytearray(data)
+        data[width-1::width] = data[width-1::width].translate(
+            PAD_MASKS[cols % 8])
+
+    if out is None:
+        return bytes(data)
+
+    view = memoryview(out).cast('B')[:len(data)]
+    if len(view) != len(data):
+        raise ValueError('Output buffer must hold at least {} bytes'.format(
+            len(data)))
+    view[:] = data
+    return view
+
+
+def pack(obj, out=None):
+    """Pack a black and white image into bitmap data.
+
+    :param obj: Either a PIL image (see :func:`.pack_image`) or a 2D array
+                (see :func:`.pack_array`).
+    :param out: Optional output buffer, see the respective function.
+    :return: An object supporting the buffer protocol, holding the packed
+             rows.
+    """
+    if hasattr(obj, 'tobytes') and hasattr(obj, 'mode'):
+        return pack_image(obj, out)
+    return pack_array(obj, out)
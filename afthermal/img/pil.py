@@ -1,6 +1,7 @@
 from PIL import Image
 
 from . import ImageConverter
+from .pack import pack_image, packed_width
 
 
 class PILImageConverter(ImageConverter):
@@ -9,6 +10,10 @@ class PILImageConverter(ImageConverter):
         return im
 
     def convert(self, image):
+        width, chunks = self.convert_bands(image)
+        return width, b''.join(chunks)
+
+    def convert_bands(self, image):
         im = image
 
         # resize
@@ -17,11 +22,15 @@ class PILImageConverter(ImageConverter):
                 self.width) * im.size[1] / im.size[0]
             )))
 
-        # convert to B/W
+        # convert to B/W. PIL dithers the whole image at once, which is fast
+        # and only keeps a single bit per pixel around
         if im.mode != '1':
             im = im.convert('1')
 
-        return (
-            self.width / 8,
-            b''.join(chr(ord(c) ^ 255) for c in im.tostring())
-        )
+        return packed_width(im.size[0]), self._iter_bands(im)
+
+    def _iter_bands(self, im):
+        w, h = im.size
+        for y in range(0, h, self.band_height):
+            band = im.crop((0, y, w, min(y + self.band_height, h)))
+            yield pack_image(band)
@@ -1,26 +1,107 @@
+import numpy as np
+
 from . import ObjectConverter
+from .pack import pack_array
+from ..util import LRUCache
 
 
 class QRCodeConverter(ObjectConverter):
-    def __init__(self, printer, invert=False):
+    """Converts QR codes.
+
+    Codes are rendered from their module matrix, scaled up to
+    ``module_size`` dots per module and centered on the paper. Results are
+    cached, so printing the same code over and over only renders it once.
+
+    :param printer: A :class:`.ThermalPrinter` instance.
+    :param invert: If true, light modules are printed black instead of dark
+                   ones.
+    :param module_size: Width and height of a module in dots. By default, the
+                        largest size up to ``max_module_size`` is used that
+                        fits the code onto the paper.
+    :param max_module_size: Upper limit for automatically chosen module sizes.
+    :param quiet_zone: Width of the border around the code, in modules.
+    :param error: Error correction level for codes created from text, see
+                  :func:`pyqrcode.create`.
+    :param cache_size: Maximum number of rendered codes to keep.
+    """
+    def __init__(self, printer, invert=False, module_size=None,
+                 max_module_size=8, quiet_zone=4, error='H', cache_size=64):
         super(QRCodeConverter, self).__init__(printer)
         self.invert = invert
+        self.module_size = module_size
+        self.max_module_size = max_module_size
+        self.quiet_zone = quiet_zone
+        self.error = error
+        self.cache = LRUCache(cache_size)
+
+    def fit_module_size(self, modules):
+        """Determine the module size for a code.
+
+        :param modules: Number of modules per side, without quiet zone.
+        :return: The module size, in dots.
+        """
+        dots = self.printer.DOTS_PER_LINE
+        total = modules + 2 * self.quiet_zone
+
+        if self.module_size is not None:
+            size = self.module_size
+        else:
+            size = min(self.max_module_size, dots // total)
+
+        if size < 1 or total * size > dots:
+            raise ValueError('QR code of {} modules does not fit onto {} dots'
+                             .format(total, dots))
+        return size
+
+    def render(self, matrix):
+        """Render a module matrix.
+
+        :param matrix: A square matrix, nonzero entries being dark modules.
+        :return: A tuple of ``(width, data)``, ``data`` being a read-only
+                 array.
+        """
+        dark = np.asarray(matrix, dtype=bool)
+        n = len(dark)
+        size = self.fit_module_size(n)
+        total = (n + 2 * self.quiet_zone) * size
+        left = (self.printer.DOTS_PER_LINE - total) // 2
+
+        # pixels are nonzero if white. the margin left of the quiet zone is
+        # always left white
+        img = np.ones((total, left + total), dtype=bool)
+        img[:, left:] = not self.invert
+
+        offset = self.quiet_zone * size
+        img[offset:offset + n * size, left + offset:left + offset + n * size] \
+            = np.repeat(np.repeat(dark == self.invert, size, axis=0),
+                        size, axis=1)
+
+        data = pack_array(img)
+        data.flags.writeable = False
+        return data.shape[1], data
 
     def convert(self, code):
-        output = []
-        size = None
-        tbl = ({'0': b'\xFF', '1': b'\x00'} if self.invert else
-               {'1': b'\xFF', '0': b'\x00'})
-
-        for line in code.text().splitlines():
-            outline = []
-            for c in line:
-                outline.append(tbl[c])
-
-            l = b''.join(outline)
-            for i in range(8):
-                # 8x8 pixels
-                output.append(l)
-
-        size = len(output[0])
-        return size, b''.join(output)
+        """Convert a QR code.
+
+        :param code: Either a :class:`pyqrcode.QRCode` or text, which is
+                     encoded on a cache miss only.
+        :return: See :meth:`.ObjectConverter.convert`. The data is shared with
+                 the cache and must not be modified.
+        """
+        params = (self.invert, self.module_size, self.max_module_size,
+                  self.quiet_zone, self.printer.DOTS_PER_LINE)
+
+        if hasattr(code, 'code'):
+            key = ('code', code.data, code.error, code.version, code.mode)
+        else:
+            key = ('text', code, self.error)
+        key += params
+
+        rv = self.cache.get(key)
+        if rv is None:
+            if not hasattr(code, 'code'):
+                import pyqrcode
+                code = pyqrcode.create(code, error=self.error)
+            rv = self.render(code.code)
+            self.cache[key] = rv
+        return rv
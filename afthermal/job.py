@@ -0,0 +1,231 @@
+"""Recording and replaying of print jobs.
+
+A recording holds the exact bytes sent to the printer along with every feed
+used for throttling, so a job can be printed again without encoding text or
+converting images. Recordings are replayed from a memory-mapped file, data is
+passed on to the port without being copied or parsed. Ports that hold on to
+data past a write, such as :class:`~afthermal.aio.AsyncThrottledSerial`,
+copy it.
+
+A recording starts with :data:`MAGIC`, followed by records. Every record
+starts with a type byte and the length of its payload as a big-endian 32-bit
+integer:
+
+``D``
+    Data to write.
+``F``
+    A feed, see :meth:`~afthermal.port.ThrottledSerial.fed`: number of lines,
+    number of dots and the height of the lines in dots, ``0xFFFFFFFF`` if
+    unknown, followed by the number of black dots of each row, if known, as
+    16-bit integers.
+``H``
+    Heat settings, see :attr:`~afthermal.port.ThrottledSerial.heat`.
+``L``
+    Line height, see :attr:`~afthermal.port.ThrottledSerial.line_height`.
+"""
+
+import mmap
+import struct
+
+from .port import split_lines
+
+MAGIC = b'AFJOB\x01'
+
+RECORD = struct.Struct('>cI')
+FEED = struct.Struct('>III')
+HEAT = struct.Struct('>HHH')
+LINE_HEIGHT = struct.Struct('>H')
+
+DATA_RECORD = b'D'
+FEED_RECORD = b'F'
+HEAT_RECORD = b'H'
+LINE_HEIGHT_RECORD = b'L'
+
+# marks a missing dot_height
+UNKNOWN = 0xFFFFFFFF
+
+
+class JobRecorder(object):
+    """Records a job.
+
+    Has the same interface as :class:`~afthermal.port.ThrottledSerial`, see
+    :meth:`~afthermal.ThermalPrinter.record`. Consecutive writes are merged
+    into a single record.
+
+    :param out: A file opened for writing in binary mode.
+    :param port: Optional port to pass everything on to, printing the job
+                 while it is recorded.
+    """
+    def __init__(self, out, port=None):
+        self.out = out
+        self.port = port
+        self.buf = bytearray()
+
+        out.write(MAGIC)
+        if port is not None:
+            self._heat = port.heat
+            self._line_height = port.line_height
+        else:
+            self._heat = (64, 800, 20)
+            self._line_height = 32
+        self._record_settings()
+
+    def _record(self, kind, payload):
+        self.out.write(RECORD.pack(kind, len(payload)))
+        self.out.write(payload)
+
+    def _record_settings(self):
+        self.flush()
+        self._record(HEAT_RECORD, HEAT.pack(*self._heat))
+        self._record(LINE_HEIGHT_RECORD, LINE_HEIGHT.pack(self._line_height))
+
+    @property
+    def heat(self):
+        return self._heat
+
+    @heat.setter
+    def heat(self, value):
+        self._heat = value
+        self._record_settings()
+        if self.port is not None:
+            self.port.heat = value
+
+    @property
+    def line_height(self):
+        return self._line_height
+
+    @line_height.setter
+    def line_height(self, value):
+        self._line_height = value
+        self._record_settings()
+        if self.port is not None:
+            self.port.line_height = value
+
+    def write(self, data, is_text=True):
+        """Record data.
+
+        :param data: Data to write.
+        :param is_text: See :meth:`~afthermal.port.ThrottledSerial.write`.
+        """
+        for chunk, is_line in split_lines(data, is_text):
+            self.buf += chunk
+            if is_line:
+                self.fed_lines(1)
+
+    def fed(self, n_lines=0, n_dots=0, black_dots=None, dot_height=None):
+        self.flush()
+
+        payload = FEED.pack(n_lines, n_dots,
+                            UNKNOWN if dot_height is None else dot_height)
+        if black_dots is not None:
+            black_dots = list(black_dots)
+            payload += struct.pack('>{}H'.format(len(black_dots)),
+                                   *black_dots)
+        self._record(FEED_RECORD, payload)
+
+        if self.port is not None:
+            kwargs = {}
+            if dot_height is not None:
+                kwargs['dot_height'] = dot_height
+            self.port.fed(n_lines, n_dots, black_dots, **kwargs)
+
+    def fed_lines(self, n_lines=1, dot_height=None):
+        self.fed(n_lines=n_lines, dot_height=dot_height)
+
+    def fed_dots(self, n_dots, black_dots=None):
+        self.fed(n_dots=n_dots, black_dots=black_dots)
+
+    def flush(self):
+        """Record pending data."""
+        if self.buf:
+            buf, self.buf = self.buf, bytearray()
+            self._record(DATA_RECORD, bytes(buf))
+            if self.port is not None:
+                self.port.write(buf, is_text=False)
+
+
+class RecordedJob(object):
+    """A recording made with :class:`.JobRecorder`.
+
+    The file is memory-mapped, its contents are read by the operating system
+    as they are needed. Call :meth:`.close` or use the job as a context
+    manager to unmap it.
+
+    :param fn: Filename of the recording.
+    """
+    def __init__(self, fn):
+        # the mapping keeps a file descriptor of its own
+        with open(fn, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError('{} is not a job recording'.format(fn))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        """Unmap the file.
+
+        All payloads returned by iterating over the job must have been
+        released or garbage collected before.
+        """
+        self.data.close()
+
+    def __iter__(self):
+        """Iterate over all records.
+
+        :return: An iterator of ``(kind, payload)`` tuples, ``payload`` being
+                 a :class:`memoryview` of the file.
+        """
+        size = len(self.data)
+        pos = len(MAGIC)
+        while pos < size:
+            if pos + RECORD.size > size:
+                raise ValueError('Truncated record at {}'.format(pos))
+            kind, length = RECORD.unpack_from(self.data, pos)
+            pos += RECORD.size
+
+            if pos + length > size:
+                raise ValueError('Truncated record at {}'.format(pos))
+            yield kind, memoryview(self.data)[pos:pos + length]
+            pos += length
+
+    def replay(self, port):
+        """Send the job to a port, throttled like the original.
+
+        :param port: A :class:`~afthermal.port.ThrottledSerial` or anything
+                     with the same interface.
+        """
+        for kind, payload in self:
+            # release every view right away, so the file can be closed even
+            # if replaying fails
+            with payload:
+                self._replay_record(port, kind, payload)
+
+    def _replay_record(self, port, kind, payload):
+        if kind == DATA_RECORD:
+            port.write(payload, is_text=False)
+        elif kind == FEED_RECORD:
+            n_lines, n_dots, dot_height = FEED.unpack_from(payload)
+
+            black_dots = None
+            n = (len(payload) - FEED.size) // 2
+            if n:
+                black_dots = struct.unpack_from('>{}H'.format(n), payload,
+                                                FEED.size)
+
+            kwargs = {}
+            if dot_height != UNKNOWN:
+                kwargs['dot_height'] = dot_height
+            port.fed(n_lines, n_dots, black_dots, **kwargs)
+        elif kind == HEAT_RECORD:
+            port.heat = HEAT.unpack_from(payload)
+        elif kind == LINE_HEIGHT_RECORD:
+            port.line_height = LINE_HEIGHT.unpack_from(payload)[0]
+        else:
+            raise ValueError('Unknown record type {!r}'.format(kind))
@@ -0,0 +1,139 @@
+"""Layout of text into printed lines.
+
+The printer wraps lines on its own once they are full, without any regard for
+words. Text laid out beforehand wraps at word boundaries instead, and the
+number of printed lines and their height is known exactly, which allows
+throttling to use the actual time needed instead of guessing.
+"""
+
+import re
+
+# runs of spaces, kept when splitting lines into words
+_WORDS = re.compile(u'( +)')
+
+
+class Layout(object):
+    """Tracks the printer's text settings and wraps text accordingly.
+
+    Lines holding exactly as many characters as fit are wrapped by the
+    printer, those are never followed by an additional newline.
+
+    :param chars_per_line: Number of characters per line at normal width.
+    :param line_height: Line spacing in dots, see
+                        :meth:`~afthermal.ThermalPrinter.set_line_height`.
+    :param char_height: Height of a character at normal height, in dots.
+    """
+    def __init__(self, chars_per_line=32, line_height=32, char_height=24):
+        self.chars_per_line = chars_per_line
+        self.char_height = char_height
+        self.reset(line_height)
+
+    def reset(self, line_height=32):
+        """Return to the printer's state after a reset.
+
+        :param line_height: Line spacing in dots.
+        """
+        self.line_height = line_height
+        self.align = 'L'
+        self.double_width = False
+        self.double_height = False
+
+        # number of characters already on the current line and whether the
+        # previous line was wrapped because it was full
+        self.column = 0
+        self._full = False
+
+        #: Whether the line last completed by :meth:`.iter_lines` holds no
+        #: characters. The printer feeds only the line spacing for those,
+        #: whatever the character height.
+        self.blank = False
+        self._chars = 0
+
+    @property
+    def width(self):
+        """Number of characters per line with the current settings."""
+        if self.double_width:
+            return self.chars_per_line // 2
+        return self.chars_per_line
+
+    @property
+    def line_dots(self):
+        """Height of a line with the current settings, in dots."""
+        height = self.char_height * (2 if self.double_height else 1)
+        return max(self.line_height, height)
+
+    def iter_lines(self, text):
+        """Wrap text.
+
+        Text can be laid out in chunks, each chunk continues on the line the
+        previous one ended on. Chunks should end on word boundaries, as words
+        are only kept together within a chunk. Trailing spaces are removed from
+        lines that are wrapped and, unless text is left aligned, from lines
+        ending in a newline, so they do not shift the text.
+
+        :param text: Text to lay out.
+        :return: An iterator of ``(line, complete)`` tuples. ``complete``
+                 indicates whether or not the line is printed, either because
+                 it ends in a newline or because it is full. The last line is
+                 incomplete if text is left on it.
+        """
+        for line, complete in self._wrap(text):
+            self._chars += len(line) - line.endswith(u'\n')
+            if complete:
+                self.blank = not self._chars
+                self._chars = 0
+            yield line, complete
+
+    def _wrap(self, text):
+        width = self.width
+        paragraphs = text.split(u'\n')
+
+        for n, paragraph in enumerate(paragraphs):
+            buf = []
+
+            for token in _WORDS.split(paragraph):
+                if not token:
+                    continue
+
+                if token[0] == u' ':
+                    # spaces are dropped at the start of wrapped lines and
+                    # past the end of a line
+                    if self._full:
+                        continue
+                    token = token[:width - self.column]
+                elif self.column and self.column + len(token) > width:
+                    # wrap before words that do not fit
+                    yield u''.join(buf).rstrip(u' ') + u'\n', True
+                    buf = []
+                    self.column = 0
+
+                while self.column + len(token) >= width:
+                    # full lines are wrapped by the printer, without a newline.
+                    # words longer than a line are split
+                    split = width - self.column
+                    buf.append(token[:split])
+                    token = token[split:]
+
+                    yield u''.join(buf), True
+                    buf = []
+                    self.column = 0
+                    self._full = True
+
+                if token:
+                    buf.append(token)
+                    self.column += len(token)
+                    self._full = False
+
+            if n == len(paragraphs) - 1:
+                if buf:
+                    yield u''.join(buf), False
+            elif self._full:
+                # the line has already been printed, a newline would feed an
+                # empty one
+                self._full = False
+            else:
+                line = u''.join(buf)
+                if self.align != 'L':
+                    line = line.rstrip(u' ')
+                yield line + u'\n', True
+                self.column = 0
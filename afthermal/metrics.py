@@ -0,0 +1,234 @@
+"""Runtime metrics.
+
+Ports and print queues report what they are doing to a :class:`.Metrics`
+instance, if they are given one: bytes and lines sent, time spent waiting for
+the printer versus writing to the device, and how long jobs take. Without one,
+the only cost is a check for ``None``.
+
+Every update is passed on to the sinks as an event. Sinks that keep totals
+instead, such as :class:`.PrometheusTextfileSink`, write them out whenever
+:meth:`.Metrics.flush` is called.
+"""
+
+import logging
+import os
+import tempfile
+
+#: Default histogram buckets, in seconds.
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+
+class Counter(object):
+    """A value that only increases.
+
+    :param name: Name of the counter.
+    :param help: Description of the counter.
+    :param sinks: List of sinks to notify of increments.
+    """
+    kind = 'counter'
+
+    def __init__(self, name, help, sinks=()):
+        self.name = name
+        self.help = help
+        self.sinks = sinks
+        self.value = 0
+
+    def inc(self, amount=1):
+        """Increase the counter.
+
+        :param amount: Amount to add.
+        """
+        self.value += amount
+        for sink in self.sinks:
+            sink.event(self, amount)
+
+
+class Histogram(object):
+    """Counts observations in buckets.
+
+    :param name: Name of the histogram.
+    :param help: Description of the histogram.
+    :param sinks: List of sinks to notify of observations.
+    :param buckets: Sorted upper bounds of the buckets. Values larger than the
+                    last one are only counted in the total.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help, sinks=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.sinks = sinks
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Record a value.
+
+        :param value: The observed value.
+        """
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+        for sink in self.sinks:
+            sink.event(self, value)
+
+    def cumulative_counts(self):
+        """Return the number of observations up to each bucket's bound."""
+        total = 0
+        rv = []
+        for n in self.counts:
+            total += n
+            rv.append(total)
+        return rv
+
+
+class Metrics(object):
+    """All metrics collected by afthermal.
+
+    Counters and histograms are plain attributes, e.g.
+    ``metrics.bytes_written.value``. Updates are not synchronized, share an
+    instance among threads only if slightly off totals are acceptable.
+
+    :param sinks: :class:`.Sink` instances to report to.
+    """
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+        self.bytes_written = Counter(
+            'afthermal_bytes_written_total',
+            'Bytes written to the printer.', self.sinks)
+        self.writes = Counter(
+            'afthermal_writes_total',
+            'Write calls on the serial port.', self.sinks)
+        self.lines_fed = Counter(
+            'afthermal_lines_fed_total',
+            'Lines of text fed.', self.sinks)
+        self.dots_fed = Counter(
+            'afthermal_dots_fed_total',
+            'Rows of dots fed.', self.sinks)
+        self.throttle_seconds = Histogram(
+            'afthermal_throttle_seconds',
+            'Time spent waiting for the printer before a write.', self.sinks)
+        self.write_seconds = Histogram(
+            'afthermal_write_seconds',
+            'Time spent writing to the serial port.', self.sinks)
+        self.job_seconds = Histogram(
+            'afthermal_job_seconds',
+            'Time spent printing a job.', self.sinks)
+
+    def __iter__(self):
+        return iter([self.bytes_written, self.writes, self.lines_fed,
+                     self.dots_fed, self.throttle_seconds, self.write_seconds,
+                     self.job_seconds])
+
+    def flush(self):
+        """Pass the current totals to all sinks."""
+        for sink in self.sinks:
+            sink.flush(self)
+
+
+class Sink(object):
+    """Receives metrics. Subclasses override either or both methods."""
+    def event(self, metric, value):
+        """Called on every update.
+
+        :param metric: The :class:`.Counter` or :class:`.Histogram` updated.
+        :param value: The increment or observed value.
+        """
+
+    def flush(self, metrics):
+        """Called by :meth:`.Metrics.flush`.
+
+        :param metrics: The :class:`.Metrics` instance.
+        """
+
+
+class CallbackSink(Sink):
+    """Calls a function on every update.
+
+    :param func: Called with the name of the metric and the value.
+    """
+    def __init__(self, func):
+        self.func = func
+
+    def event(self, metric, value):
+        self.func(metric.name, value)
+
+
+class LogSink(Sink):
+    """Logs totals on every flush.
+
+    :param logger: Logger to use, defaults to the ``afthermal.metrics`` one.
+    :param level: Level to log at.
+    :param events: If true, every update is logged as well.
+    """
+    def __init__(self, logger=None, level=logging.INFO, events=False):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+        self.events = events
+
+    def event(self, metric, value):
+        if self.events:
+            self.logger.log(self.level, '%s %s', metric.name, value)
+
+    def flush(self, metrics):
+        for metric in metrics:
+            if metric.kind == 'counter':
+                self.logger.log(self.level, '%s = %s', metric.name,
+                                metric.value)
+            else:
+                self.logger.log(self.level, '%s: count = %s, sum = %.3f',
+                                metric.name, metric.count, metric.sum)
+
+
+def format_prometheus(metrics):
+    """Format metrics in the Prometheus text exposition format.
+
+    :param metrics: A :class:`.Metrics` instance.
+    :return: The formatted metrics, as text.
+    """
+    lines = []
+    for metric in metrics:
+        lines.append('# HELP {} {}'.format(metric.name, metric.help))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+
+        if metric.kind == 'counter':
+            lines.append('{} {}'.format(metric.name, metric.value))
+            continue
+
+        for bound, n in zip(metric.buckets, metric.cumulative_counts()):
+            lines.append('{}_bucket{{le="{!r}"}} {}'.format(
+                metric.name, float(bound), n))
+        lines.append('{}_bucket{{le="+Inf"}} {}'.format(
+            metric.name, metric.count))
+        lines.append('{}_sum {!r}'.format(metric.name, metric.sum))
+        lines.append('{}_count {}'.format(metric.name, metric.count))
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusTextfileSink(Sink):
+    """Writes totals to a file on every flush, for the textfile collector of
+    the Prometheus node exporter.
+
+    :param path: Filename to write to, should end in ``.prom``.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def flush(self, metrics):
+        # the collector may read the file at any time, replace it atomically
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(format_prometheus(metrics))
+            os.chmod(tmp, 0o644)
+            os.rename(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
@@ -1,7 +1,74 @@
+import os
+import select
 import time
 
 from serial import Serial
 
+from .hw import get_command
+
+
+def split_lines(data, is_text=True):
+    """Split data into chunks that end in a newline.
+
+    :param data: Data to split.
+    :param is_text: If false, ``data`` is returned as a single chunk.
+    :return: An iterator of ``(chunk, is_line)`` tuples, ``is_line`` indicates
+             whether or not the chunk ends in a newline.
+    """
+    if not is_text:
+        yield data, False
+        return
+
+    # slicing a memoryview does not copy, avoiding quadratic behaviour on
+    # large blocks of text
+    view = memoryview(data)
+    start = 0
+    while start < len(view):
+        nl_idx = data.find(b'\n', start)
+        if nl_idx == - 1:
+            # no newline, just write
+            yield view[start:], False
+            break
+
+        nl_idx += 1  # include newline
+
+        yield view[start:nl_idx], True
+        start = nl_idx
+
+
+class DensityModel(object):
+    """Estimates the time needed to print rows of dots.
+
+    The printer heats at most ``max_dots`` dots at once, each heating cycle
+    taking ``heat_time`` plus ``interval`` microseconds. A row with ``k`` black
+    dots takes ``row_time + ceil(k / max_dots) * heat_scale * (heat_time +
+    interval) * 1e-6`` seconds.
+
+    The defaults are conservative: with the printer's default heat settings, a
+    solid black row takes as long as in the fixed ``dot_feed_time`` model,
+    while a blank row is about six times faster. Both coefficients should be
+    fitted to the actual printer.
+
+    :param row_time: Time required to feed a single row, in seconds.
+    :param heat_scale: Scaling factor for the time spent heating.
+    """
+    def __init__(self, row_time=0.01, heat_scale=10.7):
+        self.row_time = row_time
+        self.heat_scale = heat_scale
+
+    def dots_time(self, black_dots, max_dots, heat_time, interval):
+        """Calculate the time needed to print rows.
+
+        :param black_dots: Sequence of black dot counts, one per row.
+        :param max_dots: Maximum number of dots heated at once.
+        :param heat_time: Heating time, in microseconds.
+        :param interval: Heating interval, in microseconds.
+        :return: Time in seconds.
+        """
+        cycle = self.heat_scale * (heat_time + interval) * 1e-6
+        cycles = sum(-(-k // max_dots) for k in black_dots)
+        return len(black_dots) * self.row_time + cycles * cycle
+
 
 class ThrottledSerial(Serial):
     """A throttled serial port implementation.
@@ -9,38 +76,165 @@ class ThrottledSerial(Serial):
     For use with printer devices that have no flow control. Counts how many
     lines/dots were sent and based on a speed estimate of the printer's paper
     feed speed, throttles writes accordingly.
+
+    Optionally, the printer can signal when it is ready, allowing writes to
+    continue before the estimated time has passed. With ``flow_control`` set
+    to ``'status'``, a status request is sent after each feed and the printer
+    is considered ready once it has answered it. With ``'busy'``, the
+    printer's DTR (busy) line must be wired to the CTS line of the port and is
+    polled, see :meth:`~afthermal.CommandAliasMixin.enable_busy_signal`. The
+    printer drives the line high while busy, which deasserts CTS, both on the
+    active-low CTS input of a UART and behind an RS-232 transceiver. It is
+    ready once CTS is asserted again. In both modes, the estimate is used if
+    the printer does not signal in time.
+
+    :param flow_control: One of ``None``, ``'status'`` or ``'busy'``.
+    :param metrics: Optional :class:`~afthermal.metrics.Metrics` instance to
+                    report writes, feeds and time spent throttling to.
     """
     # FIXME: these need to get attached to a printer
     dot_feed_time = 0.0625       # time required to write one image dot
     line_feed_time = 32 * 0.005  # time required to print one line
     write_ready = 0
+    line_height = 32
+
+    # used to estimate rows of dots with known black dot counts. set to None
+    # to always use dot_feed_time
+    density_model = DensityModel()
+    heat = (64, 800, 20)         # max_dots, heat_time, interval
+
+    STATUS_REQUEST = get_command('transmit_status', 1)
+    busy_poll_interval = 0.001
+    last_status = None
+    metrics = None
+
+    # clock used for throttling, replaced by emulated ports
+    _now = staticmethod(time.time)
+    _sleep = staticmethod(time.sleep)
+
+    def __init__(self, *args, **kwargs):
+        self.flow_control = kwargs.pop('flow_control', None)
+        self.metrics = kwargs.pop('metrics', None)
+        if self.flow_control not in (None, 'status', 'busy'):
+            raise ValueError('Unknown flow control mode: {}'.format(
+                self.flow_control))
+        self._status_pending = 0
+        super(ThrottledSerial, self).__init__(*args, **kwargs)
 
     def wait_for_write(self):
         """Wait until the printer is safe to write to."""
+        metrics = self.metrics
+        if metrics is not None:
+            start = self._now()
+
+        if self.flow_control == 'status' and self._status_pending:
+            self._wait_for_status()
+        elif self.flow_control == 'busy':
+            self._wait_for_busy()
+
         # ensure we're not writing lines too fast
-        now = time.time()
+        now = self._now()
         if now < self.write_ready:
-            time.sleep(self.write_ready - now)
+            self._sleep(self.write_ready - now)
+
+        if metrics is not None:
+            metrics.throttle_seconds.observe(self._now() - start)
+
+    def _wait_for_status(self):
+        # every request is answered with a single status byte
+        while self._status_pending:
+            timeout = self.write_ready - self._now()
+            if timeout <= 0 or not select.select([self.fd], [], [],
+                                                 timeout)[0]:
+                # no answer in time, fall back to estimate
+                self._status_pending = 0
+                return
+
+            status = os.read(self.fd, self._status_pending)
+            self._status_pending -= len(status)
+            self.last_status = status[-1:]
+
+        self.write_ready = 0
+
+    def _wait_for_busy(self):
+        # a busy printer deasserts CTS
+        while self._now() < self.write_ready:
+            if self.cts:
+                self.write_ready = 0
+                return
+            self._sleep(self.busy_poll_interval)
+
+    def _request_status(self):
+        if not self._status_pending:
+            # discard stale answers to requests that timed out
+            self.reset_input_buffer()
+        self._write(self.STATUS_REQUEST)
+        self._status_pending += 1
 
-    def fed_lines(self, n_lines=1):
+    def dots_time(self, n_dots, black_dots=None):
+        """Estimate the time needed to print lines of dots.
+
+        :param n_dots: The number of vertical dots.
+        :param black_dots: Optional sequence of black dot counts, one for each
+                           vertical dot. Used with the ``density_model``.
+        :return: Time in seconds.
+        """
+        if black_dots is None or self.density_model is None:
+            return n_dots * self.dot_feed_time
+        return self.density_model.dots_time(black_dots, *self.heat)
+
+    def lines_time(self, n_lines, dot_height=None):
+        """Estimate the time needed to print lines of characters.
+
+        :param n_lines: The number of lines.
+        :param dot_height: Optional total height of the lines, in dots. If
+                           given, the time is scaled from ``line_feed_time``,
+                           which is the time for a line of 32 dots.
+        :return: Time in seconds.
+        """
+        if dot_height is None:
+            return n_lines * self.line_feed_time
+        return dot_height * self.line_feed_time / 32.0
+
+    def fed(self, n_lines=0, n_dots=0, black_dots=None, dot_height=None):
+        """Notify that lines of characters and dots have been written.
+
+        :param n_lines: Number of lines written.
+        :param n_dots: The number of vertical dots that have been fed.
+        :param black_dots: See :meth:`.dots_time`.
+        :param dot_height: See :meth:`.lines_time`.
+        """
+        now = self._now()
+        self.write_ready = (now + self.lines_time(n_lines, dot_height)
+                            + self.dots_time(n_dots, black_dots))
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.lines_fed.inc(n_lines)
+            metrics.dots_fed.inc(n_dots)
+
+        if self.flow_control == 'status':
+            self._request_status()
+
+    def fed_lines(self, n_lines=1, dot_height=None):
         """Notify that lines of characters have been written.
 
         :param n_lines: Number of lines written.
+        :param dot_height: See :meth:`.lines_time`.
         """
-        now = time.time()
-        self.write_ready = now + n_lines * self.line_feed_time
+        self.fed(n_lines=n_lines, dot_height=dot_height)
 
-    def fed_dots(self, n_dots):
+    def fed_dots(self, n_dots, black_dots=None):
         """Notify that lines of dots have been written.
 
         :param n_dots: The number of vertical dots that have been fed.
+        :param black_dots: See :meth:`.dots_time`.
         """
-        now = time.time()
-        self.write_ready = now + n_dots * self.dot_feed_time
+        self.fed(n_dots=n_dots, black_dots=black_dots)
 
     def write(self, data, is_text=True):
-        # FIXME: the printer itself should probably emit events
-        # FIXME: should also count normal characters for line-count
+        # lines wrapped by the printer are not counted, see
+        # ThermalPrinter.print_text
         """Count and write data.
 
         Waits for write, then passes on data. Can count text data if necessary.
@@ -49,23 +243,104 @@ class ThrottledSerial(Serial):
         :param is_text: If true, assume the data is text and assumes a new line
                         is fed if ``\n`` is encountered.
         """
-        def wr(*args, **kwargs):
+        metrics = self.metrics
+        for chunk, is_line in split_lines(data, is_text):
             self.wait_for_write()
-            super(ThrottledSerial, self).write(*args, **kwargs)
+            if metrics is None:
+                self._write(chunk)
+            else:
+                start = self._now()
+                self._write(chunk)
+                metrics.write_seconds.observe(self._now() - start)
+                metrics.writes.inc()
+                metrics.bytes_written.inc(len(chunk))
+            if is_line:
+                self.fed_lines(1)
+
+    def _write(self, data):
+        # unthrottled write to the device
+        super(ThrottledSerial, self).write(data)
+
+
+class CommandBuffer(object):
+    """Coalesces writes to a port.
+
+    Has the same interface as :class:`.ThrottledSerial`. Commands and text are
+    collected into a single buffer, along with the lines and dots fed. The
+    buffer is written to the underlying port in a single write whenever
+    something is fed, that is at the next throttle deadline, or once it grows
+    larger than ``max_size``.
+
+    :param port: The port to write to.
+    :param max_size: Maximum number of bytes to collect before flushing.
+    """
+    def __init__(self, port, max_size=4096):
+        self.port = port
+        self.max_size = max_size
+        self.buf = bytearray()
+        self.lines = 0
+        self.dots = 0
+        self.black_dots = None
+        self.dot_height = None
+
+    @property
+    def line_height(self):
+        return self.port.line_height
+
+    @line_height.setter
+    def line_height(self, value):
+        self.port.line_height = value
+
+    @property
+    def heat(self):
+        return self.port.heat
+
+    @heat.setter
+    def heat(self, value):
+        self.port.heat = value
+
+    def write(self, data, is_text=True):
+        """Add data to the buffer.
+
+        :param data: Data to write.
+        :param is_text: See :meth:`.ThrottledSerial.write`.
+        """
+        for chunk, is_line in split_lines(data, is_text):
+            self.buf += chunk
+            if is_line:
+                self.fed_lines(1)
+
+        if len(self.buf) >= self.max_size:
+            self.flush()
+
+    def fed(self, n_lines=0, n_dots=0, black_dots=None, dot_height=None):
+        # since every feed flushes, there is at most one set of counts
+        self.lines += n_lines
+        self.dots += n_dots
+        self.black_dots = black_dots
+        self.dot_height = dot_height
+        self.flush()
 
-        if not is_text:
-            wr(data)
-            return
+    def fed_lines(self, n_lines=1, dot_height=None):
+        self.fed(n_lines=n_lines, dot_height=dot_height)
 
-        while data:
-            nl_idx = data.find(b'\n')
-            if nl_idx == - 1:
-                # no newline, just write
-                wr(data)
-                break
+    def fed_dots(self, n_dots, black_dots=None):
+        self.fed(n_dots=n_dots, black_dots=black_dots)
 
-            nl_idx += 1  # include newline
+    def flush(self):
+        """Write out buffer and pass on accumulated feeds."""
+        if self.buf:
+            # the port may hold on to the buffer, use a fresh one
+            buf, self.buf = self.buf, bytearray()
+            self.port.write(buf, is_text=False)
 
-            chunk, data = data[:nl_idx], data[nl_idx:]
-            wr(chunk)
-            self.fed_lines(1)
+        if self.lines or self.dots:
+            # only pass on dot_height if known, for ports predating it
+            kwargs = {}
+            if self.dot_height is not None:
+                kwargs['dot_height'] = self.dot_height
+            self.port.fed(self.lines, self.dots, self.black_dots, **kwargs)
+            self.lines = 0
+            self.dots = 0
+            self.black_dots = None
+            self.dot_height = None
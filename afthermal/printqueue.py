@@ -0,0 +1,372 @@
+import functools
+import heapq
+import itertools
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+from .bitmap import row_dot_counts
+
+
+#: Timing of a finished job. ``wait_time`` is the time the job spent queued,
+#: including time it was preempted by other jobs, ``service_time`` the time
+#: spent actually printing it.
+JobStats = namedtuple('JobStats', ['wait_time', 'service_time'])
+
+
+class PrintJob(object):
+    """A job in a :class:`.PrintQueue`.
+
+    :param steps: An iterable of callables, each taking the printer as its
+                  only argument. The job can be preempted in between steps.
+    :param priority: Jobs with a higher priority are printed first.
+    :param seq: Sequence number, orders jobs of equal priority.
+    :param estimate: Estimated time needed to print the job, in seconds.
+    """
+    def __init__(self, steps, priority, seq, estimate=0.0):
+        self.steps = iter(steps)
+        self.priority = priority
+        self.seq = seq
+        self.estimate = estimate
+        self.future = Future()
+        self.submitted = time.time()
+        self.service_time = 0.0
+        self.started = False
+        self.pending = None
+
+    def __lt__(self, other):
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+    @property
+    def stats(self):
+        total = time.time() - self.submitted
+        return JobStats(total - self.service_time, self.service_time)
+
+
+class PrintQueue(object):
+    """Prints jobs on a background thread, in order of priority.
+
+    Jobs are split into steps, such as a single line of text or a band of a
+    bitmap. Whenever a job with a higher priority is submitted while another
+    is printing, it is printed after the current step and the preempted job
+    resumes afterwards.
+
+    Each ``submit`` method returns a :class:`~concurrent.futures.Future` that
+    resolves to the :class:`.JobStats` of the job once it has been printed.
+
+    :param printer: A :class:`~afthermal.ThermalPrinter` instance.
+    :param metrics: Optional :class:`~afthermal.metrics.Metrics` instance. The
+                    service time of every job is recorded and the metrics are
+                    flushed after each job.
+    """
+    def __init__(self, printer, metrics=None):
+        self.printer = printer
+        self.metrics = metrics
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        #: Sum of the estimates of all unfinished jobs, in seconds.
+        self.backlog = 0.0
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, steps, priority=0, estimate=0.0):
+        """Submit a job.
+
+        :param steps: An iterable of callables, each taking the printer as its
+                      only argument. Consumed lazily by the worker thread.
+        :param priority: Priority of the job, higher priorities are printed
+                         first.
+        :param estimate: Estimated time needed to print the job, in seconds.
+                         Added to :attr:`.backlog` until the job is done.
+        :return: A :class:`~concurrent.futures.Future`.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Cannot submit to a closed PrintQueue')
+
+            job = PrintJob(steps, priority, next(self._seq), estimate)
+            heapq.heappush(self._heap, job)
+            self.backlog += estimate
+            self._cond.notify()
+        return job.future
+
+    def submit_call(self, func, *args, **kwargs):
+        """Submit a job consisting of a single call on the printer.
+
+        ``func`` is called with the printer as the first argument, followed by
+        ``args`` and ``kwargs``. The call cannot be preempted.
+
+        :param priority: Priority of the job, passed as a keyword argument.
+        :param estimate: See :meth:`.submit`, passed as a keyword argument.
+        """
+        priority = kwargs.pop('priority', 0)
+        estimate = kwargs.pop('estimate', 0.0)
+        return self.submit([functools.partial(_call, func, args, kwargs)],
+                           priority, estimate)
+
+    def submit_text(self, text, priority=0, estimate=0.0):
+        """Submit text, preemptible after each line.
+
+        :param text: Encoded text to print, as :class:`bytes`, see
+                     :meth:`~afthermal.ThermalPrinter.write`.
+        :param priority: Priority of the job.
+        :param estimate: See :meth:`.submit`.
+        """
+        return self.submit(
+            (functools.partial(_write, line)
+             for line in text.splitlines(True)),
+            priority, estimate
+        )
+
+    def submit_image(self, width, data, priority=0, estimate=0.0, **kwargs):
+        """Submit a bitmap, preemptible after each band.
+
+        Arguments are the same as for
+        :meth:`~afthermal.ThermalPrinter.print_image`.
+
+        :param priority: Priority of the job.
+        :param estimate: See :meth:`.submit`.
+        """
+        bands = self.printer.iter_bands(width, data, **kwargs)
+        return self.submit(
+            (functools.partial(_print_band, band) for band in bands),
+            priority, estimate
+        )
+
+    def remaining_time(self):
+        """Estimate the time until all submitted jobs are printed.
+
+        :return: Time in seconds. Includes the time the printer's port is
+                 still throttling for, see
+                 :attr:`~afthermal.port.ThrottledSerial.write_ready`.
+        """
+        port = getattr(self.printer, 'port', None)
+        ready = getattr(port, 'write_ready', 0)
+
+        throttled = 0.0
+        if ready:
+            now = getattr(port, '_now', time.time)()
+            throttled = max(0.0, ready - now)
+        return throttled + self.backlog
+
+    def close(self, wait=True):
+        """Stop accepting jobs and stop the worker once all jobs are done.
+
+        :param wait: If true, wait for all outstanding jobs to finish.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        if wait:
+            self._worker.join()
+
+    def _preempted(self, job):
+        with self._cond:
+            if self._heap and self._heap[0].priority > job.priority:
+                heapq.heappush(self._heap, job)
+                return True
+        return False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+
+                if not self._heap:
+                    return
+                job = heapq.heappop(self._heap)
+
+            if not job.started:
+                if not job.future.set_running_or_notify_cancel():
+                    self._finished(job)
+                    continue
+                job.started = True
+
+            self._service(job)
+
+    def _service(self, job):
+        start = time.time()
+        try:
+            step = job.pending or next(job.steps, None)
+            while step is not None:
+                step(self.printer)
+
+                step = next(job.steps, None)
+                if step is not None and self._preempted(job):
+                    job.pending = step
+                    job.service_time += time.time() - start
+                    return
+        except Exception as e:
+            job.service_time += time.time() - start
+            self._finished(job)
+            job.future.set_exception(e)
+            return
+
+        job.service_time += time.time() - start
+        self._finished(job)
+        job.future.set_result(job.stats)
+
+    def _finished(self, job):
+        with self._cond:
+            if self._heap:
+                self.backlog -= job.estimate
+            else:
+                # avoid accumulating rounding errors
+                self.backlog = 0.0
+
+        if self.metrics is not None and job.started:
+            self.metrics.job_seconds.observe(job.service_time)
+            self.metrics.flush()
+
+
+class PrinterPool(object):
+    """Spreads jobs across several printers.
+
+    Every printer gets its own :class:`.PrintQueue`. Jobs are sent to the
+    printer that is estimated to finish them first, taking into account the
+    jobs already queued on it, its throttle state and how fast it prints, so
+    printers with different calibrations share the work accordingly.
+
+    Each ``submit`` method takes the same arguments as the one of
+    :class:`.PrintQueue`, plus an optional ``printer`` to print the job on,
+    either a printer of the pool or its index.
+
+    :param printers: :class:`~afthermal.ThermalPrinter` instances.
+    :param metrics: See :class:`.PrintQueue`, shared by all queues.
+    """
+    def __init__(self, printers, metrics=None):
+        self.printers = list(printers)
+        if not self.printers:
+            raise ValueError('A PrinterPool needs at least one printer')
+
+        self.queues = [PrintQueue(printer, metrics)
+                       for printer in self.printers]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config_files(cls, fns, metrics=None):
+        """Create a pool of printers, each with its own configuration.
+
+        :param fns: Filenames of configuration files, see
+                    :meth:`~afthermal.ThermalPrinter.from_config_file`.
+        :param metrics: See :class:`.PrintQueue`.
+        """
+        from . import ThermalPrinter
+
+        printers = []
+        for fn in fns:
+            with open(fn) as f:
+                printers.append(ThermalPrinter.from_config_file(f))
+        return cls(printers, metrics)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _queue(self, printer):
+        if isinstance(printer, int):
+            return self.queues[printer]
+
+        for queue in self.queues:
+            if queue.printer is printer:
+                return queue
+        raise ValueError('Printer {!r} is not part of the pool'
+                         .format(printer))
+
+    def _dispatch(self, submit, estimate, printer):
+        # choosing and submitting must be atomic, so the next job sees the
+        # backlog of this one
+        with self._lock:
+            if printer is not None:
+                queue = self._queue(printer)
+                return submit(queue, estimate(queue.printer))
+
+            best = None
+            for queue in self.queues:
+                est = estimate(queue.printer)
+                done = queue.remaining_time() + est
+                if best is None or done < best[0]:
+                    best = done, queue, est
+            return submit(best[1], best[2])
+
+    def submit(self, steps, priority=0, estimate=0.0, printer=None):
+        """Submit a job, see :meth:`.PrintQueue.submit`.
+
+        :param estimate: Estimated time needed to print the job, in seconds,
+                         or a function returning it for a given printer.
+        """
+        if not callable(estimate):
+            estimate = _constant(estimate)
+        return self._dispatch(
+            lambda queue, est: queue.submit(steps, priority, est),
+            estimate, printer)
+
+    def submit_call(self, func, *args, **kwargs):
+        """Submit a call, see :meth:`.PrintQueue.submit_call`.
+
+        :param estimate: See :meth:`.submit`, passed as a keyword argument.
+        """
+        priority = kwargs.pop('priority', 0)
+        estimate = kwargs.pop('estimate', 0.0)
+        printer = kwargs.pop('printer', None)
+        return self.submit([functools.partial(_call, func, args, kwargs)],
+                           priority, estimate, printer)
+
+    def submit_text(self, text, priority=0, printer=None):
+        """Submit text, see :meth:`.PrintQueue.submit_text`."""
+        n_lines = text.count(b'\n')
+        return self._dispatch(
+            lambda queue, est: queue.submit_text(text, priority, est),
+            lambda p: p.port.lines_time(n_lines), printer)
+
+    def submit_image(self, width, data, priority=0, printer=None, **kwargs):
+        """Submit a bitmap, see :meth:`.PrintQueue.submit_image`.
+
+        ``data`` must be a buffer, the black dots of its rows are counted to
+        estimate the time needed to print it.
+        """
+        black_dots = row_dot_counts(data, width)
+        return self._dispatch(
+            lambda queue, est: queue.submit_image(width, data, priority, est,
+                                                  **kwargs),
+            lambda p: p.port.dots_time(len(black_dots), black_dots), printer)
+
+    def close(self, wait=True):
+        """Close all queues, see :meth:`.PrintQueue.close`."""
+        for queue in self.queues:
+            queue.close(wait=False)
+
+        if wait:
+            for queue in self.queues:
+                queue.close()
+
+
+def _constant(value):
+    return lambda printer: value
+
+
+def _call(func, args, kwargs, printer):
+    func(printer, *args, **kwargs)
+
+
+def _write(line, printer):
+    printer.write(line)
+
+
+def _print_band(band, printer):
+    printer.print_band(band)
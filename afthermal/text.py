@@ -1,10 +1,13 @@
 from collections import Counter
 from contextlib import contextmanager
+import re
+
+from six import binary_type, text_type
 
 from .hw import get_command
 
 
-# use HTML-like for text?
+# HTML-like markup, see MarkupParser
 #
 # <b>: bold
 # <inv>: invert
@@ -12,19 +15,28 @@ from .hw import get_command
 # <u>: underline
 # <dw>: double width
 # <dh>: double height
-# <del>: strike through
+
+
+# maps (visitor class, node class) to visitation methods
+_dispatch = {}
 
 
 class Visitor(object):
     def visit(self, node):
-        for cls in type(node).mro():
-            meth = getattr(self, 'visit_' + cls.__name__, None)
-            if meth is None:
-                continue
-            return meth(node)
+        key = (type(self), type(node))
+        meth = _dispatch.get(key)
+        if meth is None:
+            meth = _dispatch[key] = self._lookup(type(node))
+        return meth(self, node)
+
+    def _lookup(self, node_cls):
+        for cls in node_cls.mro():
+            meth = getattr(type(self), 'visit_' + cls.__name__, None)
+            if meth is not None:
+                return meth
 
         raise NotImplementedError('No visitation method visitor for {}'
-                                  .format(node.__class__.__name__))
+                                  .format(node_cls.__name__))
 
 
 class Node(object):
@@ -38,13 +50,16 @@ class ByteStringVisitor(Visitor):
         self.encoding = encoding
         self.mode_stack = Counter()
 
+    def join(self, parts):
+        return b''.join(parts)
+
     def visit_FormatMode(self, node):
         buf = []
 
         # if we're not in the correct mode, activate
-        if not self.mode_stack[node.SEQ_ON]:
-            buf.append(node.SEQ_ON)
         self.mode_stack[node.SEQ_ON] += 1
+        if self.mode_stack[node.SEQ_ON] == 1:
+            buf.append(node.switch(True, self.mode_stack))
 
         for child in node.children:
             buf.append(self.visit(child))
@@ -52,20 +67,43 @@ class ByteStringVisitor(Visitor):
         # deactivate mode if we're done with it
         self.mode_stack[node.SEQ_ON] -= 1
         if not self.mode_stack[node.SEQ_ON]:
-            buf.append(node.SEQ_OFF)
+            buf.append(node.switch(False, self.mode_stack))
 
-        return b''.join(buf)
+        return self.join(buf)
 
     def visit_Text(self, node):
         # FIXME: escape special chars
         return node.text.encode(self.encoding)
 
     def visit_Node(self, node):
-        return b''.join(map(self.visit, node.children))
+        return self.join(map(self.visit, node.children))
 
 
 class FormatMode(Node):
-    pass
+    @classmethod
+    def switch(cls, enabled, mode_stack):
+        """Return the sequence switching the mode on or off.
+
+        :param enabled: Whether the mode is switched on or off.
+        :param mode_stack: Counts of all modes active afterwards, keyed by
+                           their ``SEQ_ON``.
+        """
+        return cls.SEQ_ON if enabled else cls.SEQ_OFF
+
+
+class FontEnlarge(FormatMode):
+    """A character size mode.
+
+    Double width and double height are set by a single command, switching
+    one of them sends the combined size of both.
+    """
+    @classmethod
+    def switch(cls, enabled, mode_stack):
+        size = 0
+        for mode in (DoubleWidth, DoubleHeight):
+            if mode_stack[mode.SEQ_ON]:
+                size |= mode.SIZE
+        return get_command('set_font_enlarge', size)
 
 
 class Text(object):
@@ -73,6 +111,19 @@ class Text(object):
         self.text = text
 
 
+class Field(object):
+    """Placeholder for a value filled in when rendering a :class:`.Template`.
+
+    :param name: Name of the value.
+    :param format_spec: Format specification applied to the value, see
+                        :func:`format`. Not applied to byte strings, which are
+                        inserted as they are.
+    """
+    def __init__(self, name, format_spec=''):
+        self.name = name
+        self.format_spec = format_spec
+
+
 class UpsideDown(FormatMode):
     SEQ_ON = get_command('set_updown_mode', 1)
     SEQ_OFF = get_command('set_updown_mode', 0)
@@ -93,6 +144,125 @@ class Underline(FormatMode):
     SEQ_OFF = get_command('set_underline', 0)
 
 
+class DoubleWidth(FontEnlarge):
+    SIZE = 0x20
+    SEQ_ON = get_command('set_font_enlarge', SIZE)
+    SEQ_OFF = get_command('set_font_enlarge', 0)
+
+
+class DoubleHeight(FontEnlarge):
+    SIZE = 0x01
+    SEQ_ON = get_command('set_font_enlarge', SIZE)
+    SEQ_OFF = get_command('set_font_enlarge', 0)
+
+
+#: Markup tags understood by :class:`.MarkupParser`.
+TAGS = {
+    'b': Bold,
+    'inv': Invert,
+    'updown': UpsideDown,
+    'u': Underline,
+    'dw': DoubleWidth,
+    'dh': DoubleHeight,
+}
+
+
+class MarkupParser(object):
+    """Incrementally converts markup into printer byte strings.
+
+    Text is marked up with HTML-like tags, see :data:`.TAGS`, e.g.
+    ``'<b>Total:</b> 12.00'``. Anything else, including unknown tags and
+    closing tags without an opening one, is printed as is. Input can be fed
+    in chunks of any size, output for each chunk is returned right away; only
+    a possible tag at the very end of a chunk is held back until the next
+    one. Nested tags of the same kind only
+    switch their mode once, as with :class:`.ByteStringVisitor`.
+
+    :param encoding: Encoding of the text. Must be ASCII compatible, as are
+                     the printer's code pages.
+    :param tags: Mapping of tag names to :class:`.FormatMode` subclasses.
+    """
+    def __init__(self, encoding='ascii', tags=TAGS):
+        self.encoding = encoding
+        self.tags = tags
+        self.pattern = re.compile('<(/?)({})>'.format(
+            '|'.join(re.escape(name) for name in sorted(tags, key=len,
+                                                        reverse=True))))
+        self.max_tag_len = max(len(name) for name in tags) + 3
+        self.mode_stack = Counter()
+        self.pending = u''
+
+    def feed(self, chunk):
+        """Parse a chunk of markup.
+
+        :param chunk: Text to parse.
+        :return: A byte string ready to be written to the printer.
+        """
+        text = self.pending + chunk
+
+        # hold back what could be the start of a tag
+        start = text.rfind(u'<', max(len(text) - self.max_tag_len, 0))
+        if start != -1 and u'>' not in text[start:]:
+            text, self.pending = text[:start], text[start:]
+        else:
+            self.pending = u''
+
+        # split yields text, followed by (slash, name, text) for every tag.
+        # tags are replaced by their sequences, decoded so everything can be
+        # encoded at once
+        parts = self.pattern.split(text)
+        for i in range(1, len(parts), 3):
+            parts[i] = self._tag(parts[i], parts[i + 1]).decode('latin1')
+            parts[i + 1] = u''
+        return u''.join(parts).encode(self.encoding)
+
+    def _tag(self, slash, name):
+        mode = self.tags[name]
+        depth = self.mode_stack[mode.SEQ_ON]
+
+        if not slash:
+            self.mode_stack[mode.SEQ_ON] = depth + 1
+            return b'' if depth else mode.switch(True, self.mode_stack)
+
+        if not depth:
+            # not a tag after all
+            return u'</{}>'.format(name).encode('latin1')
+        self.mode_stack[mode.SEQ_ON] = depth - 1
+        return b'' if depth > 1 else mode.switch(False, self.mode_stack)
+
+    def close(self):
+        """Finish parsing.
+
+        :return: A byte string with any held back text, switching off all
+                 modes of tags left open.
+        """
+        buf = [self.pending.encode(self.encoding)]
+        self.pending = u''
+
+        open_modes = [mode for mode in self.tags.values()
+                      if self.mode_stack[mode.SEQ_ON]]
+        self.mode_stack.clear()
+
+        # modes sharing a command are switched off once
+        seqs = []
+        for mode in open_modes:
+            seq = mode.switch(False, self.mode_stack)
+            if seq not in seqs:
+                seqs.append(seq)
+        return b''.join(buf + seqs)
+
+    def iter_encode(self, chunks):
+        """Parse markup chunk by chunk.
+
+        :param chunks: An iterable of text, e.g. a file opened in text mode.
+        :return: An iterator of byte strings, one per chunk, plus one more
+                 for :meth:`.close`.
+        """
+        for chunk in chunks:
+            yield self.feed(chunk)
+        yield self.close()
+
+
 class Format(object):
     """Format text using printer specific escape sequences.
 
@@ -122,6 +292,8 @@ class Format(object):
 
         self.start = start
         self.end = end
+        self.double_width = double_width
+        self.double_height = double_height
 
     def __call__(self, buf):
         """Format text using format escape sequences."""
@@ -129,7 +301,75 @@ class Format(object):
 
     @contextmanager
     def on(self, printer):
-        """Enable formatting inside context manager."""
+        """Enable formatting inside context manager.
+
+        The printer's :class:`~afthermal.layout.Layout` follows changes of
+        character size.
+        """
+        enlarge = self.double_width or self.double_height
+
         printer.write(self.start)
+        if enlarge:
+            printer.layout.double_width = self.double_width
+            printer.layout.double_height = self.double_height
         yield
         printer.write(self.end)
+        if enlarge:
+            # the end sequence resets both
+            printer.layout.double_width = False
+            printer.layout.double_height = False
+
+
+class TemplateCompiler(ByteStringVisitor):
+    """Turns a text tree into a list of byte strings and :class:`.Field`
+    instances, with adjacent byte strings merged."""
+    def join(self, parts):
+        segments = []
+        for part in parts:
+            for seg in (part if isinstance(part, list) else [part]):
+                if (isinstance(seg, binary_type) and segments and
+                        isinstance(segments[-1], binary_type)):
+                    segments[-1] += seg
+                else:
+                    segments.append(seg)
+        return segments
+
+    def visit_Field(self, node):
+        return [node]
+
+
+class Template(object):
+    """A text tree compiled for repeated rendering.
+
+    Formatting sequences and static text are encoded once, rendering only
+    encodes the values of the :class:`.Field` placeholders.
+
+    :param tree: A text tree, e.g. a :class:`.Node`.
+    :param encoding: Encoding of text and values.
+    """
+    def __init__(self, tree, encoding='ascii'):
+        self.encoding = encoding
+
+        # visiting plain text yields bytes rather than a list
+        compiler = TemplateCompiler(encoding)
+        self.segments = compiler.join([compiler.visit(tree)])
+        self.slots = [(i, seg) for i, seg in enumerate(self.segments)
+                      if isinstance(seg, Field)]
+
+    def render(self, **values):
+        """Render the template.
+
+        :param values: Values for all fields, by name.
+        :return: A byte string ready to be written to the printer.
+        """
+        buf = list(self.segments)
+        encoding = self.encoding
+
+        # byte strings are inserted as they are
+        for i, field in self.slots:
+            value = values[field.name]
+            if not isinstance(value, binary_type):
+                value = text_type(format(value, field.format_spec)).encode(
+                    encoding)
+            buf[i] = value
+        return b''.join(buf)
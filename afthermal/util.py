@@ -1,3 +1,6 @@
+from collections import OrderedDict
+
+
 def in_range(low, high, step=None):
     """Create a function that checks whether or not a value is in range.
 
@@ -44,6 +47,107 @@ def from_range(low, high, step=None, value_name='value'):
             raise ValueError(msg)
 
         if step is not None:
-            return (value - low) / step
+            return (value - low) // step
         return value - low
     return convert
+
+
+class RangeTable(object):
+    """Precomputed version of :func:`.from_range`.
+
+    All valid values are looked up in a table built once, instead of being
+    checked on every call. Only integer values are valid.
+
+    :param low: See :func:`.in_range`.
+    :param high: See :func:`.in_range`.
+    :param step: See :func:`.in_range`.
+    :param value_name: See :func:`.from_range`.
+    """
+    def __init__(self, low, high, step=None, value_name='value'):
+        self.low = low
+        self.high = high
+        self.step = step
+        self.value_name = value_name
+        self.table = dict((v, i) for i, v in
+                          enumerate(range(low, high, step or 1)))
+
+    def __contains__(self, value):
+        try:
+            return value in self.table
+        except TypeError:
+            return False
+
+    def __call__(self, value):
+        """Normalize a value, see :func:`.from_range`."""
+        try:
+            return self.table[value]
+        except (KeyError, TypeError):
+            from_range(self.low, self.high, self.step, self.value_name)(value)
+            raise ValueError('{} must be an integer, is {!r}'.format(
+                self.value_name, value))
+
+
+class LRUCache(object):
+    """A mapping that discards its least recently used entries.
+
+    :param max_size: Maximum number of entries.
+    :param max_bytes: Optional limit for the total size of all values.
+    :param sizeof: Function returning the size of a value, used with
+                   ``max_bytes``.
+    """
+    def __init__(self, max_size=128, max_bytes=None, sizeof=len):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Look up an entry, marking it as most recently used.
+
+        :param key: Key to look up.
+        :param default: Returned if there is no entry for ``key``.
+        """
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._discard(key)
+
+        if self.max_bytes is not None:
+            nbytes = self.sizeof(value)
+            if nbytes > self.max_bytes:
+                # would evict everything else and itself
+                return
+            self.size += nbytes
+
+        self._data[key] = value
+        while (len(self._data) > self.max_size or
+               self.max_bytes is not None and self.size > self.max_bytes):
+            self._discard(next(iter(self._data)))
+
+    def _discard(self, key):
+        if key in self._data:
+            value = self._data.pop(key)
+            if self.max_bytes is not None:
+                self.size -= self.sizeof(value)
+
+    def clear(self):
+        """Remove all entries."""
+        self._data.clear()
+        self.size = 0
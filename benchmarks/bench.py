@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+"""Benchmarks for afthermal.
+
+Measures the time spent in each stage of printing: converting images and QR
+codes into bitmaps, dithering, encoding text and commands, as well as the time
+a job takes on an emulated printer and the number of bytes it sends. Results
+are written as JSON, which can be compared against those of another version::
+
+    python benchmarks/bench.py -o new.json
+    python benchmarks/bench.py --compare old.json
+
+Benchmarks whose optional dependencies are missing are skipped. ``afthermal``
+must be importable, e.g. installed with ``pip install -e .`` from a checkout.
+"""
+
+import argparse
+import fnmatch
+import json
+import platform
+import sys
+import time
+import timeit
+
+from afthermal import ThermalPrinter
+from afthermal.emulator import EmulatedPort
+from afthermal.hw import encode_many, get_command
+from afthermal.img import LENA_FN
+from afthermal.text import Bold, ByteStringVisitor, Invert, Node, Text
+
+#: Registered benchmarks, in order. Each is a tuple of
+#: ``(name, params, setup)``, see :func:`benchmark`.
+BENCHMARKS = []
+
+IMAGE_SIZES = (128, 384, 1024)
+
+BW_CONVS = ('bin_threshold', 'mean_threshold', 'gauss_threshold',
+            'floydsteinberg', 'atkinson', 'jarvis', 'stucki', 'sierra_lite',
+            'bayer2', 'bayer4', 'bayer8', 'bayer16', 'bluenoise')
+
+
+class Skip(Exception):
+    """Raised by setup functions if a benchmark cannot run."""
+
+
+def benchmark(name, **params):
+    """Register a benchmark.
+
+    The decorated function is called with ``params`` once and returns a
+    callable, which is timed. It may also return a tuple of ``(callable,
+    extra)``, where ``extra`` is a function called after timing, returning a
+    dictionary of additional results.
+    """
+    def decorator(setup):
+        BENCHMARKS.append((name, params, setup))
+        return setup
+    return decorator
+
+
+def new_printer(**kwargs):
+    return ThermalPrinter(EmulatedPort(**kwargs))
+
+
+def lena_array(size):
+    try:
+        import cv2
+    except ImportError:
+        raise Skip('OpenCV not installed')
+    img = cv2.imread(LENA_FN)
+    return cv2.resize(img, (size, size))
+
+
+def lena_image(size):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise Skip('PIL not installed')
+    return Image.open(LENA_FN).resize((size, size))
+
+
+# image conversion
+def _convert_opencv(size, bw_conv='floydsteinberg'):
+    img = lena_array(size)
+    from afthermal.img.opencv import (DIFFUSION_KERNELS, OpenCVImageConverter,
+                                      error_diffusion)
+    if error_diffusion is None and bw_conv in DIFFUSION_KERNELS:
+        raise Skip('C extension not built')
+
+    converter = OpenCVImageConverter(new_printer(), bw_conv=bw_conv)
+    return lambda: converter.convert(img)
+
+
+def _convert_pil(size):
+    img = lena_image(size)
+    from afthermal.img.pil import PILImageConverter
+
+    converter = PILImageConverter(new_printer())
+    return lambda: converter.convert(img)
+
+
+for _size in IMAGE_SIZES:
+    benchmark('convert.opencv', size=_size)(_convert_opencv)
+    benchmark('convert.pil', size=_size)(_convert_pil)
+
+for _bw_conv in BW_CONVS:
+    benchmark('convert.bw_conv', size=512, bw_conv=_bw_conv)(_convert_opencv)
+
+
+@benchmark('dither.floydsteinberg', size=384)
+def _floydsteinberg(size):
+    try:
+        import numpy as np
+        from afthermal.img.dither import floydsteinberg
+    except ImportError:
+        raise Skip('C extension not built')
+
+    gray = lena_array(size)[:, :, 1].copy()
+
+    def run():
+        # dithering works in place
+        floydsteinberg(np.copy(gray))
+    return run
+
+
+# QR codes
+@benchmark('qr.render', cached=False)
+@benchmark('qr.render', cached=True)
+def _qr(cached):
+    try:
+        from afthermal.img.qr import QRCodeConverter
+        import pyqrcode  # noqa
+    except ImportError:
+        raise Skip('pyqrcode not installed')
+
+    converter = QRCodeConverter(new_printer())
+    text = 'https://github.com/mbr/afthermal'
+
+    def run():
+        if not cached:
+            converter.cache.clear()
+        converter.convert(text)
+    return run
+
+
+# text
+@benchmark('text.bytestring', paragraphs=100)
+def _bytestring(paragraphs):
+    tree = Node(*[Node(Text(u'Lorem ipsum '), Bold(Text(u'dolor sit amet')),
+                       Invert(Text(u', consectetur')), Text(u'\n'))
+                  for _ in range(paragraphs)])
+    return lambda: ByteStringVisitor().visit(tree)
+
+
+@benchmark('hw.get_command')
+def _get_command():
+    def run():
+        get_command('set_print_mode', 0x08)
+        get_command('set_control_parameter', 7, 80, 2)
+        get_command('print_bitmap', 24, 48)
+        get_command('init')
+    return run
+
+
+@benchmark('hw.encode_many')
+def _encode_many():
+    commands = [('set_print_mode', (0x08,)),
+                ('set_control_parameter', (7, 80, 2)),
+                ('print_bitmap', (24, 48)),
+                ('init', ())]
+    return lambda: encode_many(commands)
+
+
+# end to end on an emulated printer
+def _printed(port):
+    return {'bytes': port.bytes_written,
+            'print_time': port.print_time,
+            'overruns': len(port.overruns)}
+
+
+@benchmark('print.text', lines=50)
+def _print_text(lines):
+    text = u'The quick brown fox jumps over the lazy dog.\n' * lines
+    ports = []
+
+    def run():
+        port = EmulatedPort()
+        ports.append(port)
+        ThermalPrinter(port).print_text(text)
+    return run, lambda: _printed(ports[-1])
+
+
+@benchmark('print.image', band_height=255)
+@benchmark('print.image', band_height=24)
+def _print_image(band_height):
+    try:
+        from afthermal.img.pil import PILImageConverter
+    except ImportError:
+        raise Skip('PIL not installed')
+
+    width, data = PILImageConverter(new_printer()).convert(lena_image(512))
+    ports = []
+
+    def run():
+        port = EmulatedPort()
+        ports.append(port)
+        ThermalPrinter(port, band_height=band_height).print_image(width, data)
+    return run, lambda: _printed(ports[-1])
+
+
+def measure(func, repeat, min_time):
+    """Time a function.
+
+    :param func: Callable to time.
+    :param repeat: Number of measurements.
+    :param min_time: Minimum duration of a measurement, in seconds. Fast
+                     functions are called several times per measurement.
+    :return: A dictionary of per-call timings, in seconds.
+    """
+    timer = timeit.Timer(func)
+
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 10
+
+    times = [t / number for t in timer.repeat(repeat, number)]
+    return {'best': min(times),
+            'mean': sum(times) / len(times),
+            'number': number,
+            'repeat': repeat}
+
+
+def afthermal_version():
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('afthermal').version
+    except Exception:
+        return None
+
+
+def run(patterns=('*',), repeat=5, min_time=0.05, log=None):
+    """Run benchmarks.
+
+    :param patterns: Only run benchmarks whose names match one of these
+                     shell-style patterns.
+    :param repeat: See :func:`measure`.
+    :param min_time: See :func:`measure`.
+    :param log: Optional file to report progress to.
+    :return: A dictionary suitable for serializing as JSON.
+    """
+    results = []
+    for name, params, setup in BENCHMARKS:
+        if not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+
+        result = {'name': name, 'params': params}
+        try:
+            func = setup(**params)
+        except Skip as e:
+            result['skipped'] = str(e)
+        else:
+            extra = None
+            if isinstance(func, tuple):
+                func, extra = func
+            result.update(measure(func, repeat, min_time))
+            if extra is not None:
+                result.update(extra())
+
+        if log is not None:
+            log.write('{:<24} {:<40} {}\n'.format(
+                name, json.dumps(params, sort_keys=True),
+                result.get('skipped') or '{:.6f}s'.format(result['best'])))
+        results.append(result)
+
+    return {
+        'afthermal': afthermal_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'results': results,
+    }
+
+
+def key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(old, new, out):
+    """Print the ratio of new to old timings for all benchmarks in both."""
+    previous = dict((key(r), r) for r in old['results'] if 'best' in r)
+    for r in new['results']:
+        o = previous.get(key(r))
+        if o is None or 'best' not in r:
+            continue
+        out.write('{:<24} {:<40} {:6.2f}x\n'.format(
+            r['name'], json.dumps(r['params'], sort_keys=True),
+            r['best'] / o['best']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-o', '--output', help='File to write JSON results to '
+                        '(default: standard output)')
+    parser.add_argument('-k', '--filter', action='append',
+                        help='Only run benchmarks matching this pattern, '
+                        'e.g. "convert.*". Can be given multiple times.')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05)
+    parser.add_argument('--compare', help='JSON results of a previous run to '
+                        'compare against')
+    args = parser.parse_args(argv)
+
+    results = run(args.filter or ('*',), args.repeat, args.min_time,
+                  log=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results, sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
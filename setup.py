@@ -17,8 +17,11 @@ except ImportError:
     USE_CYTHON = False
 
 ext = '.pyx' if USE_CYTHON else '.c'
-extensions = [Extension('afthermal.img.floydsteinberg',
-                        ['afthermal/img/floydsteinberg' + ext])]
+# the extension is optional, without it ordered dithering is used in place of
+# error diffusion
+extensions = [Extension('afthermal.img.dither',
+                        ['afthermal/img/dither' + ext],
+                        optional=True)]
 
 if USE_CYTHON:
     from Cython.Build import cythonize
@@ -35,6 +38,9 @@ setup(
     url='http://github.com/mbr/afthermal',
     license='MIT',
     packages=find_packages(exclude=['tests']),
+    # Python 3 only APIs are used throughout, batch conversion needs
+    # multiprocessing.shared_memory
+    python_requires='>=3.8',
     install_requires=['pyserial', 'six'],
     extras_require={
         'tools': ['click'],
@@ -0,0 +1,159 @@
+import os
+
+import pytest
+
+asyncio = pytest.importorskip('asyncio')
+aio = pytest.importorskip('afthermal.aio')
+
+
+@pytest.fixture
+def pty():
+    master, slave = os.openpty()
+    yield master, os.ttyname(slave)
+    os.close(master)
+    os.close(slave)
+
+
+def read_all(fd):
+    os.set_blocking(fd, False)
+    buf = b''
+    while True:
+        try:
+            chunk = os.read(fd, 4096)
+        except BlockingIOError:
+            return buf
+        if not chunk:
+            return buf
+        buf += chunk
+
+
+def test_async_printer_writes_commands(pty):
+    master, name = pty
+
+    async def run():
+        printer = await aio.AsyncThermalPrinter.on_serial(name)
+        read_all(master)
+
+        await printer.set_text_align('M')
+        await printer.write(b'hello\n')
+        await printer.print_image(1, b'\xff')
+        return printer
+
+    printer = asyncio.run(run())
+    assert read_all(master) == (b'\x1B\x61\x01' + b'hello\n' +
+                                b'\x12\x2A\x01\x01\xff')
+    assert printer.port.write_ready > 0
+    printer.port.close()
+
+
+def test_drain_throttles_without_blocking(pty):
+    master, name = pty
+    port = aio.AsyncThrottledSerial(name)
+    port.dot_feed_time = 0.01
+
+    async def run():
+        port.write(b'\xff', is_text=False)
+        port.fed_dots(10)
+        port.write(b'\xff', is_text=False)
+
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(port.drain(), tick())
+        return ticks
+
+    assert len(asyncio.run(run())) == 5
+    assert read_all(master) == b'\xff\xff'
+    port.close()
+
+
+def test_print_image_streams_bands(pty):
+    master, name = pty
+    pending = []
+
+    async def run():
+        printer = await aio.AsyncThermalPrinter.on_serial(name, band_height=2)
+        printer.port.dot_feed_time = 0
+        printer.port.density_model = None
+        read_all(master)
+
+        def chunks():
+            for _ in range(3):
+                # everything before this chunk has been sent
+                pending.append(len(printer.port._pending))
+                yield b'\xff\xff'
+
+        await printer.print_image(1, chunks(), compress=False)
+        return printer
+
+    printer = asyncio.run(run())
+    assert pending == [0, 0, 0]
+    assert read_all(master) == b'\x12\x2A\x02\x01\xff\xff' * 3
+    printer.port.close()
+
+
+def test_on_serial_passes_port_options(pty):
+    master, name = pty
+    metrics = pytest.importorskip('afthermal.metrics').Metrics()
+
+    async def run():
+        return await aio.AsyncThermalPrinter.on_serial(
+            name, flow_control='busy', metrics=metrics)
+
+    printer = asyncio.run(run())
+    assert printer.port.flow_control == 'busy'
+    assert printer.port.metrics is metrics
+    assert read_all(master).endswith(b'\x1D\x61\x20')
+    assert metrics.bytes_written.value > 0
+    printer.port.close()
+
+
+def test_replay_outlives_recording(pty, tmpdir):
+    from afthermal import ThermalPrinter
+    from afthermal.job import RecordedJob
+
+    master, name = pty
+    fn = str(tmpdir.join('job.afj'))
+    printer = ThermalPrinter(aio.AsyncThrottledSerial(name))
+    asyncio.run(printer.port.drain())
+    read_all(master)
+
+    with open(fn, 'wb') as f, printer.record(f, passthrough=False):
+        printer.print_image(1, b'\xff')
+
+    # queued data must not refer to the file once it is closed
+    with RecordedJob(fn) as job:
+        job.replay(printer.port)
+    asyncio.run(printer.port.drain())
+
+    assert read_all(master) == b'\x12\x2A\x01\x01\xff'
+    printer.port.close()
+
+
+def test_busy_flow_control_waits_for_cts(pty, monkeypatch):
+    # CTS is deasserted while the printer is busy
+    polls = []
+
+    def cts(self):
+        polls.append(len(polls) >= 3)
+        return polls[-1]
+    monkeypatch.setattr(aio.AsyncThrottledSerial, 'cts', property(cts))
+
+    master, name = pty
+    port = aio.AsyncThrottledSerial(name, flow_control='busy')
+    port.dot_feed_time = 10
+
+    async def run():
+        port.write(b'\xff', is_text=False)
+        port.fed_dots(1)
+        port.write(b'\xfe', is_text=False)
+        await asyncio.wait_for(port.drain(), 5)
+
+    asyncio.run(run())
+    assert polls == [False, False, False, True]
+    assert read_all(master) == b'\xff\xfe'
+    port.close()
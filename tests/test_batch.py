@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip('multiprocessing.shared_memory')
+
+from afthermal.img import ImageConverter  # noqa
+from afthermal.img.batch import BatchConverter  # noqa
+
+
+class Printer(object):
+    DOTS_PER_LINE = 384
+
+    def __init__(self):
+        self.images = []
+
+    def print_image(self, width, data):
+        self.images.append((width, bytes(data)))
+
+    def __getstate__(self):
+        raise TypeError('printers cannot be pickled')
+
+
+class FileConverter(ImageConverter):
+    def open(self, fn):
+        with open(fn, 'rb') as f:
+            return f.read()
+
+    def convert(self, image):
+        return 1, image
+
+
+@pytest.fixture
+def files(tmpdir):
+    fns = []
+    for i in range(6):
+        fn = tmpdir.join('{}.img'.format(i))
+        fn.write_binary(bytes(bytearray([i])) * (i + 1))
+        fns.append(str(fn))
+    return fns
+
+
+def test_print_files_in_order(files):
+    printer = Printer()
+    BatchConverter(FileConverter(printer), processes=3).print_files(files)
+
+    assert printer.images == [(1, bytes(bytearray([i])) * (i + 1))
+                              for i in range(6)]
+
+
+def test_early_exit_frees_results(files):
+    conv = BatchConverter(FileConverter(Printer()), processes=2)
+    results = conv.convert_files(files)
+    width, data = next(results)
+    assert bytes(data) == b'\x00'
+    results.close()
@@ -0,0 +1,84 @@
+from afthermal.bitmap import Band, encode_bitmap
+
+
+def bands(data, width, band_height=255, compress=True):
+    return [Band(b.rows, b.width, None if b.data is None else bytes(b.data))
+            for b in encode_bitmap(data, width, band_height, compress)]
+
+
+def test_uncompressed_keeps_blank_rows():
+    data = b'\x00\x00' * 3
+    assert bands(data, 2, compress=False) == [Band(3, 2, data)]
+
+
+def test_blank_rows_become_feeds():
+    data = b'\x00\x00' * 3 + b'\xff\xff' + b'\x00\x00' * 2
+    assert bands(data, 2) == [
+        Band(3, 2, None),
+        Band(1, 2, b'\xff\xff'),
+        Band(2, 2, None),
+    ]
+
+
+def test_long_blank_runs_are_split():
+    assert bands(b'\x00' * 600, 1) == [
+        Band(255, 1, None),
+        Band(255, 1, None),
+        Band(90, 1, None),
+    ]
+
+
+def test_trailing_white_is_trimmed():
+    data = b'\xff\x00\x00\x00' + b'\x01\x80\x00\x00'
+    assert bands(data, 4) == [Band(2, 2, b'\xff\x00\x01\x80')]
+
+
+def test_narrow_rows_start_new_band():
+    data = (b'\xff' * 48) * 2 + (b'\x01' + b'\x00' * 47) * 2
+    assert bands(data, 48) == [
+        Band(2, 48, b'\xff' * 96),
+        Band(2, 1, b'\x01\x01'),
+    ]
+
+
+def test_band_height_is_honored():
+    assert [b.rows for b in encode_bitmap(b'\xff' * 5, 1, 2)] == [2, 2, 1]
+
+
+def test_chunks_merge_blank_runs():
+    chunks = iter([b'\xff\x00', b'\x00\x00' * 2, b'\x00\x00\x01\x00'])
+    assert bands(chunks, 2) == [
+        Band(1, 1, b'\xff'),
+        Band(3, 2, None),
+        Band(1, 1, b'\x01'),
+    ]
+
+
+def test_bands_span_chunks():
+    chunks = [b'\xff' * 2, b'\xff' * 2]
+    assert bands(chunks, 1) == [Band(4, 1, b'\xff' * 4)]
+
+
+def test_bands_span_chunks_uncompressed():
+    chunks = iter([b'\x00' * 3, b'\xff' * 3, b'\x01'])
+    assert bands(chunks, 1, band_height=2, compress=False) == [
+        Band(2, 1, b'\x00\x00'),
+        Band(2, 1, b'\x00\xff'),
+        Band(2, 1, b'\xff\xff'),
+        Band(1, 1, b'\x01'),
+    ]
+
+
+def test_chunked_image_gets_full_bands():
+    data = bytes(bytearray(range(1, 256))) * 4
+    chunks = [data[o:o + 24 * 4] for o in range(0, len(data), 24 * 4)]
+    assert bands(chunks, 4) == bands(data, 4)
+    assert [b.rows for b in bands(chunks, 4)] == [255]
+
+
+def test_bands_fit_max_size():
+    data = b'\xff\xff' * 5
+    assert [b.rows for b in encode_bitmap(data, 2, max_size=4)] == [2, 2, 1]
+    assert [b.rows for b in encode_bitmap(data, 2, compress=False,
+                                          max_size=5)] == [2, 2, 1]
+    assert [b.rows for b in encode_bitmap(data, 2, max_size=1)] == [1] * 5
@@ -0,0 +1,111 @@
+import os
+import pickle
+
+import pytest
+
+from afthermal.img import ImageConverter
+from afthermal.img.cache import BitmapCache
+
+
+class Printer(object):
+    DOTS_PER_LINE = 384
+
+    def __init__(self):
+        self.images = []
+
+    def print_image(self, width, data):
+        self.images.append((width, bytes(data)))
+
+
+class FileConverter(ImageConverter):
+    conversions = 0
+
+    def open(self, fn):
+        with open(fn, 'rb') as f:
+            return f.read()
+
+    def convert(self, image):
+        self.conversions += 1
+        return 1, image
+
+
+@pytest.fixture
+def image(tmpdir):
+    fn = tmpdir.join('logo.img')
+    fn.write_binary(b'\x01\x02\x03')
+    return str(fn)
+
+
+def test_memory_cache(image):
+    printer = Printer()
+    conv = FileConverter(printer, cache=BitmapCache())
+
+    conv.print_file(image)
+    conv.print_file(image)
+
+    assert conv.conversions == 1
+    assert printer.images == [(1, b'\x01\x02\x03')] * 2
+    assert conv.cache.stats == (1, 0, 1, 1, 3)
+
+
+def test_params_are_part_of_key(image):
+    cache = BitmapCache()
+    FileConverter(Printer(), cache=cache).convert_file(image)
+
+    conv = FileConverter(Printer(), width=192, cache=cache)
+    conv.convert_file(image)
+    assert conv.conversions == 1
+
+
+def test_modified_file_is_converted_again(image):
+    conv = FileConverter(Printer(), cache=BitmapCache())
+    conv.convert_file(image)
+
+    with open(image, 'wb') as f:
+        f.write(b'\x04')
+    assert conv.convert_file(image) == (1, b'\x04')
+    assert conv.conversions == 2
+
+
+def test_disk_cache(image, tmpdir):
+    path = str(tmpdir.join('cache'))
+    FileConverter(Printer(), cache=BitmapCache(path)).convert_file(image)
+
+    # a fresh cache, as after a restart
+    conv = FileConverter(Printer(), cache=BitmapCache(path))
+    assert conv.convert_file(image) == (1, b'\x01\x02\x03')
+    assert conv.conversions == 0
+    assert conv.cache.stats.disk_hits == 1
+
+    conv.cache.clear()
+    assert not os.listdir(path)
+
+
+def test_hash_contents(image, tmpdir):
+    cache = BitmapCache(hash_contents=True)
+    FileConverter(Printer(), cache=cache).convert_file(image)
+
+    copy = tmpdir.join('copy.img')
+    copy.write_binary(b'\x01\x02\x03')
+    conv = FileConverter(Printer(), cache=cache)
+    conv.convert_file(str(copy))
+    assert conv.conversions == 0
+
+
+def test_evicts_by_size():
+    cache = BitmapCache(max_bytes=10)
+    cache.put('a', 1, b'x' * 6)
+    cache.put('b', 1, b'y' * 6)
+
+    assert cache.get('a') is None
+    assert cache.get('b') == (1, b'y' * 6)
+    assert cache.stats.size == 6
+
+
+def test_pickle_drops_memory(tmpdir):
+    cache = BitmapCache(str(tmpdir))
+    cache.put('a', 1, b'x')
+
+    copy = pickle.loads(pickle.dumps(cache))
+    assert len(copy.memory) == 0
+    assert copy.get('a') == (1, b'x')
@@ -0,0 +1,39 @@
+import shutil
+
+from afthermal import ThermalPrinter
+from afthermal.emulator import EmulatedPort
+from afthermal.img import LENA_FN
+
+import pytest
+
+click = pytest.importorskip('click')
+pytest.importorskip('PIL')
+
+from afthermal import cli  # noqa
+from afthermal.img.pil import PILImageConverter  # noqa
+from click.testing import CliRunner  # noqa
+
+
+@pytest.fixture
+def port(monkeypatch):
+    port = EmulatedPort()
+    monkeypatch.setattr(ThermalPrinter, 'on_serial',
+                        classmethod(lambda cls, *args: cls(port)))
+    return port
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_print_two_images(port, tmpdir, jobs):
+    fns = [str(tmpdir.join(name)) for name in ('a.jpg', 'b[1].jpg')]
+    for fn in fns:
+        shutil.copy(LENA_FN, fn)
+
+    result = CliRunner().invoke(cli.main, ['-i', 'pil', 'print-image',
+                                           '-j', jobs] + fns)
+    assert result.exit_code == 0, result.output
+
+    single = EmulatedPort()
+    PILImageConverter(ThermalPrinter(single)).print_file(LENA_FN)
+    # both images, each followed by two blank lines
+    assert len(port.rows) == 2 * (len(single.rows) + 2 * 32)
+    assert not port.errors
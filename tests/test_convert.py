@@ -0,0 +1,36 @@
+from afthermal.bitmap import encode_bitmap
+from afthermal.img import LENA_FN
+
+import pytest
+
+
+class Printer(object):
+    DOTS_PER_LINE = 384
+
+
+@pytest.fixture(params=['opencv', 'pil'])
+def converter(request):
+    if request.param == 'opencv':
+        mod = pytest.importorskip('afthermal.img.opencv')
+        return mod.OpenCVImageConverter(Printer())
+    mod = pytest.importorskip('afthermal.img.pil')
+    return mod.PILImageConverter(Printer())
+
+
+def test_bands_match_whole_image(converter):
+    img = converter.open(LENA_FN)
+    width, data = converter.convert(img)
+
+    bwidth, chunks = converter.convert_bands(img)
+    chunks = [bytes(memoryview(c).cast('B')) for c in chunks]
+
+    assert bwidth == width == 48
+    assert all(len(c) == width * converter.band_height for c in chunks[:-1])
+    assert b''.join(chunks) == data
+
+
+def test_bands_span_chunks(converter):
+    width, chunks = converter.convert_bands(converter.open(LENA_FN))
+    bands = list(encode_bitmap(chunks, width, compress=False))
+
+    assert bands[0].rows == 255
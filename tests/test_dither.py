@@ -0,0 +1,62 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+dither = pytest.importorskip('afthermal.img.dither')
+
+
+@pytest.fixture
+def gradient():
+    return np.linspace(0, 255, 96)[None, :].repeat(64, 0).astype(np.uint8)
+
+
+@pytest.mark.parametrize('kernel', sorted(dither.KERNELS))
+@pytest.mark.parametrize('serpentine', [False, True])
+def test_output_is_black_and_white(gradient, kernel, serpentine):
+    img = gradient.copy()
+    out = dither.error_diffusion(img, kernel, serpentine)
+
+    assert out is img
+    assert set(np.unique(img)) <= {0, 255}
+    assert abs(img.mean() - gradient.mean()) < 8
+
+
+@pytest.mark.parametrize('kernel', sorted(dither.KERNELS))
+def test_blocks_carry_error(gradient, kernel):
+    whole = dither.error_diffusion(gradient.copy(), kernel)
+
+    blocks = gradient.copy()
+    diffuser = dither.ErrorDiffuser(blocks.shape[1], kernel)
+    for y in range(0, len(blocks), 7):
+        diffuser.process(blocks[y:y + 7])
+
+    assert (whole == blocks).all()
+
+
+def test_floydsteinberg_alias(gradient):
+    assert (dither.floydsteinberg(gradient.copy()) ==
+            dither.error_diffusion(gradient.copy(), 'floydsteinberg')).all()
+
+
+def test_unknown_kernel(gradient):
+    with pytest.raises(ValueError):
+        dither.error_diffusion(gradient, 'nope')
+
+
+def test_converter_knows_all_kernels():
+    opencv = pytest.importorskip('afthermal.img.opencv')
+    assert set(opencv.DIFFUSION_KERNELS) == set(dither.KERNELS)
+
+
+@pytest.mark.parametrize('kernel', sorted(dither.KERNELS))
+@pytest.mark.parametrize('threads', [2, 3, 5])
+def test_wavefront_is_identical(kernel, threads):
+    img = np.random.RandomState(0).randint(0, 256, (41, 77)).astype(np.uint8)
+
+    serial = dither.error_diffusion(img.copy(), kernel)
+    parallel = dither.error_diffusion(img.copy(), kernel, threads=threads)
+    assert (serial == parallel).all()
+
+
+def test_wavefront_rejects_serpentine(gradient):
+    with pytest.raises(ValueError):
+        dither.error_diffusion(gradient, serpentine=True, threads=2)
@@ -0,0 +1,163 @@
+import io
+import time
+
+from afthermal import ThermalPrinter
+from afthermal.emulator import EmulatedPort, pseudo_glyph
+from afthermal.glyphs import Glyph, GlyphManager
+from afthermal.port import DensityModel
+
+import pytest
+
+
+@pytest.fixture
+def port():
+    return EmulatedPort()
+
+
+@pytest.fixture
+def printer(port):
+    return ThermalPrinter(port)
+
+
+def dots(port):
+    return [bytes(row) for row in port.rows]
+
+
+def test_text(printer, port):
+    printer.write(b'A\n')
+    assert len(port.rows) == 32
+
+    glyph = pseudo_glyph(ord('A'))
+    assert [row[:12] for row in port.rows[:24]] == glyph
+    assert not any(any(row[12:]) for row in port.rows)
+
+
+def test_text_wraps_and_aligns(printer, port):
+    printer.set_text_align('R')
+    printer.write(b'x' * 33 + b'\n')
+
+    assert len(port.rows) == 64
+    # the box of a glyph is drawn one dot inside its cell
+    assert port.rows[10][1] and port.rows[10][383 - 1]
+    assert port.rows[32 + 10][383 - 1] and not port.rows[32 + 10][1]
+
+
+def test_double_size(printer, port):
+    printer.set_double_width()
+    printer.set_double_height()
+    printer.write(b'A\n')
+
+    assert len(port.rows) == 48
+    assert any(port.rows[43][:24])
+    assert not any(port.rows[43][24:])
+
+
+def test_print_text_double_size(printer, port):
+    printer.set_double_width()
+    printer.set_double_height()
+    printer.print_text(u'x' * 20 + u'\n')
+
+    # wrapped after 16 characters, both lines twice as high
+    assert len(port.rows) == 2 * 48
+    assert any(port.rows[48 + 43][:2 * 4 * 12])
+    assert not any(port.rows[48 + 43][2 * 4 * 12:])
+
+    printer.set_double_height(False)
+    printer.print_text(u'x' * 17 + u'\n')
+    assert len(port.rows) == 2 * 48 + 2 * 32
+
+
+def test_bitmap(printer, port):
+    data = b'\xf0\x0f' * 3 + b'\x00\x00' * 2 + b'\x80\x01'
+    printer.print_image(2, data)
+
+    arr = port.to_array()
+    assert arr.shape == (6, 384)
+    assert (arr[0, :4] == 0).all() and (arr[0, 4:12] == 255).all()
+    assert (arr[3:5] == 255).all()
+    assert arr[5, 0] == 0 and arr[5, 15] == 0
+
+
+def test_converted_image_round_trip(printer, port):
+    np = pytest.importorskip('numpy')
+    pil = pytest.importorskip('afthermal.img.pil')
+    from afthermal.img import LENA_FN
+
+    converter = pil.PILImageConverter(printer)
+    width, data = converter.convert(converter.open(LENA_FN))
+    converter.print_file(LENA_FN)
+
+    expected = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    assert (port.to_array().ravel() == (1 - expected) * 255).all()
+    assert not port.overruns and not port.errors
+
+
+def test_user_glyphs(printer, port):
+    glyph = Glyph(b'\xff\xff\xff' + b'\x00\x00\x00' * 11)
+    GlyphManager(printer).write(glyph, '\n')
+
+    assert all(row[0] for row in port.rows[:24])
+    assert not any(any(row[1:]) for row in port.rows)
+
+
+def test_heat_settings(printer, port):
+    printer.set_heat(max_dots=128, heat_time=1200, interval=40)
+    assert port.printer_heat == (128, 1200, 40)
+
+
+def test_detects_overruns():
+    fast = EmulatedPort(buffer_size=1024)
+    ThermalPrinter(fast, band_height=8).print_image(48, b'\xff' * 48 * 200)
+    assert not fast.overruns
+
+    # the printer is slower than the host thinks
+    slow = EmulatedPort(buffer_size=1024,
+                        printer_model=DensityModel(row_time=0.1))
+    ThermalPrinter(slow, band_height=8).print_image(48, b'\xff' * 48 * 200)
+    assert slow.overruns
+    assert slow.print_time > slow.clock
+
+
+def test_print_text_empty_double_height_lines(printer, port, monkeypatch):
+    fed = []
+    monkeypatch.setattr(port, 'fed_lines',
+                        lambda n_lines=1, dot_height=None: fed.append(
+                            n_lines * dot_height))
+
+    printer.set_double_height()
+    printer.print_text(u'x\n\n')
+
+    # the empty line is only as high as the line spacing
+    assert len(port.rows) == sum(fed) == 48 + 32
+
+
+def test_printing_overlaps_reception(printer, port):
+    # larger than the buffer, but printed faster than it is received
+    row = b'\x80' + b'\x00' * 46 + b'\x01'
+    printer.print_image(48, row * 100)
+
+    assert len(port.rows) == 100
+    assert not port.overruns
+
+
+def test_virtual_clock(printer, port):
+    start = time.time()
+    printer.write(b'a\nb\n')
+
+    # waiting for the first line advanced the virtual clock only
+    assert time.time() - start < port.line_feed_time
+    assert port.clock >= port.line_feed_time
+    assert port.print_time == pytest.approx(port.write_ready)
+
+
+def test_png(printer, port):
+    printer.write(b'A\n')
+    buf = io.BytesIO()
+    port.to_png(buf)
+    assert buf.getvalue().startswith(b'\x89PNG')
+
+    Image = pytest.importorskip('PIL.Image')
+    buf.seek(0)
+    im = Image.open(buf)
+    assert im.size == (384, 32)
+    assert im.getpixel((1, 10)) == 0 and im.getpixel((100, 10)) == 255
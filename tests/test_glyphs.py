@@ -0,0 +1,84 @@
+from afthermal import ThermalPrinter
+from afthermal.glyphs import Glyph, GlyphManager
+
+import pytest
+
+
+class FakePort(object):
+    line_height = 32
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, data, is_text=True):
+        self.written.append(bytes(data))
+
+    def fed(self, n_lines=0, n_dots=0, black_dots=None):
+        pass
+
+    def fed_lines(self, n_lines=1):
+        pass
+
+    def fed_dots(self, n_dots, black_dots=None):
+        pass
+
+
+@pytest.fixture
+def port():
+    return FakePort()
+
+
+@pytest.fixture
+def glyphs(port):
+    printer = ThermalPrinter(port)
+    del port.written[:]
+    return GlyphManager(printer, codes=[0x41, 0x42])
+
+
+def glyph(n):
+    return Glyph(bytes(bytearray([n])) * 36)
+
+
+def test_first_use_uploads(glyphs, port):
+    glyphs.write('a ', glyph(1), '\n')
+    assert port.written == [
+        b'\x1B\x26\x03\x41\x41', b'\x0c' + b'\x01' * 36 + b'\x00',
+        b'a \x1B\x25\x01A\x1B\x25\x00\n',
+    ]
+
+    del port.written[:]
+    glyphs.write(glyph(1), glyph(1))
+    assert port.written == [b'\x1B\x25\x01AA\x1B\x25\x00']
+    assert glyphs.uploads == 1
+
+
+def test_evicts_least_recently_used(glyphs):
+    glyphs.encode(glyph(1))
+    glyphs.encode(glyph(2))
+    glyphs.encode(glyph(1))
+
+    assert glyphs.encode(glyph(3)) == b'\x1B\x25\x01B\x1B\x25\x00'
+    assert glyph(2) not in glyphs.loaded
+    assert glyphs.uploads == 3
+
+
+def test_pinned_glyphs_are_not_evicted(glyphs):
+    glyphs.encode(glyph(1), glyph(2))
+    with pytest.raises(ValueError):
+        glyphs.encode(glyph(1), glyph(2), glyph(3))
+
+
+def test_reset(glyphs):
+    glyphs.encode(glyph(1))
+    glyphs.reset()
+    glyphs.encode(glyph(1))
+    assert glyphs.uploads == 2
+
+
+def test_from_bitmap():
+    # 12x24, left column and top row black
+    rows = [b'\xff\xf0'] + [b'\x80\x00'] * 23
+    g = Glyph.from_bitmap(2, b''.join(rows))
+
+    assert g.data[:3] == b'\xff\xff\xff'
+    assert g.data[3:] == b'\x80\x00\x00' * 11
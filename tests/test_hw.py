@@ -0,0 +1,44 @@
+from afthermal.hw import CMDS, encode_many, get_command
+
+import pytest
+
+
+@pytest.mark.parametrize('cmd,args', [
+    ('init', ()),
+    ('set_font_bold', (1,)),
+    ('set_font_bold', (255,)),
+    ('print_bitmap', (24, 48)),
+    ('set_control_parameter', (7, 80, 2)),
+])
+def test_get_command(cmd, args):
+    seq, nargs = CMDS[cmd]
+    assert get_command(cmd, *args) == seq + bytes(bytearray(args))
+
+
+@pytest.mark.parametrize('cmd,args', [
+    ('init', (1,)),
+    ('set_font_bold', ()),
+    ('set_font_bold', (256,)),
+    ('set_font_bold', (-1,)),
+    ('set_font_bold', (1.5,)),
+    ('set_control_parameter', (7, 80, 256)),
+])
+def test_get_command_rejects_invalid_arguments(cmd, args):
+    with pytest.raises(ValueError):
+        get_command(cmd, *args)
+
+    with pytest.raises(ValueError):
+        encode_many([(cmd, args)])
+
+
+def test_encode_many():
+    commands = [('init', ()), ('set_font_bold', (1,)),
+                ('set_control_parameter', (7, 80, 2)), ('init', ())]
+
+    expected = b''.join(get_command(cmd, *args) for cmd, args in commands)
+    assert encode_many(commands) == expected
+    assert encode_many([]) == b''
+
+    buf = bytearray(b'abc')
+    assert encode_many(commands, buf) is buf
+    assert buf == b'abc' + expected
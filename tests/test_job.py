@@ -0,0 +1,92 @@
+from afthermal import ThermalPrinter
+from afthermal.emulator import EmulatedPort
+from afthermal.job import MAGIC, RecordedJob
+
+import pytest
+
+
+@pytest.fixture
+def port():
+    return EmulatedPort()
+
+
+@pytest.fixture
+def printer(port):
+    return ThermalPrinter(port)
+
+
+@pytest.fixture
+def fn(tmpdir):
+    return str(tmpdir.join('job.afj'))
+
+
+def print_job(printer):
+    printer.set_heat(max_dots=128, heat_time=1200, interval=40)
+    printer.set_line_height(40)
+    printer.print_text(u'A line long enough to be wrapped by the layout.\n')
+    printer.print_image(2, b'\xf0\x0f' * 30 + b'\x00\x00' * 30)
+    printer.feed(10)
+
+
+def test_replay_matches_original(printer, port, fn):
+    other = EmulatedPort()
+    replayer = ThermalPrinter(other)
+    assert (other.bytes_written, other.clock) == (port.bytes_written,
+                                                  port.clock)
+
+    with open(fn, 'wb') as f, printer.record(f):
+        print_job(printer)
+    replayer.replay(fn)
+
+    assert other.rows == port.rows
+    assert other.bytes_written == port.bytes_written
+    assert other.print_time == pytest.approx(port.print_time)
+    assert other.printer_heat == (128, 1200, 40)
+    assert other.heat == (128, 1200, 40)
+    assert other.line_height == 40
+
+
+def test_record_only(printer, port, fn):
+    rows = len(port.rows)
+    with open(fn, 'wb') as f, printer.record(f, passthrough=False):
+        print_job(printer)
+    assert len(port.rows) == rows
+
+    kinds = [kind for kind, _ in RecordedJob(fn)]
+    assert kinds[:2] == [b'H', b'L']
+    assert b'D' in kinds and b'F' in kinds
+
+
+def test_rejects_other_files(fn):
+    with open(fn, 'wb') as f:
+        f.write(b'not a job')
+    with pytest.raises(ValueError):
+        RecordedJob(fn)
+
+    with open(fn, 'wb') as f:
+        f.write(MAGIC + b'D\x00\x00\x00\x10abc')
+    with pytest.raises(ValueError):
+        list(RecordedJob(fn))
+
+
+def test_replay_closes_recording(printer, fn):
+    with open(fn, 'wb') as f, printer.record(f, passthrough=False):
+        print_job(printer)
+
+    with RecordedJob(fn) as job:
+        job.replay(EmulatedPort())
+    assert job.data.closed
+
+
+def test_close_after_failed_replay(printer, fn):
+    with open(fn, 'wb') as f, printer.record(f, passthrough=False):
+        print_job(printer)
+
+    class BrokenPort(EmulatedPort):
+        def write(self, data, is_text=True):
+            raise IOError('unplugged')
+
+    with pytest.raises(IOError):
+        with RecordedJob(fn) as job:
+            job.replay(BrokenPort())
+    assert job.data.closed
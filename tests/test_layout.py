@@ -0,0 +1,65 @@
+from afthermal.layout import Layout
+
+import pytest
+
+
+@pytest.fixture
+def layout():
+    return Layout(chars_per_line=10)
+
+
+def test_wraps_at_words(layout):
+    assert list(layout.iter_lines(u'one two three four\n')) == [
+        (u'one two\n', True),
+        (u'three four', True),
+    ]
+
+
+def test_full_line_has_no_newline(layout):
+    assert list(layout.iter_lines(u'0123456789\n\nx')) == [
+        (u'0123456789', True),
+        (u'\n', True),
+        (u'x', False),
+    ]
+    assert layout.column == 1
+
+
+def test_long_words_are_split(layout):
+    assert list(layout.iter_lines(u'abc 0123456789abc')) == [
+        (u'abc\n', True),
+        (u'0123456789', True),
+        (u'abc', False),
+    ]
+
+
+def test_chunks_continue_line(layout):
+    assert list(layout.iter_lines(u'hello ')) == [(u'hello ', False)]
+    # the line is ended, 'hello ' has been written already
+    assert list(layout.iter_lines(u'world\n')) == [
+        (u'\n', True),
+        (u'world\n', True),
+    ]
+
+
+def test_align_strips_trailing_spaces(layout):
+    layout.align = 'M'
+    assert list(layout.iter_lines(u'ab  \n')) == [(u'ab\n', True)]
+
+
+def test_double_size(layout):
+    layout.double_width = True
+    layout.double_height = True
+    assert layout.width == 5
+    assert layout.line_dots == 48
+
+    layout.reset()
+    assert layout.width == 10
+    assert layout.line_dots == 32
+
+
+def test_blank_lines(layout):
+    blank = []
+    for text in (u'ab', u'\n\n', u'cd\n'):
+        blank.extend(layout.blank for _, complete in layout.iter_lines(text)
+                     if complete)
+    assert blank == [False, True, False]
@@ -0,0 +1,95 @@
+import logging
+
+from afthermal import ThermalPrinter
+from afthermal.emulator import EmulatedPort
+from afthermal.metrics import (CallbackSink, Histogram, LogSink, Metrics,
+                               PrometheusTextfileSink, format_prometheus)
+from afthermal.printqueue import PrintQueue
+
+import pytest
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def metrics(events):
+    return Metrics([CallbackSink(lambda name, value:
+                                 events.append((name, value)))])
+
+
+@pytest.fixture
+def port(metrics):
+    port = EmulatedPort()
+    port.metrics = metrics
+    return port
+
+
+def test_histogram():
+    h = Histogram('h', 'help', buckets=(1, 2))
+    for v in (0.5, 1, 1.5, 3):
+        h.observe(v)
+
+    assert h.counts == [2, 1]
+    assert h.cumulative_counts() == [2, 3]
+    assert h.count == 4
+    assert h.sum == 6
+
+
+def test_port_reports(port, metrics, events):
+    printer = ThermalPrinter(port)
+    printer.write(b'a\nb\n')
+
+    assert metrics.bytes_written.value == port.bytes_written
+    assert metrics.writes.value == metrics.write_seconds.count
+    assert metrics.lines_fed.value == 2
+    assert ('afthermal_lines_fed_total', 1) in events
+
+    # waiting for the first line to print
+    assert metrics.throttle_seconds.sum == pytest.approx(port.line_feed_time)
+    # writes take as long as transmitting the data on the emulated port
+    assert metrics.write_seconds.sum == pytest.approx(
+        port.bytes_written * 10.0 / port.baudrate)
+
+    printer.print_image(2, b'\xff\xff' * 10)
+    assert metrics.dots_fed.value == 10
+
+
+def test_disabled_by_default():
+    assert EmulatedPort().metrics is None
+
+
+def test_job_duration(metrics):
+    class Printer(object):
+        def write(self, data):
+            pass
+
+    with PrintQueue(Printer(), metrics) as q:
+        q.submit_text(b'a\nb\n')
+        q.submit_text(b'c\n')
+
+    assert metrics.job_seconds.count == 2
+
+
+def test_sinks(metrics, tmpdir, caplog):
+    fn = str(tmpdir.join('afthermal.prom'))
+    metrics.sinks.extend([PrometheusTextfileSink(fn), LogSink()])
+
+    metrics.bytes_written.inc(10)
+    metrics.job_seconds.observe(0.2)
+    with caplog.at_level(logging.INFO, logger='afthermal.metrics'):
+        metrics.flush()
+
+    with open(fn) as f:
+        text = f.read()
+    assert text == format_prometheus(metrics)
+    assert 'afthermal_bytes_written_total 10\n' in text
+    assert 'afthermal_job_seconds_bucket{le="0.1"} 0\n' in text
+    assert 'afthermal_job_seconds_bucket{le="0.5"} 1\n' in text
+    assert 'afthermal_job_seconds_bucket{le="+Inf"} 1\n' in text
+    assert 'afthermal_job_seconds_count 1\n' in text
+    assert '# TYPE afthermal_job_seconds histogram' in text
+
+    assert 'afthermal_bytes_written_total = 10' in caplog.text
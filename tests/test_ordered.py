@@ -0,0 +1,66 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+ordered = pytest.importorskip('afthermal.img.ordered')
+
+
+@pytest.mark.parametrize('n', [2, 4, 8, 16])
+def test_bayer_matrix_is_permutation(n):
+    m = ordered.bayer_matrix(n)
+    assert m.shape == (n, n)
+    assert sorted(m.ravel()) == list(range(n * n))
+
+
+def test_void_and_cluster_is_permutation():
+    m = ordered.void_and_cluster(16)
+    assert sorted(m.ravel()) == list(range(256))
+
+
+@pytest.mark.parametrize('mask', ordered.MASKS)
+def test_ordered_dither_preserves_tone(mask):
+    img = np.full((70, 50), 64, dtype=np.uint8)
+    out = ordered.ordered_dither(img, mask)
+
+    assert out.shape == img.shape
+    assert set(np.unique(out)) == {0, 255}
+    assert abs(out.mean() - 64) < 8
+
+
+def test_unknown_mask():
+    with pytest.raises(ValueError):
+        ordered.threshold_mask('bayer3')
+
+
+class Printer(object):
+    DOTS_PER_LINE = 384
+
+
+@pytest.fixture
+def gradient():
+    return np.tile(np.linspace(0, 255, 384).astype(np.uint8), (60, 1))
+
+
+@pytest.fixture
+def without_extension(monkeypatch):
+    opencv = pytest.importorskip('afthermal.img.opencv')
+    monkeypatch.setattr(opencv, 'error_diffusion', None)
+    monkeypatch.setattr(opencv, 'ErrorDiffuser', None)
+    return opencv
+
+
+def test_diffusion_falls_back_to_bluenoise(without_extension, gradient):
+    def convert(bw_conv):
+        return without_extension.OpenCVImageConverter(
+            Printer(), bw_conv=bw_conv).convert(gradient)
+
+    assert convert('floydsteinberg') == convert('bluenoise')
+
+
+@pytest.mark.parametrize('mask', ['bayer2', 'bayer4', 'bayer8', 'bayer16'])
+def test_converter_ordered_dither(without_extension, gradient, mask):
+    from afthermal.img.pack import pack_array
+
+    converter = without_extension.OpenCVImageConverter(Printer(),
+                                                       bw_conv=mask)
+    expected = pack_array(ordered.ordered_dither(gradient, mask)).tobytes()
+    assert converter.convert(gradient) == (48, expected)
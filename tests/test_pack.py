@@ -0,0 +1,60 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+from afthermal.img.pack import pack, pack_array, packed_width
+
+
+@pytest.fixture(params=[8, 13, 384])
+def img(request):
+    rng = np.random.RandomState(0)
+    return rng.randint(0, 2, size=(5, request.param)).astype(np.uint8) * 255
+
+
+def reference(img):
+    # one bit per dot, padded with white, set bits are black
+    rows = []
+    for row in img:
+        bits = ''.join('0' if px else '1' for px in row)
+        bits += '0' * (-len(bits) % 8)
+        rows.append(bytes(bytearray(int(bits[i:i+8], 2)
+                                    for i in range(0, len(bits), 8))))
+    return b''.join(rows)
+
+
+def test_packed_width():
+    assert packed_width(1) == 1
+    assert packed_width(8) == 1
+    assert packed_width(9) == 2
+    assert packed_width(384) == 48
+
+
+def test_pack_array(img):
+    packed = pack_array(img)
+    assert packed.shape == (5, packed_width(img.shape[1]))
+    assert packed.tobytes() == reference(img)
+
+
+@pytest.mark.parametrize('dtype', [bool, np.uint8, np.intp])
+def test_pack_array_dtypes(img, dtype):
+    src = (img // 255).astype(dtype)
+    assert pack_array(src).tobytes() == reference(img)
+
+
+def test_pack_array_out(img):
+    out = np.zeros((5, packed_width(img.shape[1])), dtype=np.uint8)
+    assert pack_array(img, out=out) is out
+    assert out.tobytes() == reference(img)
+
+    with pytest.raises(ValueError):
+        pack_array(img, out=out[:1])
+
+
+def test_pack_image(img):
+    Image = pytest.importorskip('PIL.Image')
+    im = Image.fromarray(img).convert('1')
+    assert pack(im) == reference(img)
+
+    out = bytearray(len(reference(img)) + 3)
+    view = pack(im, out=out)
+    assert len(view) == len(reference(img))
+    assert bytes(out[:len(view)]) == reference(img)
@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+
+from afthermal.port import (CommandBuffer, DensityModel, ThrottledSerial,
+                            split_lines)
+
+import pytest
+
+
+class RecordingPort(object):
+    line_height = 32
+
+    def __init__(self):
+        self.log = []
+
+    def write(self, data, is_text=True):
+        self.log.append(('write', bytes(data)))
+
+    def fed(self, n_lines=0, n_dots=0, black_dots=None):
+        self.log.append(('fed', n_lines, n_dots))
+
+
+def test_split_lines():
+    chunks = [(bytes(c), l) for c, l in split_lines(b'ab\ncd\n\nef')]
+    assert chunks == [(b'ab\n', True), (b'cd\n', True), (b'\n', True),
+                      (b'ef', False)]
+
+
+def test_split_lines_binary():
+    assert list(split_lines(b'a\nb', is_text=False)) == [(b'a\nb', False)]
+
+
+def test_command_buffer_flushes_at_feeds():
+    port = RecordingPort()
+    buf = CommandBuffer(port)
+
+    buf.write(b'\x1B\x45\x01', is_text=False)
+    buf.write(b'hello')
+    buf.write(b'\x1B\x45\x00', is_text=False)
+    assert port.log == []
+
+    buf.write(b'\n')
+    buf.write(b'\x12\x2A\x01\x01\xff', is_text=False)
+    buf.fed_dots(1)
+    buf.write(b'tail')
+    buf.flush()
+
+    assert port.log == [
+        ('write', b'\x1B\x45\x01hello\x1B\x45\x00\n'),
+        ('fed', 1, 0),
+        ('write', b'\x12\x2A\x01\x01\xff'),
+        ('fed', 0, 1),
+        ('write', b'tail'),
+    ]
+
+
+def test_command_buffer_max_size():
+    port = RecordingPort()
+    buf = CommandBuffer(port, max_size=4)
+    buf.write(b'abcdef')
+    assert port.log == [('write', b'abcdef')]
+
+
+def test_lines_time():
+    port = ThrottledSerial()
+    assert port.lines_time(2) == 2 * port.line_feed_time
+    assert port.lines_time(2, dot_height=64) == pytest.approx(
+        2 * port.line_feed_time)
+    assert port.lines_time(1, dot_height=48) == pytest.approx(
+        1.5 * port.line_feed_time)
+
+
+def test_density_model():
+    model = DensityModel(row_time=0.01, heat_scale=1.0)
+    cycle = (800 + 20) * 1e-6
+
+    assert model.dots_time([0, 0], 64, 800, 20) == pytest.approx(0.02)
+    assert model.dots_time([1, 64, 65], 64, 800, 20) == pytest.approx(
+        0.03 + 4 * cycle)
+
+
+def test_dots_time_uses_density_model():
+    port = ThrottledSerial()
+    assert port.dots_time(2) == 2 * port.dot_feed_time
+    assert port.dots_time(2, [0, 0]) < port.dots_time(2, [384, 384])
+    assert port.dots_time(1, [384]) <= port.dot_feed_time * 1.01
+
+    port.density_model = None
+    assert port.dots_time(2, [0, 0]) == 2 * port.dot_feed_time
+
+
+class FakePrinter(threading.Thread):
+    """Reads from the master side of a pty, answering status requests."""
+    def __init__(self, master, answer=True):
+        super(FakePrinter, self).__init__()
+        self.daemon = True
+        self.master = master
+        self.answer = answer
+        self.received = b''
+
+    def run(self):
+        while True:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not data:
+                return
+            self.received += data
+            if self.answer:
+                for _ in range(data.count(ThrottledSerial.STATUS_REQUEST)):
+                    os.write(self.master, b'\x00')
+
+
+@pytest.fixture
+def pty():
+    master, slave = os.openpty()
+    yield master, os.ttyname(slave)
+    os.close(slave)
+    os.close(master)
+
+
+def test_status_flow_control_skips_estimate(pty):
+    master, name = pty
+    printer = FakePrinter(master)
+    printer.start()
+
+    port = ThrottledSerial(name, flow_control='status')
+    port.dot_feed_time = 10
+
+    start = time.time()
+    port.write(b'\xff', is_text=False)
+    port.fed_dots(1)
+    port.write(b'\xfe', is_text=False)
+    assert time.time() - start < 5
+    assert port.last_status == b'\x00'
+    port.close()
+
+    time.sleep(0.05)
+    assert printer.received == (b'\xff' + ThrottledSerial.STATUS_REQUEST +
+                                b'\xfe')
+
+
+def test_status_flow_control_falls_back_to_estimate(pty):
+    master, name = pty
+    FakePrinter(master, answer=False).start()
+
+    port = ThrottledSerial(name, flow_control='status')
+    port.dot_feed_time = 0.1
+
+    start = time.time()
+    port.write(b'\xff', is_text=False)
+    port.fed_dots(2)
+    port.write(b'\xfe', is_text=False)
+    assert time.time() - start >= 0.2
+    port.close()
+
+
+def busy_for(n_polls):
+    # CTS is deasserted while the printer is busy
+    polls = []
+
+    def cts(self):
+        polls.append(len(polls) >= n_polls)
+        return polls[-1]
+    return polls, property(cts)
+
+
+def test_busy_flow_control_waits_for_cts(pty, monkeypatch):
+    polls, cts = busy_for(3)
+    monkeypatch.setattr(ThrottledSerial, 'cts', cts)
+
+    port = ThrottledSerial(pty[1], flow_control='busy')
+    port.dot_feed_time = 10
+
+    start = time.time()
+    port.write(b'\xff', is_text=False)
+    port.fed_dots(1)
+    port.write(b'\xfe', is_text=False)
+    assert time.time() - start < 5
+    assert polls == [False, False, False, True]
+    port.close()
+
+
+def test_busy_flow_control_falls_back_to_estimate(pty, monkeypatch):
+    monkeypatch.setattr(ThrottledSerial, 'cts', property(lambda self: False))
+
+    port = ThrottledSerial(pty[1], flow_control='busy')
+    port.dot_feed_time = 0.1
+
+    start = time.time()
+    port.write(b'\xff', is_text=False)
+    port.fed_dots(2)
+    port.write(b'\xfe', is_text=False)
+    assert time.time() - start >= 0.2
+    port.close()
@@ -0,0 +1,153 @@
+from afthermal import ThermalPrinter
+
+import pytest
+
+
+class FakePort(object):
+    line_height = 32
+
+    def __init__(self):
+        self.written = []
+        self.dots = []
+        self.black_dots = []
+        self.line_dots = []
+
+    def write(self, data, is_text=True):
+        self.written.append(bytes(data))
+
+    def fed(self, n_lines=0, n_dots=0, black_dots=None, dot_height=None):
+        if n_dots:
+            self.dots.append(n_dots)
+            self.black_dots.append(black_dots)
+        if n_lines:
+            self.line_dots.append(dot_height)
+
+    def fed_lines(self, n_lines=1, dot_height=None):
+        self.fed(n_lines=n_lines, dot_height=dot_height)
+
+    def fed_dots(self, n_dots, black_dots=None):
+        self.fed(n_dots=n_dots, black_dots=black_dots)
+
+
+@pytest.fixture
+def port():
+    return FakePort()
+
+
+@pytest.fixture
+def printer(port):
+    p = ThermalPrinter(port, band_height=4)
+    del port.written[:]
+    return p
+
+
+def test_print_image_bands(printer, port):
+    data = bytes(bytearray(range(2 * 10)))
+    printer.print_image(2, data)
+
+    assert port.dots == [4, 4, 2]
+    assert port.written == [
+        b'\x12\x2A\x04\x02', data[0:8],
+        b'\x12\x2A\x04\x02', data[8:16],
+        b'\x12\x2A\x02\x02', data[16:20],
+    ]
+
+
+def test_print_image_band_height_override(printer, port):
+    printer.print_image(1, b'\xff' * 3, band_height=1)
+    assert port.dots == [1, 1, 1]
+
+
+def test_print_image_bands_fit_buffer(port):
+    printer = ThermalPrinter(port)
+    printer.print_image(48, b'\xff' * 48 * 100)
+
+    # 85 rows of 48 bytes and a header are just below 4096 bytes
+    assert port.dots == [85, 15]
+
+    printer = ThermalPrinter(port, buffer_size=1024)
+    del port.dots[:]
+    printer.print_image(48, b'\xff' * 48 * 100)
+    assert port.dots == [21, 21, 21, 21, 16]
+
+
+def test_print_image_rejects_bad_band_height(printer):
+    with pytest.raises(ValueError):
+        printer.print_image(1, b'\xff', band_height=256)
+
+
+def test_print_image_2d_buffer(printer, port):
+    np = pytest.importorskip('numpy')
+    img = np.arange(12, dtype=np.uint8).reshape(6, 2)
+    printer.print_image(2, img)
+
+    assert b''.join(port.written[1::2]) == img.tobytes()
+
+
+def test_print_image_feeds_blank_rows(printer, port):
+    printer.print_image(2, b'\x00\x00' * 3 + b'\x80\x00')
+
+    assert port.written == [b'\x1B\x4A\x03', b'\x12\x2A\x01\x01', b'\x80']
+    assert port.dots == [3, 1]
+    assert port.black_dots == [(0, 0, 0), [1]]
+
+
+def test_set_heat_updates_port(printer, port):
+    printer.set_heat(max_dots=80, heat_time=1200, interval=40)
+    assert port.written == [b'\x1B\x37\x09\x75\x04']
+    assert port.heat == (80, 1200, 40)
+
+
+def test_batch_coalesces_writes(printer, port):
+    with printer.batch():
+        printer.set_text_align('M')
+        printer.write(b'hello')
+        printer.print_image(1, b'\xff')
+
+    assert port.written == [b'\x1B\x61\x01hello\x12\x2A\x01\x01\xff']
+    assert port.dots == [1]
+    assert isinstance(printer.port, FakePort)
+
+
+def test_upload_custom_character(printer, port):
+    printer.upload_custom_character(0x41, b'\xff\x00\x81' * 2)
+    assert b''.join(port.written) == (b'\x1B\x26\x03\x41\x41\x02' +
+                                      b'\xff\x00\x81' * 2 + b'\x00')
+
+    del port.written[:]
+    printer.pad_custom_characters = False
+    printer.upload_custom_character(0x41, b'\xff\x00\x81' * 2)
+    assert b''.join(port.written) == (b'\x1B\x26\x03\x41\x41\x02' +
+                                      b'\xff\x00\x81' * 2)
+
+    with pytest.raises(ValueError):
+        printer.upload_custom_character(0x7F, b'\x00' * 3)
+    with pytest.raises(ValueError):
+        printer.upload_custom_character(0x41, b'\x00' * 39)
+
+
+def test_print_text_wraps(printer, port):
+    printer.print_text(u'lorem ipsum ' * 6 + u'\n')
+
+    lines = b''.join(port.written).split(b'\n')
+    assert lines == [b'lorem ipsum lorem ipsum lorem',
+                     b'ipsum lorem ipsum lorem ipsum',
+                     b'lorem ipsum ', b'']
+    assert port.line_dots == [32, 32, 32]
+
+
+def test_print_text_double_size(printer, port):
+    printer.set_double_width()
+    printer.set_double_height()
+    del port.written[:]
+
+    printer.print_text(u'0123456789abcdefXYZ')
+    assert port.written == [b'0123456789abcdef', b'XYZ']
+    assert port.line_dots == [48]
+
+    # empty lines only feed the line spacing
+    printer.print_text(u'\n\nab\n')
+    assert port.line_dots == [48, 48, 32, 48]
+
+    printer.reset()
+    assert printer.layout.width == 32
@@ -0,0 +1,172 @@
+import json
+import threading
+
+from afthermal import ThermalPrinter
+from afthermal.emulator import EmulatedPort
+from afthermal.printqueue import PrinterPool, PrintQueue
+
+import pytest
+
+
+class FakePrinter(object):
+    def __init__(self):
+        self.log = []
+
+    def write(self, data):
+        self.log.append(data)
+
+
+@pytest.fixture
+def printer():
+    return FakePrinter()
+
+
+def test_jobs_are_printed(printer):
+    with PrintQueue(printer) as q:
+        f = q.submit_text(b'a\nb\n')
+
+    stats = f.result()
+    assert printer.log == [b'a\n', b'b\n']
+    assert stats.wait_time >= 0
+    assert stats.service_time >= 0
+
+
+def test_higher_priority_preempts(printer):
+    gate = threading.Event()
+    started = threading.Event()
+
+    def blocking_step(p):
+        started.set()
+        gate.wait()
+        p.write(b'long 1')
+
+    def steps():
+        yield blocking_step
+        yield lambda p: p.write(b'long 2')
+
+    with PrintQueue(printer) as q:
+        low = q.submit(steps())
+        started.wait()
+        high = q.submit_text(b'urgent', priority=10)
+        gate.set()
+
+    assert printer.log == [b'long 1', b'urgent', b'long 2']
+    assert low.result().wait_time >= high.result().service_time
+
+
+def test_errors_are_reported(printer):
+    def fail(p):
+        raise RuntimeError('paper jam')
+
+    with PrintQueue(printer) as q:
+        f = q.submit([fail])
+        ok = q.submit_call(lambda p, s: p.write(s), b'next')
+
+    with pytest.raises(RuntimeError):
+        f.result()
+    ok.result()
+    assert printer.log == [b'next']
+
+
+def test_prints_on_thermal_printer():
+    port = EmulatedPort()
+    printer = ThermalPrinter(port)
+
+    with PrintQueue(printer) as q:
+        f = q.submit_text(b'a\nb\n')
+        g = q.submit_image(2, b'\xff\xff' * 10)
+
+    f.result()
+    g.result()
+    assert len(port.rows) == 2 * 32 + 10
+    assert all(port.rows[-1][:16]) and not port.errors
+
+
+class FakePort(object):
+    write_ready = 0
+
+    def __init__(self, line_feed_time):
+        self.line_feed_time = line_feed_time
+
+    def lines_time(self, n_lines):
+        return n_lines * self.line_feed_time
+
+
+class SlowPrinter(FakePrinter):
+    def __init__(self, gate, line_feed_time=0.1):
+        super(SlowPrinter, self).__init__()
+        self.gate = gate
+        self.port = FakePort(line_feed_time)
+
+    def write(self, data):
+        self.gate.wait()
+        super(SlowPrinter, self).write(data)
+
+
+def test_pool_balances_by_completion_time():
+    gate = threading.Event()
+    fast = SlowPrinter(gate, 0.1)
+    slow = SlowPrinter(gate, 0.3)
+
+    with PrinterPool([fast, slow]) as pool:
+        for i in range(8):
+            pool.submit_text('{}\n'.format(i).encode('ascii'))
+        assert pool.queues[0].backlog == pytest.approx(0.6)
+        assert pool.queues[1].backlog == pytest.approx(0.6)
+        gate.set()
+
+    assert len(fast.log) == 6
+    assert len(slow.log) == 2
+    assert pool.queues[0].backlog == 0
+
+
+def test_pool_affinity():
+    gate = threading.Event()
+    a, b = SlowPrinter(gate), SlowPrinter(gate)
+
+    with PrinterPool([a, b]) as pool:
+        pool.submit_text(b'x\n', printer=b)
+        pool.submit_text(b'y\n', printer=1)
+        pool.submit_call(lambda p: p.write(b'z'), printer=b, estimate=1.0)
+        pool.submit_text(b'w\n')
+        assert pool.queues[1].backlog == pytest.approx(1.2)
+        gate.set()
+
+    assert a.log == [b'w\n']
+    assert b.log == [b'x\n', b'y\n', b'z']
+
+    with PrinterPool([a]) as pool, pytest.raises(ValueError):
+        pool.submit_text(b'x\n', printer=b)
+
+
+def test_pool_on_emulated_printers():
+    ports = [EmulatedPort(), EmulatedPort()]
+    printers = [ThermalPrinter(port) for port in ports]
+
+    with PrinterPool(printers) as pool:
+        jobs = [pool.submit_text(b'a\nb\n', printer=0),
+                pool.submit_text(b'c\n', printer=1),
+                pool.submit_text(b'd\n'),
+                pool.submit_image(2, b'\xff\xff' * 10)]
+
+    for job in jobs:
+        job.result()
+    assert sum(len(port.rows) for port in ports) == 4 * 32 + 10
+    assert not any(port.errors for port in ports)
+
+
+def test_pool_from_config_files(tmpdir, monkeypatch):
+    monkeypatch.setattr(ThermalPrinter, 'on_serial', classmethod(
+        lambda cls, dev, baudrate, **kwargs: cls(EmulatedPort(baudrate))))
+
+    fns = []
+    for n, heat_time in enumerate([800, 1200]):
+        fn = tmpdir.join('printer{}.conf'.format(n))
+        fn.write(json.dumps({'dev': '/dev/ttyUSB{}'.format(n),
+                             'baudrate': 9600, 'max_dots': 64,
+                             'heat_time': heat_time, 'interval': 20}))
+        fns.append(str(fn))
+
+    with PrinterPool.from_config_files(fns) as pool:
+        heat = [queue.printer.port.printer_heat for queue in pool.queues]
+    assert heat == [(64, 800, 20), (64, 1200, 20)]
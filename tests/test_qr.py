@@ -0,0 +1,79 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pyqrcode = pytest.importorskip('pyqrcode')
+from afthermal.img.qr import QRCodeConverter
+
+
+class Printer(object):
+    DOTS_PER_LINE = 384
+
+
+def unpack(width, data):
+    bits = np.unpackbits(np.frombuffer(bytes(memoryview(data).cast('B')),
+                                       dtype=np.uint8))
+    return bits.reshape(-1, width * 8).astype(bool)
+
+
+def test_small_code_is_centered():
+    code = pyqrcode.create('hi')
+    width, data = QRCodeConverter(Printer()).convert(code)
+    img = unpack(width, data)
+
+    # 21 modules plus quiet zone of 4 at 8 dots each
+    total = (21 + 8) * 8
+    left = (384 - total) // 2
+    assert img.shape[0] == total
+    assert not img[:, :left + 32].any()
+    assert not img[:32].any()
+
+    # the top left finder pattern is dark
+    assert img[32:40, left + 32:left + 32 + 56].all()
+
+    modules = img[32:-32:8, left + 32:left + 32 + 21 * 8:8]
+    assert (modules == np.array(code.code, dtype=bool)).all()
+
+
+def test_large_code_is_fitted():
+    code = pyqrcode.create('x' * 300, error='L')
+    converter = QRCodeConverter(Printer())
+    n = len(code.code)
+    size = converter.fit_module_size(n)
+
+    assert size < 8
+    assert (n + 8) * size <= 384
+    assert (n + 8) * (size + 1) > 384
+
+    width, data = converter.convert(code)
+    assert unpack(width, data).shape[0] == (n + 8) * size
+
+
+def test_fixed_module_size_too_large():
+    code = pyqrcode.create('x' * 300, error='L')
+    with pytest.raises(ValueError):
+        QRCodeConverter(Printer(), module_size=8).convert(code)
+
+
+def test_invert():
+    code = pyqrcode.create('hi')
+    width, plain = QRCodeConverter(Printer()).convert(code)
+    _, inverted = QRCodeConverter(Printer(), invert=True).convert(code)
+    plain, inverted = unpack(width, plain), unpack(width, inverted)
+
+    left = (384 - 29 * 8) // 2
+    cols = slice(left, left + 29 * 8)
+    assert (plain[:, cols] != inverted[:, cols]).all()
+    assert not inverted[:, :left].any()
+
+
+def test_cache():
+    converter = QRCodeConverter(Printer())
+    first = converter.convert('https://example.com/table/12')
+    assert converter.convert('https://example.com/table/12') is first
+    assert converter.cache.hits == 1
+
+    code = pyqrcode.create('https://example.com/table/12')
+    assert converter.convert(code)[1].tobytes() == first[1].tobytes()
+
+    with pytest.raises(ValueError):
+        first[1][0, 0] = 0
@@ -1,4 +1,6 @@
-from afthermal.text import Text, ByteStringVisitor, Bold, Node
+from afthermal.text import (Text, ByteStringVisitor, Bold, Node, Field,
+                            MarkupParser, Template, DoubleWidth,
+                            DoubleHeight)
 
 import pytest
 
@@ -33,3 +35,84 @@ def test_nested_formatting(bsv, encoding):
         b'\x1B\x45\x01' + u'helloworld'.encode(encoding) + b'\x1B\x45\x00' +
         'nonbold'.encode(encoding)
     )
+
+
+def test_visitor_dispatch_is_cached(bsv):
+    class Other(Text):
+        pass
+
+    assert bsv.visit(Other(u'x')) == b'x'
+    assert bsv.visit(Other(u'y')) == b'y'
+
+
+def test_template(encoding):
+    tpl = Template(Node(
+        Text(u'Table '), Field('table'), Text(u'\n'),
+        Bold(Text(u'Total: '), Field('total', '>6.2f')), Text(u'\n'),
+    ), encoding)
+
+    assert len(tpl.slots) == 2
+    assert tpl.render(table=12, total=3.5) == (
+        b'Table 12\n\x1B\x45\x01Total:   3.50\x1B\x45\x00\n'
+    )
+    assert tpl.render(table=b'7', total=10) == (
+        b'Table 7\n\x1B\x45\x01Total:  10.00\x1B\x45\x00\n'
+    )
+
+
+def test_template_static(encoding):
+    assert Template(Text(u'hello'), encoding).render() == b'hello'
+
+
+def test_template_missing_value(encoding):
+    with pytest.raises(KeyError):
+        Template(Field('name'), encoding).render()
+
+
+def test_markup():
+    parser = MarkupParser()
+    assert parser.feed(u'<b>a<u>b</u></b>c') == (
+        b'\x1B\x45\x01a\x1B\x2D\x01b\x1B\x2D\x00\x1B\x45\x00c'
+    )
+    assert parser.close() == b''
+
+
+def test_markup_nested_and_unknown_tags():
+    parser = MarkupParser()
+    assert parser.feed(u'<b><b>x</b></b><i>') == (
+        b'\x1B\x45\x01x\x1B\x45\x00<i>'
+    )
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7])
+def test_markup_chunked(size):
+    text = u'1 < 2 <dw>wide</dw> <dh><inv>tall</inv>'
+    whole = MarkupParser().feed(text)
+
+    chunks = [text[i:i+size] for i in range(0, len(text), size)]
+    out = b''.join(MarkupParser().iter_encode(chunks))
+
+    # the unclosed <dh> is closed at the end
+    assert out == whole + b'\x1D\x21\x00'
+
+
+def test_markup_unbalanced():
+    parser = MarkupParser()
+    assert parser.feed(u'a</b>b<b>c') == b'a</b>b\x1B\x45\x01c'
+    assert parser.feed(u'</b></b>') == b'\x1B\x45\x00</b>'
+
+
+def test_markup_double_size():
+    out = MarkupParser().feed(u'<dw>a<dh>b</dh>c</dw>')
+    assert out == (b'\x1D\x21\x20a\x1D\x21\x21b\x1D\x21\x20c'
+                   b'\x1D\x21\x00')
+
+    parser = MarkupParser()
+    assert parser.feed(u'<dh><dw>x') == b'\x1D\x21\x01\x1D\x21\x21x'
+    assert parser.close() == b'\x1D\x21\x00'
+
+
+def test_visitor_double_size():
+    tree = DoubleWidth(Text(u'a'), DoubleHeight(Text(u'b')), Text(u'c'))
+    assert ByteStringVisitor().visit(tree) == (
+        b'\x1D\x21\x20a\x1D\x21\x21b\x1D\x21\x20c\x1D\x21\x00')
@@ -1,4 +1,4 @@
-from afthermal.util import in_range, from_range
+from afthermal.util import in_range, from_range, LRUCache, RangeTable
 
 import pytest
 
@@ -33,3 +33,55 @@ def test_assertions_work():
 
 def test_value_conversion():
     assert from_range(8, 256 * 8, 8)(64) == 7
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+
+    assert 'a' in cache and 'c' in cache
+    assert cache.get('b') is None
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_cache_max_bytes():
+    cache = LRUCache(max_bytes=5)
+    cache['a'] = b'xxx'
+    cache['b'] = b'yy'
+    cache['c'] = b'z'
+    assert 'a' not in cache
+    assert cache.size == 3
+
+    cache['d'] = b'too large'
+    assert 'd' not in cache
+
+
+@pytest.mark.parametrize('start,end,step', [
+    (1, 10, None),
+    (8, 2048, 8),
+    (0, 2560, 10),
+])
+def test_range_table_matches_from_range(start, end, step):
+    table = RangeTable(start, end, step)
+    convert = from_range(start, end, step)
+
+    for v in range(start - 1, end + 1):
+        if in_range(start, end, step)(v):
+            assert v in table
+            assert table(v) == convert(v)
+        else:
+            assert v not in table
+            with pytest.raises(ValueError):
+                table(v)
+
+
+def test_range_table_rejects_non_integers():
+    table = RangeTable(1, 10)
+    assert 1.5 not in table
+    assert None not in table
+    with pytest.raises(ValueError):
+        table(1.5)